@@ -0,0 +1,29 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Helpers of the tests against the simulated YASDI library. No hardware needed.
+"""
+
+import tempfile
+from yasdiwrapper.yasdi import Yasdi
+from yasdiwrapper.yasdimaster import YasdiMaster, CMD_DEVICE_DETECTION
+from yasdiwrapper.simulator import SimulatedYasdi
+
+
+def detectedMaster(driverCount=1, devicesPerDriver=2, **simulation):
+    """Returns (simulator, Yasdi, YasdiMaster) with all drivers online and all devices detected"""
+    simulator = SimulatedYasdi(driverCount=driverCount, devicesPerDriver=devicesPerDriver,
+                               timeScale=simulation.pop("timeScale", 0), **simulation)
+    yasdi = Yasdi(library=simulator)
+    yasdiMaster = YasdiMaster(library=simulator)
+    for driverHandle in yasdi.yasdiGetDrivers():
+        yasdi.yasdiSetDriverOnline(driverHandle)
+    yasdiMaster.DoMasterCmdEx(cmd=CMD_DEVICE_DETECTION, param1=driverCount * devicesPerDriver)
+    return simulator, yasdi, yasdiMaster
+
+
+def temporaryDirectory(testCase) -> str:
+    """Creates a directory which is removed with its content after the test"""
+    directory = tempfile.TemporaryDirectory()
+    testCase.addCleanup(directory.cleanup)
+    return directory.name
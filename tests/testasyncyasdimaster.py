@@ -0,0 +1,88 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the asyncio facade against the simulated YASDI library.
+"""
+
+import asyncio
+import math
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from yasdiwrapper.sd1channels import *
+from yasdiwrapper.asyncyasdimaster import AsyncYasdiMaster
+from tests.simulation import detectedMaster
+
+
+class AsyncYasdiMasterTests(unittest.TestCase):
+
+    def testAsyncYasdiMaster(self):
+        simulator, yasdi, yasdiMaster = detectedMaster()
+
+        async def run():
+            async with AsyncYasdiMaster(yasdiMaster, defaultTimeout=5) as asyncMaster:
+                deviceHandles = await asyncMaster.detectDevices(2)
+                channelHandle = await asyncMaster.FindChannelName(deviceHandles[0], CHANNEl_NAME_PAC)
+                return deviceHandles, await asyncMaster.GetChannelValue(channelHandle, deviceHandles[0], 0)
+
+        deviceHandles, channelValue = asyncio.run(run())
+        self.assertEqual([1, 2], deviceHandles)
+        self.assertFalse(math.isnan(channelValue))
+
+    def testHangingCallTimesOut(self):
+        simulator, yasdi, yasdiMaster = detectedMaster()
+        channelHandle = yasdiMaster.FindChannelName(1, CHANNEl_NAME_PAC)
+        simulator.injectHang(5)
+
+        async def run():
+            asyncMaster = AsyncYasdiMaster(yasdiMaster, defaultTimeout=0.2)
+            try:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncMaster.GetChannelValue(channelHandle, 1, 0)
+                # The hanging call still occupies the worker until the reset releases it
+                yasdiMaster.yasdiReset()
+                return await asyncMaster.detectDevices(2, timeout=5)
+            finally:
+                asyncMaster.close()
+
+        self.assertEqual([1, 2], asyncio.run(run()))
+
+    def testCancelledCallIsRemovedFromQueue(self):
+        simulator, yasdi, yasdiMaster = detectedMaster()
+        channelHandle = yasdiMaster.FindChannelName(1, CHANNEl_NAME_PAC)
+        simulator.injectHang(5)
+
+        async def run():
+            asyncMaster = AsyncYasdiMaster(yasdiMaster)
+            try:
+                hanging = asyncio.ensure_future(asyncMaster.GetChannelValue(channelHandle, 1, 0))
+                queued = asyncio.ensure_future(asyncMaster.GetChannelValue(channelHandle, 2, 0))
+                await asyncio.sleep(0.1)
+                queued.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await queued
+                yasdiMaster.yasdiReset()
+                await hanging
+                await asyncMaster.GetDeviceHandles(timeout=5)
+            finally:
+                asyncMaster.close()
+
+        callCount = simulator.callCount
+        asyncio.run(run())
+        # Only the hanging request reached the library
+        self.assertEqual(callCount + 1, simulator.callCount)
+
+    def testSharedExecutorIsNotClosed(self):
+        simulator, yasdi, yasdiMaster = detectedMaster()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            async def run():
+                asyncMaster = AsyncYasdiMaster(yasdiMaster, defaultTimeout=5, executor=executor)
+                deviceHandles = await asyncMaster.detectDevices(2)
+                asyncMaster.close()
+                return deviceHandles
+
+            self.assertEqual([1, 2], asyncio.run(run()))
+            self.assertEqual([1, 2], executor.submit(yasdiMaster.GetDeviceHandles).result())
+
+
+if __name__ == '__main__':
+    unittest.main()
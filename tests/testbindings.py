@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the loading of the native libraries. No hardware needed.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+from ctypes import ArgumentError
+from yasdiwrapper.yasdi import Yasdi
+from yasdiwrapper.simulator import SimulatedYasdi
+from yasdiwrapper import bindings
+
+
+class LibraryLoadingTests(unittest.TestCase):
+
+    def testPrototypes(self):
+        functions = bindings.LibraryFunctions(SimulatedYasdi(timeScale=0), bindings.YASDI_MASTER_PROTOTYPES)
+        for name, (restype, argtypes) in bindings.YASDI_MASTER_PROTOTYPES.items():
+            self.assertEqual((restype, argtypes), (getattr(functions, name).restype, tuple(getattr(functions, name).argtypes)))
+        # Wrong argument types are rejected by ctypes instead of being passed to the library
+        self.assertRaises(ArgumentError, functions.FindChannelName, 1, "Pac")
+
+    def testLazySharedLibraries(self):
+        # No library is loaded before the first call. All objects share the prototyped functions.
+        yasdi = Yasdi()
+        self.assertIs(yasdi.yasdi, Yasdi().yasdi)
+        functions = bindings.LibraryFunctions("yasdi-missing", bindings.YASDI_PROTOTYPES)
+        self.assertIsNone(functions.library)
+        with self.assertRaises(OSError):
+            functions.yasdiGetDriver(None, 0)
+        self.assertRaises(AttributeError, getattr, functions, "unknownFunction")
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "needs libc.so.6")
+    def testConfiguredLibraryPath(self):
+        bindings.libraryPaths["configured-c"] = "libc.so.6"
+        try:
+            library = bindings.loadLibrary("configured-c")
+            self.assertIs(library, bindings.loadLibrary("configured-c"))
+        finally:
+            del bindings.libraryPaths["configured-c"]
+            bindings.loadedLibraries.pop("configured-c", None)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "needs libc.so.6")
+    def testMissingDependencyIsNoError(self):
+        # The library may resolve the dependency itself (rpath, DT_NEEDED)
+        bindings.libraryPaths["configured-c"] = "libc.so.6"
+        bindings.LIBRARY_DEPENDENCIES["configured-c"] = ("yasdi-missing",)
+        try:
+            self.assertIsNotNone(bindings.loadLibrary("configured-c"))
+            self.assertNotIn("yasdi-missing", bindings.loadedLibraries)
+        finally:
+            del bindings.libraryPaths["configured-c"]
+            del bindings.LIBRARY_DEPENDENCIES["configured-c"]
+            bindings.loadedLibraries.pop("configured-c", None)
+
+    def testDemonImportWithoutSideEffects(self):
+        # In a new interpreter: the module may already be imported by another test
+        script = ("import os, json; environment = dict(os.environ); import yasdidemon; from yasdiwrapper import bindings; "
+                  "print(json.dumps([hasattr(yasdidemon, 'yasdiMasterLibrary'), environment == dict(os.environ), "
+                  "sorted(bindings.loadedLibraries)]))")
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=60,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertEqual([False, True, []], json.loads(result.stdout))
+
+
+if __name__ == '__main__':
+    unittest.main()
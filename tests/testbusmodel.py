@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the bus bandwidth model and the admission control.
+"""
+
+import os
+import unittest
+from yasdiwrapper.yasdi import YE_TIMEOUT
+from yasdiwrapper.sd1channels import *
+from yasdiwrapper.channelcatalog import ChannelCatalog
+from yasdiwrapper.pollscheduler import PollScheduler, ChannelSchedule
+from yasdiwrapper.busmodel import *
+from tests.simulation import detectedMaster
+
+
+class BusModelTests(unittest.TestCase):
+
+    def testYasdiConfig(self):
+        ports = readYasdiConfig(os.path.join(os.path.dirname(__file__), "..", "yasdi.ini"))
+        self.assertEqual(["COM1"], list(ports))
+        self.assertEqual(19200, ports["COM1"].baudrate)
+        self.assertEqual("SMANet", ports["COM1"].protocol)
+
+    def testAdmission(self):
+        now = [0.0]
+        busModel = BusModel(1200)
+        self.assertAlmostEqual(0.677, busModel.calculatedSeconds(), places=3)
+        admission = BusAdmission(busModel, maxUtilization=0.5, window=2.0, clock=lambda: now[0])
+        self.assertEqual(ADMIT, admission.request(priority=0))
+        self.assertEqual(DELAY, admission.request(priority=0))
+        self.assertEqual(SHED, admission.request(priority=1))
+        self.assertAlmostEqual((0.677 - 0.323) / 0.5, admission.waitTime(), places=2)
+        now[0] = 1.0
+        self.assertEqual(ADMIT, admission.request(priority=1))
+
+        schedules = [ChannelSchedule(CHANNEl_NAME_PAC, interval=2), ChannelSchedule(CHANNEl_NAME_ETOTAL, interval=60)]
+        self.assertIsNone(admission.checkSchedules(schedules, 1))
+        self.assertIn("10 devices", admission.checkSchedules(schedules, 10))
+
+        # The model learns the real time per request
+        busModel.observe(1.0, requests=10)
+        self.assertAlmostEqual(0.1, busModel.requestSeconds())
+        self.assertIsNone(admission.checkSchedules(schedules, 2))
+
+    def testPollSchedulerAdmission(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(devicesPerDriver=2)
+        now = [0.0]
+        admission = BusAdmission(BusModel(1200), maxUtilization=0.5, window=2.0, clock=lambda: now[0])
+        scheduler = PollScheduler(yasdiMaster, ChannelCatalog(yasdiMaster),
+                                  [ChannelSchedule(CHANNEl_NAME_PAC, interval=2),
+                                   ChannelSchedule(CHANNEl_NAME_ETOTAL, interval=60, priority=1)],
+                                  clock=lambda: now[0], admission=admission)
+        scheduler.addDevices([1, 2])
+
+        # One read fits on the bus: the second Pac is delayed, the E-Total reads are skipped until the next interval
+        results = scheduler.pollDue()
+        self.assertEqual([(1, CHANNEl_NAME_PAC)], [(result[0], result[1].name) for result in results])
+        self.assertEqual((1, 1, 2), (admission.admitted, admission.delayed, admission.shed))
+        self.assertEqual([2], [task.deviceHandle for task in scheduler.dueTasks(now[0])])
+        self.assertEqual([60.0, 60.0], [task.nextDue for task in scheduler.tasks if task.schedule.priority == 1])
+
+        # The simulated bus answers at once, faster than the line allows: these reads were no bus requests, the
+        # delayed read waits for bus time
+        self.assertAlmostEqual(0.677, admission.busModel.requestSeconds(), places=3)
+        self.assertGreater(scheduler.timeUntilNextDue(), 0.0)
+        now[0] += scheduler.timeUntilNextDue()
+        self.assertEqual([2], [result[0] for result in scheduler.pollDue()])
+
+    def testOnlySuccessfulBusReadsAreLearned(self):
+        busModel = BusModel(1200)
+        busModel.observeReads([0.001, 0.7, 0.8])
+        self.assertAlmostEqual(0.75, busModel.requestSeconds())
+
+        simulator, yasdi, yasdiMaster = detectedMaster(devicesPerDriver=2, timeScale=1.0, baudrate=19200)
+        admission = BusAdmission(BusModel(19200))
+        scheduler = PollScheduler(yasdiMaster, ChannelCatalog(yasdiMaster), [ChannelSchedule(CHANNEl_NAME_PAC, interval=2)],
+                                  admission=admission)
+        scheduler.addDevices([1, 2])
+        simulator.injectError(YE_TIMEOUT, deviceHandle=2)
+        scheduler.pollDue()
+        # The timeout of device 2 is not part of the time per request
+        self.assertLess(admission.busModel.requestSeconds(), 2 * simulator.telegramTime(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
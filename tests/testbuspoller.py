@@ -0,0 +1,61 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the parallel polling of several buses against the simulated YASDI library.
+"""
+
+import threading
+import time
+import unittest
+from yasdiwrapper.yasdi import Yasdi
+from yasdiwrapper.yasdimaster import YasdiMaster
+from yasdiwrapper.sd1channels import *
+from yasdiwrapper.simulator import SimulatedYasdi
+from yasdiwrapper.channelcatalog import ChannelCatalog
+from yasdiwrapper.buspoller import BusPoller, detectDevicesPerDriver
+from tests.simulation import detectedMaster
+
+
+class BusPollerTests(unittest.TestCase):
+
+    def testBusesArePolledInParallel(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(driverCount=3, devicesPerDriver=2, timeScale=1.0,
+                                                       baudrate=19200)
+        busDevices = {1: [1, 2], 2: [3, 4], 3: [5, 6]}
+        busPoller = BusPoller(yasdiMaster, ChannelCatalog(yasdiMaster), busDevices)
+        try:
+            start = time.monotonic()
+            readBuffers = busPoller.readChannels([CHANNEl_NAME_PAC, CHANNEl_NAME_ETOTAL], 0)
+            duration = time.monotonic() - start
+        finally:
+            busPoller.shutdown()
+        self.assertEqual({1, 2, 3}, set(readBuffers))
+        # 4 requests per bus. Serial polling of all buses would need 12 request times.
+        self.assertLess(duration, 8 * simulator.telegramTime(1))
+
+    def testUnknownBusIsPolledAfterAllBuses(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(driverCount=2, devicesPerDriver=2)
+        busPoller = BusPoller(yasdiMaster, ChannelCatalog(yasdiMaster), {1: [1, 2], 2: [3]})
+        busPoller.addDevices(None, [4])
+        calls = []
+        try:
+            results = busPoller.runOnBuses(lambda bus, devices: calls.append((bus, threading.current_thread())) or list(devices))
+            busPoller.removeDevices([2, 4])
+            remaining = busPoller.runOnBuses(lambda bus, devices: list(devices))
+        finally:
+            busPoller.shutdown()
+        self.assertEqual({1: [1, 2], 2: [3], None: [4]}, results)
+        # Never in parallel to a bus worker: last and in the calling thread
+        self.assertEqual((None, threading.current_thread()), calls[-1])
+        self.assertNotIn(threading.current_thread(), [thread for bus, thread in calls[:-1]])
+        self.assertEqual({1: [1], 2: [3], None: []}, remaining)
+
+    def testDetectDevicesPerDriver(self):
+        simulator = SimulatedYasdi(driverCount=3, devicesPerDriver=2, timeScale=0)
+        yasdi = Yasdi(library=simulator)
+        busDevices = detectDevicesPerDriver(yasdi, YasdiMaster(library=simulator), yasdi.yasdiGetDrivers(), 2)
+        self.assertEqual({1: [1, 2], 2: [3, 4], 3: [5, 6]}, busDevices)
+
+
+if __name__ == '__main__':
+    unittest.main()
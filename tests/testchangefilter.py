@@ -0,0 +1,40 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the change detection of the history files.
+"""
+
+import unittest
+from yasdiwrapper.channelcatalog import ChannelInfo
+from yasdiwrapper.changefilter import ChangeFilter, FilteredSink, ReportRule
+
+
+class ChangeFilterTests(unittest.TestCase):
+
+    def testDeadbandsAndHeartbeat(self):
+        pac = ChannelInfo("Pac", unit="W")
+        status = ChannelInfo("Status", statTexts=("Stop", "Warten", "Mpp", "Mpp"))
+        eTotal = ChannelInfo("E-Total", unit="kWh")
+        changeFilter = ChangeFilter({"Pac": ReportRule(absoluteDeadband=10, relativeDeadband=0.02, maxSilence=300),
+                                     "Status": ReportRule(exactChange=True)})
+        written = []
+
+        class ListSink:
+            def write(self, records):
+                written.extend(records)
+
+        sink = FilteredSink(ListSink(), changeFilter)
+        sink.write([("WR", pac, 0, 1000.0), ("WR", status, 0, 2.0), ("WR", eTotal, 0, 5.0)])
+        sink.write([("WR", pac, 2, 1015.0), ("WR", status, 2, 3.0), ("WR", eTotal, 2, 5.0)])
+        sink.write([("WR", pac, 4, 1021.0), ("WR", status, 4, 1.0)])
+        sink.write([("WR", pac, 4, 1020.0), ("WR", pac, 306, 1021.0), ("WR2", pac, 306, 1021.0)])
+        self.assertEqual([(pac, 0, 1000.0), (status, 0, 2.0), (eTotal, 0, 5.0),
+                          (eTotal, 2, 5.0),
+                          (pac, 4, 1021.0), (status, 4, 1.0),
+                          (pac, 306, 1021.0), (pac, 306, 1021.0)],
+                         [record[1:] for record in written])
+        self.assertEqual(3, changeFilter.suppressedCount)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the channel meta data catalog against the simulated YASDI library.
+"""
+
+import os
+import unittest
+from yasdiwrapper.sd1channels import *
+from yasdiwrapper.channelcatalog import ChannelCatalog
+from tests.simulation import detectedMaster, temporaryDirectory
+
+
+class ChannelCatalogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.simulator, self.yasdi, self.yasdiMaster = detectedMaster()
+        self.catalogFile = os.path.join(temporaryDirectory(self), "channels.json")
+
+    def testCatalogIsPersisted(self):
+        channelCatalog = ChannelCatalog(self.yasdiMaster, self.catalogFile)
+        status = channelCatalog.findChannel(1, CHANNEL_NAME_STATUS)
+        self.assertEqual("Mpp", status.statText(2))
+        self.assertIsNone(channelCatalog.findChannel(1, "Unknown"))
+        self.assertTrue(os.path.exists(self.catalogFile))
+
+        reloadedCatalog = ChannelCatalog(self.yasdiMaster, self.catalogFile)
+        self.assertIn("WR21TL06", reloadedCatalog.deviceTypes)
+        plimit = reloadedCatalog.findChannel(2, "Plimit")
+        self.assertEqual(self.yasdiMaster.FindChannelName(2, "Plimit"), plimit.handle)
+        self.assertEqual((0.0, 3000.0), (plimit.rangeMin, plimit.rangeMax))
+
+
+if __name__ == '__main__':
+    unittest.main()
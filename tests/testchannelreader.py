@@ -0,0 +1,33 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the batched channel reads against the simulated YASDI library.
+"""
+
+import math
+import unittest
+from yasdiwrapper.yasdi import *
+from yasdiwrapper.sd1channels import *
+from yasdiwrapper.channelcatalog import ChannelCatalog
+from yasdiwrapper.channelreader import ChannelReader
+from tests.simulation import detectedMaster
+
+
+class ChannelReaderTests(unittest.TestCase):
+
+    def testReadChannels(self):
+        simulator, yasdi, yasdiMaster = detectedMaster()
+        channelReader = ChannelReader(yasdiMaster, ChannelCatalog(yasdiMaster))
+        simulator.injectError(YE_TIMEOUT, deviceHandle=2, channelName=CHANNEl_NAME_ETOTAL)
+        readBuffer = channelReader.readChannels([1, 2], [CHANNEl_NAME_PAC, CHANNEl_NAME_ETOTAL, "Unknown"])
+        self.assertEqual(6, len(readBuffer))
+        self.assertEqual([YE_OK, YE_OK, YE_UNKNOWN_HANDLE, YE_OK, YE_TIMEOUT, YE_UNKNOWN_HANDLE],
+                         list(readBuffer.errorCodes))
+        self.assertTrue(math.isnan(readBuffer.values[4]))
+        self.assertEqual(0, readBuffer.timestamps[4])
+        self.assertGreater(readBuffer.timestamps[0], 0)
+        self.assertIs(readBuffer, channelReader.readChannels([1, 2], [CHANNEl_NAME_PAC, CHANNEl_NAME_ETOTAL, "Unknown"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the persistent device registry against the simulated YASDI library.
+"""
+
+import os
+import threading
+import time
+import unittest
+from yasdiwrapper.yasdi import Yasdi
+from yasdiwrapper.yasdimaster import YasdiMaster, CMD_DEVICE_DETECTION
+from yasdiwrapper.simulator import SimulatedYasdi
+from yasdiwrapper.deviceregistry import DeviceRegistry, BackgroundDetection
+from yasdiwrapper.channelcatalog import ChannelCatalog
+from yasdiwrapper.buspoller import BusPoller
+from yasdiwrapper.busmodel import BusModel, BusAdmission
+from tests.simulation import detectedMaster, temporaryDirectory
+
+
+class DeviceRegistryTests(unittest.TestCase):
+
+    def testRegistryAndBackgroundDetection(self):
+        simulator = SimulatedYasdi(driverCount=2, devicesPerDriver=2, timeScale=0)
+        yasdi = Yasdi(library=simulator)
+        yasdiMaster = YasdiMaster(library=simulator)
+        registryFile = os.path.join(temporaryDirectory(self), "devices.json")
+        deviceRegistry = DeviceRegistry(yasdiMaster, registryFile)
+
+        yasdi.yasdiSetDriverOnline(1)
+        yasdiMaster.DoMasterCmdEx(cmd=CMD_DEVICE_DETECTION, param1=2)
+        changes = deviceRegistry.refresh("COM1", yasdiMaster.GetDeviceHandles())
+        self.assertEqual([1, 2], [device.handle for device in changes.newDevices])
+
+        # Devices on the second bus are found by the background detection (driver unknown)
+        yasdi.yasdiSetDriverOnline(2)
+        reported = []
+        changes = BackgroundDetection(yasdiMaster, deviceRegistry, onChange=reported.append).detectOnce()
+        self.assertEqual([changes], reported)
+        self.assertEqual([2000000003, 2000000004], [device.serialNumber for device in changes.newDevices])
+        self.assertIsNone(changes.newDevices[0].driverName)
+
+        reloadedRegistry = DeviceRegistry(yasdiMaster, registryFile)
+        self.assertEqual(4, len(reloadedRegistry.devices))
+        self.assertEqual(2, reloadedRegistry.countOnDriver("COM1"))
+        self.assertEqual("WR21TL06 2000000002", reloadedRegistry.devices[2000000002].name)
+
+        # Changed handles are remapped by serial number, devices which are gone are reported missing
+        deviceRegistry.devices[2000000001].handle = 99
+        simulator.devices[4].detected = False
+        changes = deviceRegistry.refresh()
+        self.assertEqual({99: 1}, changes.remapped)
+        self.assertEqual([2000000004], [device.serialNumber for device in changes.missing])
+        self.assertEqual([4], changes.releasedHandles)
+        self.assertIsNone(deviceRegistry.deviceOfHandle(4))
+
+    def testDetectionPerBus(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(driverCount=2, devicesPerDriver=2)
+        deviceRegistry = DeviceRegistry(yasdiMaster)
+        deviceRegistry.refresh("COM1", [1, 2])
+        deviceRegistry.refresh("COM2", [3, 4])
+        # A known device which does not answer (yet)
+        simulator.devices[4].detected = False
+        self.assertEqual([4], deviceRegistry.refresh().releasedHandles)
+        self.assertEqual(1, deviceRegistry.missingOnDriver("COM2"))
+
+        busPoller = BusPoller(yasdiMaster, ChannelCatalog(yasdiMaster), {1: [1, 2], 2: [3]})
+        busAdmissions = {1: BusAdmission(BusModel(19200)), 2: BusAdmission(BusModel(19200))}
+        detectionThreads = []
+        backgroundDetection = BackgroundDetection(
+            yasdiMaster, deviceRegistry, interval=300.0, busPoller=busPoller, driverNames={1: "COM1", 2: "COM2"},
+            busAdmissions=busAdmissions, retryInterval=0.01,
+            onChange=lambda changes: detectionThreads.append(threading.current_thread().name))
+        self.assertEqual(300.0, backgroundDetection.delay(1))
+        self.assertEqual(0.01, backgroundDetection.delay(2))
+        try:
+            backgroundDetection.start()
+            for _ in range(500):
+                if detectionThreads:
+                    break
+                time.sleep(0.01)
+        finally:
+            backgroundDetection.stop()
+            backgroundDetection.thread.join(5)
+            busPoller.shutdown()
+        # The missing device was searched in the worker of its bus, within the admission of the bus
+        self.assertTrue(detectionThreads[0].startswith("yasdi-bus-2"))
+        self.assertEqual(4, deviceRegistry.devices[2000000004].handle)
+        self.assertEqual(1, busAdmissions[2].admitted)
+        self.assertEqual(0, busAdmissions[1].admitted)
+        self.assertEqual(0, deviceRegistry.missingOnDriver("COM2"))
+
+        # Attempts which find nothing double the delay, up to maxInterval
+        self.assertEqual(300.0, backgroundDetection.delay(2))
+        backgroundDetection.emptyAttempts[1] = 2
+        self.assertEqual(1200.0, backgroundDetection.delay(1))
+        backgroundDetection.emptyAttempts[1] = 10
+        self.assertEqual(2400.0, backgroundDetection.delay(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
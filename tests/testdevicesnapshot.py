@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the device snapshots against the simulated YASDI library.
+"""
+
+import math
+import os
+import unittest
+from yasdiwrapper.yasdimaster import *
+from yasdiwrapper.simulator import defaultChannels
+from yasdiwrapper.channelcatalog import ChannelCatalog
+from yasdiwrapper.devicesnapshot import DeviceSnapshotReader, writeSnapshots, readSnapshots, diffSnapshotSets
+from tests.simulation import detectedMaster, temporaryDirectory
+
+
+class DeviceSnapshotTests(unittest.TestCase):
+
+    def testHandleListsAreNotTruncated(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(devicesPerDriver=60,
+                                                       deviceTypes={"WR21TL06": defaultChannels(extraChannels=300)})
+        self.assertEqual(list(range(1, 61)), yasdiMaster.GetDeviceHandles())
+        self.assertEqual(len(defaultChannels(300)), len(yasdiMaster.GetChannelHandlesEx(60, ALLCHANNELS)))
+
+    def testSnapshotsAndDiffs(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(devicesPerDriver=3)
+        snapshotReader = DeviceSnapshotReader(yasdiMaster, ChannelCatalog(yasdiMaster))
+        directory = temporaryDirectory(self)
+        writeSnapshots(os.path.join(directory, "before"), snapshotReader.takeSnapshots())
+
+        self.assertTrue(yasdiMaster.SetChannelValue(yasdiMaster.FindChannelName(2, "Plimit"), 2, 1500.0))
+        snapshots = snapshotReader.takeSnapshots()
+        self.assertEqual(15, len(snapshots[1]))
+        self.assertEqual(1500.0, snapshots[1].value("Plimit"))
+        self.assertEqual(10.0, snapshots[1].value("Ipv-Start"))
+        writeSnapshots(os.path.join(directory, "after"), snapshots)
+
+        before = readSnapshots(os.path.join(directory, "before"))
+        after = readSnapshots(os.path.join(directory, "after"))
+        self.assertEqual(2500.0, before[2000000002].value("Plimit"))
+        parameterNames = ["Plimit", "T-Start", "Uac-Min", "Uac-Max"]
+        self.assertEqual({2000000002: [("Plimit", 2500.0, 1500.0)]}, diffSnapshotSets(before, after, parameterNames))
+        del after[2000000003]
+        self.assertEqual([("Plimit", 2500.0, None)], diffSnapshotSets(before, after, ["Plimit"])[2000000003])
+
+    def testDevicesWithoutSerialNumberAreNotWritten(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(devicesPerDriver=3)
+
+        class FailingSerialNumbers:
+            def __getattr__(self, name):
+                return getattr(yasdiMaster, name)
+
+            def GetDeviceSN(self, deviceHandle):
+                return math.nan if deviceHandle != 1 else yasdiMaster.GetDeviceSN(deviceHandle)
+
+        snapshots = DeviceSnapshotReader(FailingSerialNumbers(), ChannelCatalog(yasdiMaster)).takeSnapshots()
+        self.assertEqual([2000000001, None, None], [snapshot.serialNumber for snapshot in snapshots])
+        directory = temporaryDirectory(self)
+        self.assertEqual([os.path.join(directory, "2000000001.snap")], writeSnapshots(directory, snapshots))
+        self.assertEqual([2000000001], list(readSnapshots(directory)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the in-memory history of polled values.
+"""
+
+import datetime
+import unittest
+from yasdiwrapper.channelcatalog import ChannelInfo
+from yasdiwrapper.history import RingBuffer, TimeSeriesStore
+
+
+class HistoryTests(unittest.TestCase):
+
+    def testRingBuffersAndRollups(self):
+        pac = ChannelInfo("Pac", unit="W")
+        store = TimeSeriesStore(capacity=5, maxSeries=2)
+        store.write([("WR", pac, timestamp, float(timestamp)) for timestamp in range(100, 108)])
+        store.write([("WR", pac, 107, 0.0), ("WR2", pac, 100, 1.0), ("WR3", pac, 100, 1.0)])
+        self.assertEqual(1, store.droppedValues)
+        self.assertEqual(2 * 5 * 12, store.memoryBytes())
+
+        timestamps, values = store.last("WR", "Pac", 2)
+        self.assertEqual([106, 107], list(timestamps))
+        self.assertEqual([106.0, 107.0], list(values))
+        self.assertEqual([103, 104, 105, 106, 107], list(store.last("WR", "Pac", 10)[0]))
+        self.assertEqual([104.0, 105.0], list(store.between("WR", "Pac", 104, 106)[1]))
+        self.assertEqual([(100, 103.0, 104.0, 103.5, 2), (105, 105.0, 107.0, 106.0, 3)],
+                         store.downsample("WR", "Pac", 0, 200, 5))
+
+    def testQueriesOfAWrappedRing(self):
+        for written in range(0, 12):
+            ringBuffer = RingBuffer(5)
+            for timestamp in range(100, 100 + written):
+                ringBuffer.append(timestamp, float(timestamp))
+            expected = list(range(100, 100 + written))[-5:]
+            self.assertEqual(expected, list(ringBuffer.ordered()[0]))
+            for count in range(0, 7):
+                self.assertEqual(expected[len(expected) - min(count, len(expected)):], list(ringBuffer.last(count)[0]))
+            for fromTime in range(98, 114):
+                for toTime in range(fromTime - 1, 114):
+                    timestamps, values = ringBuffer.between(fromTime, toTime)
+                    self.assertEqual([timestamp for timestamp in expected if fromTime <= timestamp < toTime], list(timestamps))
+                    self.assertEqual(list(map(float, timestamps)), list(values))
+
+    def testDailyYield(self):
+        eTotal = ChannelInfo("E-Total", unit="kWh")
+        store = TimeSeriesStore(capacity=100)
+        firstDay = datetime.datetime(2024, 6, 1, 8, 0)
+        for hour, first, second in ((0, 1000.0, 2000.0), (3, 1010.0, 2005.0), (24, 1015.0, 2006.0), (28, 1030.0, 2016.0)):
+            timestamp = int((firstDay + datetime.timedelta(hours=hour)).timestamp())
+            store.write([("WR1", eTotal, timestamp, first), ("WR2", eTotal, timestamp, second)])
+        self.assertEqual([(datetime.date(2024, 6, 1), 10.0), (datetime.date(2024, 6, 2), 20.0)],
+                         store.dailyYield()["WR1"])
+        self.assertEqual({datetime.date(2024, 6, 1): 15.0, datetime.date(2024, 6, 2): 31.0}, store.fleetDailyYield())
+
+
+if __name__ == '__main__':
+    unittest.main()
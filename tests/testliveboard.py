@@ -0,0 +1,54 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the shared memory live value board.
+"""
+
+import os
+import tempfile
+import unittest
+from yasdiwrapper.yasdi import YE_TIMEOUT
+from yasdiwrapper.channelcatalog import ChannelInfo
+from yasdiwrapper.liveboard import LiveBoardWriter, LiveBoardReader, LiveBoardError, RECORD, SEQUENCE
+
+
+class LiveBoardTests(unittest.TestCase):
+
+    def testWriteAndRead(self):
+        pac, eTotal = ChannelInfo("Pac", unit="W"), ChannelInfo("E-Total", unit="kWh")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "liveboard")
+            writer = LiveBoardWriter(path, capacity=2)
+            reader = LiveBoardReader(path)
+            self.assertIsNone(reader.read("WR1", "Pac"))
+
+            writer.write([("WR1", pac, 100, 500.0), ("WR1", eTotal, 100, 1000.0), ("WR2", pac, 100, 1.0)])
+            self.assertEqual(1, writer.droppedValues)
+            writer.update("WR1", pac, 102, 0.0, YE_TIMEOUT)
+            liveValue = reader.read("WR1", "Pac")
+            self.assertEqual((100, 500.0, YE_TIMEOUT, "W"), (liveValue.timestamp, liveValue.value, liveValue.errorCode, liveValue.unit))
+            self.assertFalse(liveValue.ok)
+            self.assertEqual({("WR1", "Pac"), ("WR1", "E-Total")}, set(reader.readAll()))
+
+            # A record in the middle of an update is not read
+            SEQUENCE.pack_into(writer.memory, writer.recordsOffset + RECORD.size, 7)
+            self.assertRaises(LiveBoardError, reader.read, "WR1", "E-Total")
+            # Neither is a new sequence seen before the new value (weakly ordered CPUs): the checksum doesn't match
+            SEQUENCE.pack_into(writer.memory, writer.recordsOffset, 6)
+            self.assertRaises(LiveBoardError, reader.read, "WR1", "Pac")
+
+            # A restarted writer creates a new board
+            writer.close()
+            writer = LiveBoardWriter(path, capacity=2)
+            writer.write([("WR2", pac, 200, 2.0)])
+            # Names which don't fit are rejected instead of being cut to the same key
+            writer.write([("WR2 " + "x" * 40, pac, 200, 3.0)])
+            self.assertEqual(1, writer.droppedValues)
+            self.assertEqual([("WR2", "Pac")], list(reader.readAll()))
+            self.assertEqual(2.0, reader.read("WR2", "Pac").value)
+            reader.close()
+            writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
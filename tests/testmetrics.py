@@ -0,0 +1,62 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the metrics of the yasdi calls against the simulated YASDI library.
+"""
+
+import unittest
+from yasdiwrapper.yasdi import *
+from yasdiwrapper.sd1channels import *
+from yasdiwrapper.channelcatalog import ChannelCatalog
+from yasdiwrapper.channelreader import ChannelReader
+from yasdiwrapper.metrics import Metrics, InstrumentedYasdiMaster
+from tests.simulation import detectedMaster
+
+
+class MetricsTests(unittest.TestCase):
+
+    def testInstrumentedReads(self):
+        simulator, yasdi, yasdiMaster = detectedMaster()
+        metrics = Metrics()
+        instrumentedMaster = InstrumentedYasdiMaster(yasdiMaster, metrics)
+        instrumentedMaster.deviceLabels = {1: "WR1"}
+        channelReader = ChannelReader(instrumentedMaster, ChannelCatalog(instrumentedMaster))
+        simulator.injectError(YE_TIMEOUT, deviceHandle=2)
+        channelReader.readChannels([1, 2], [CHANNEl_NAME_PAC, CHANNEl_NAME_ETOTAL], 0)
+
+        text = metrics.render()
+        self.assertIn('yasdi_channel_reads_total{code="YE_OK"} 2', text)
+        self.assertIn('yasdi_channel_reads_total{code="YE_TIMEOUT"} 2', text)
+        self.assertIn('yasdi_channel_read_seconds_count{device="WR1",channel="Pac"} 1', text)
+        self.assertIn('yasdi_channel_read_seconds_bucket{device="2",channel="E-Total",le="+Inf"} 1', text)
+        self.assertIn('yasdi_call_seconds_count{method="GetDeviceType"} 2', text)
+        self.assertIn("yasdi_values_total 2", text)
+
+        # A single value read is counted with the same yasdi code names
+        instrumentedMaster.GetChannelValue(yasdiMaster.FindChannelName(2, CHANNEl_NAME_PAC), 2, 0)
+        self.assertIn('yasdi_channel_reads_total{code="YE_TIMEOUT"} 3', metrics.render())
+
+
+    def testLabelsAreResolvedOutsideOfTheLock(self):
+        simulator, yasdi, yasdiMaster = detectedMaster()
+        metrics = Metrics()
+        lockedDuringNativeCalls = []
+
+        class CheckingMaster:
+            def __getattr__(self, name):
+                return getattr(yasdiMaster, name)
+
+            def GetChannelName(self, channelHandle):
+                lockedDuringNativeCalls.append(metrics.lock.locked())
+                return yasdiMaster.GetChannelName(channelHandle)
+
+        instrumentedMaster = InstrumentedYasdiMaster(CheckingMaster(), metrics)
+        instrumentedMaster.deviceLabels = {1: 'WR "Süd"\\1\nDach'}
+        instrumentedMaster.GetChannelValue(yasdiMaster.FindChannelName(1, CHANNEl_NAME_PAC), 1, 0)
+        self.assertEqual([False], lockedDuringNativeCalls)
+        self.assertIn('yasdi_channel_read_seconds_count{device="WR \\"Süd\\"\\\\1\\nDach",channel="Pac"} 1',
+                      metrics.render())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the supervised native host process against the simulated YASDI library.
+"""
+
+import functools
+import time
+import unittest
+from yasdiwrapper.yasdi import *
+from yasdiwrapper.yasdimaster import CMD_DEVICE_DETECTION
+from yasdiwrapper.sd1channels import *
+from yasdiwrapper.simulator import SimulatedYasdi
+from yasdiwrapper.channelcatalog import ChannelCatalog
+from yasdiwrapper.channelreader import ChannelReader
+from yasdiwrapper.nativehost import NativeHost, HostedYasdi, HostedYasdiMaster, YasdiTimeoutError, TARGET_LIBRARY
+
+
+class NativeHostTests(unittest.TestCase):
+
+    def detectDevices(self, yasdi, yasdiMaster):
+        for driverHandle in yasdi.yasdiGetDrivers():
+            yasdi.yasdiSetDriverOnline(driverHandle)
+        yasdiMaster.DoMasterCmdEx(cmd=CMD_DEVICE_DETECTION, param1=2)
+
+    def testWatchdogRecovery(self):
+        recoveries = []
+        nativeHost = NativeHost(libraryFactory=functools.partial(SimulatedYasdi, devicesPerDriver=2, timeScale=0),
+                                callTimeout=1.0, resetTimeout=1.0, onRecovery=recoveries.append)
+        try:
+            yasdi, yasdiMaster = HostedYasdi(nativeHost), HostedYasdiMaster(nativeHost)
+            self.detectDevices(yasdi, yasdiMaster)
+            self.assertEqual([1, 2], yasdiMaster.GetDeviceHandles())
+            channelReader = ChannelReader(yasdiMaster, ChannelCatalog(yasdiMaster))
+            readBuffer = channelReader.readChannels([1, 2], [CHANNEl_NAME_PAC, CHANNEL_NAME_STATUS])
+            self.assertEqual([YE_OK] * 4, list(readBuffer.errorCodes))
+            self.assertEqual(2.0, readBuffer.values[1])
+            pac = readBuffer.channelHandles[0]
+
+            # A hanging call is released by yasdiReset
+            nativeHost.call(TARGET_LIBRARY, "injectHang", (60,))
+            with self.assertRaises(YasdiTimeoutError):
+                yasdiMaster.GetChannelValue(pac, 1, 0)
+            self.assertEqual([False], recoveries)
+            self.assertEqual(1, nativeHost.resets)
+            self.detectDevices(yasdi, yasdiMaster)
+            self.assertGreater(yasdiMaster.GetChannelValue(pac, 1, 0), 0)
+
+            # A call which even yasdiReset does not release restarts the worker process
+            nativeHost.call(TARGET_LIBRARY, "injectHang", (60, False))
+            with self.assertRaises(YasdiTimeoutError):
+                yasdiMaster.GetChannelValue(pac, 1, 0)
+            self.assertEqual([False, True], recoveries)
+            self.assertEqual(1, nativeHost.restarts)
+            self.assertEqual([], yasdiMaster.GetDeviceHandles())
+            self.detectDevices(yasdi, yasdiMaster)
+            channelReader.channelCatalog.rebindHandles([1, 2])
+            self.assertEqual(pac, channelReader.channelCatalog.findChannel(2, CHANNEl_NAME_PAC).handle)
+            self.assertGreater(yasdiMaster.GetChannelValue(pac, 1, 0), 0)
+        finally:
+            nativeHost.close()
+
+    def testBatchReadHasADeadlinePerRead(self):
+        nativeHost = NativeHost(libraryFactory=functools.partial(SimulatedYasdi, devicesPerDriver=2, timeScale=1,
+                                                                 baudrate=2400),
+                                callTimeout=1.0, resetTimeout=1.0)
+        try:
+            yasdi, yasdiMaster = HostedYasdi(nativeHost), HostedYasdiMaster(nativeHost)
+            self.detectDevices(yasdi, yasdiMaster)
+            channelReader = ChannelReader(yasdiMaster, ChannelCatalog(yasdiMaster))
+            # 6 reads of about 0.35 s each: the batch needs twice the deadline of a call
+            readBuffer = channelReader.readChannels([1, 2], [CHANNEl_NAME_PAC, CHANNEl_NAME_ETOTAL, CHANNEL_NAME_STATUS], 0)
+            self.assertEqual([YE_OK] * 6, list(readBuffer.errorCodes))
+            self.assertEqual(0, nativeHost.resets + nativeHost.restarts)
+
+            # A hanging read within the batch still misses the deadline
+            nativeHost.call(TARGET_LIBRARY, "injectHang", (60,))
+            with self.assertRaises(YasdiTimeoutError):
+                channelReader.readChannels([1, 2], [CHANNEl_NAME_PAC], 0)
+            self.assertEqual(1, nativeHost.resets)
+        finally:
+            nativeHost.close()
+
+    def testHangAfterProgressIsFoundWithinTheDeadline(self):
+        nativeHost = NativeHost(libraryFactory=functools.partial(SimulatedYasdi, devicesPerDriver=2, timeScale=1,
+                                                                 baudrate=9600),
+                                callTimeout=1.0, resetTimeout=1.0)
+        try:
+            yasdi, yasdiMaster = HostedYasdi(nativeHost), HostedYasdiMaster(nativeHost)
+            self.detectDevices(yasdi, yasdiMaster)
+            channelReader = ChannelReader(yasdiMaster, ChannelCatalog(yasdiMaster))
+            channelNames = [CHANNEl_NAME_PAC, CHANNEl_NAME_ETOTAL, CHANNEL_NAME_STATUS]
+            channelReader.prepare([1, 2], channelNames)
+            # The third read (after about 0.15 s of reads with progress) hangs
+            nativeHost.call(TARGET_LIBRARY, "injectHang", (60,), {"after": 2})
+            start = time.monotonic()
+            with self.assertRaises(YasdiTimeoutError):
+                channelReader.readChannels([1, 2], channelNames, 0)
+            # One deadline after the last progress, not two
+            self.assertLess(time.monotonic() - start, 1.6)
+        finally:
+            nativeHost.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the batch parameter writes against the simulated YASDI library.
+"""
+
+import unittest
+from yasdiwrapper.yasdi import *
+from yasdiwrapper.channelcatalog import ChannelCatalog
+from yasdiwrapper.buspoller import BusPoller
+from yasdiwrapper.parameterwriter import *
+from tests.simulation import detectedMaster
+
+
+class ParameterWriterTests(unittest.TestCase):
+
+    def testBatchWrites(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(driverCount=2, devicesPerDriver=2)
+        channelCatalog = ChannelCatalog(yasdiMaster)
+        busPoller = BusPoller(yasdiMaster, channelCatalog, {1: [1, 2], 2: [3, 4]})
+        sleeps = []
+        parameterWriter = ParameterWriter(yasdiMaster, channelCatalog, busPoller, writesPerSecond=0, retryDelay=0.5,
+                                          sleep=sleeps.append)
+        simulator.injectError(YE_TIMEOUT, deviceHandle=2, channelName="Plimit", count=2)
+        try:
+            results = parameterWriter.writeChannels([(1, "Plimit", 1000.0),
+                                                     (1, "Plimit", 2000.0),
+                                                     (2, "Plimit", 2000.0),
+                                                     (3, "Plimit", 2500.0),
+                                                     (4, "Plimit", 5000.0),
+                                                     (4, "Unknown", 1.0),
+                                                     (4, "Pac", 1.0)])
+        finally:
+            busPoller.shutdown()
+        self.assertEqual([WRITE_SUPERSEDED, WRITE_OK, WRITE_OK, WRITE_UNCHANGED, WRITE_OUT_OF_RANGE,
+                          WRITE_UNKNOWN_CHANNEL, WRITE_NOT_PARAMETER], [result.status for result in results])
+        self.assertEqual(2, results[2].attempts)
+        self.assertEqual([0.5], sleeps)
+        self.assertEqual((YE_CHAN_TYPE_MISMATCH, 0), (results[6].errorCode, results[6].attempts))
+        self.assertEqual(2000.0, yasdiMaster.GetChannelValue(yasdiMaster.FindChannelName(1, "Plimit"), 1, 0))
+        self.assertEqual(2500.0, yasdiMaster.GetChannelValue(yasdiMaster.FindChannelName(4, "Plimit"), 4, 0))
+
+    def testReadsBeforeWritesUseTheBusLimits(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(devicesPerDriver=1)
+        acquired = []
+
+        class CountingAdmission:
+            def acquire(self, sleep):
+                acquired.append(simulator.callCount)
+
+        waits = []
+        parameterWriter = ParameterWriter(yasdiMaster, ChannelCatalog(yasdiMaster), writesPerSecond=4.0,
+                                          sleep=waits.append, busAdmissions={None: CountingAdmission()})
+        callCount = simulator.callCount
+        results = parameterWriter.writeChannels([(1, "Plimit", 1000.0), (1, "Pac", 1.0)])
+        self.assertEqual([WRITE_OK, WRITE_NOT_PARAMETER], [result.status for result in results])
+        # Read of the current value and the write: both wait for the rate limit and the admission. Pac never
+        # reached the bus.
+        self.assertEqual([callCount, callCount + 1], acquired)
+        self.assertEqual(2, simulator.callCount - callCount)
+        self.assertEqual(1, len(waits))
+
+    def testRateLimiter(self):
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        rateLimiter = RateLimiter(4.0, clock=lambda: now[0], sleep=sleep)
+        for _ in range(3):
+            rateLimiter.wait()
+        self.assertEqual([0.25, 0.25], sleeps)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the poll scheduler (intervals, priorities, backoff) against the simulated YASDI library.
+"""
+
+import unittest
+from yasdiwrapper.yasdi import *
+from yasdiwrapper.sd1channels import *
+from yasdiwrapper.channelcatalog import ChannelCatalog
+from yasdiwrapper.pollscheduler import PollScheduler, ChannelSchedule
+from tests.simulation import detectedMaster
+
+
+class PollSchedulerTests(unittest.TestCase):
+
+    def testIntervalsAndBackoff(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(devicesPerDriver=2)
+        now = [0.0]
+        scheduler = PollScheduler(yasdiMaster, ChannelCatalog(yasdiMaster),
+                                  [ChannelSchedule(CHANNEl_NAME_PAC, interval=2),
+                                   ChannelSchedule(CHANNEl_NAME_ETOTAL, interval=60, priority=1),
+                                   ChannelSchedule(CHANNEL_NAME_STATUS, interval=10, priority=2, onChange=True)],
+                                  clock=lambda: now[0])
+        self.assertEqual([], scheduler.addDevices([1, 2]))
+        simulator.injectError(YE_TIMEOUT, deviceHandle=2)
+
+        results = scheduler.pollDue()
+        self.assertEqual(6, len(results))
+        self.assertEqual(3, sum(1 for result in results if result[4] == YE_TIMEOUT))
+        # Three timed out channels are one timeout of the device: it is not backed off after one cycle
+        self.assertEqual(1, scheduler.deviceTimeouts[2])
+        self.assertNotIn(2, scheduler.deviceBackoffUntil)
+
+        # Slightly late: the next due time stays on the 2 second grid
+        now[0] = 2.5
+        results = scheduler.pollDue()
+        self.assertEqual([(1, CHANNEl_NAME_PAC)], [(result[0], result[1].name) for result in results])
+        self.assertAlmostEqual(1.5, scheduler.timeUntilNextDue())
+
+        # Status did not change: not reported again. Pac of device 2 is due again after its channel backoff.
+        now[0] = 10.0
+        self.assertEqual([(1, CHANNEl_NAME_PAC, YE_OK), (2, CHANNEl_NAME_PAC, YE_TIMEOUT)],
+                         [(result[0], result[1].name, result[4]) for result in scheduler.pollDue()])
+        self.assertEqual(2, scheduler.deviceTimeouts[2])
+
+
+    def testLongOutageDoesNotOverflow(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(devicesPerDriver=1)
+        scheduler = PollScheduler(yasdiMaster, ChannelCatalog(yasdiMaster),
+                                  [ChannelSchedule(CHANNEl_NAME_PAC, interval=2.5)], maxBackoff=300.0,
+                                  clock=lambda: 0.0)
+        scheduler.addDevices([1])
+        task = scheduler.tasks[0]
+        task.failures = 5000
+        scheduler.deviceTimeouts[1] = 5000
+        scheduler.reschedule(task, YE_TIMEOUT, 0.0)
+        self.assertEqual(300.0, task.nextDue)
+        self.assertEqual(300.0, scheduler.deviceBackoffUntil[1])
+
+    def testSwappedHandlesAreRemapped(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(devicesPerDriver=3)
+        scheduler = PollScheduler(yasdiMaster, ChannelCatalog(yasdiMaster), [ChannelSchedule(CHANNEl_NAME_PAC, interval=2)],
+                                  clock=lambda: 0.0)
+        scheduler.addDevices([1, 2, 3])
+        scheduler.deviceTimeouts = {1: 1, 2: 2}
+        scheduler.deviceBackoffUntil = {1: 10.0, 2: 20.0}
+        scheduler.remapDevices({1: 2, 2: 1})
+        self.assertEqual({2: 1, 1: 2}, scheduler.deviceTimeouts)
+        self.assertEqual({2: 10.0, 1: 20.0}, scheduler.deviceBackoffUntil)
+        # Chained: 2 -> 3 -> 4
+        scheduler.remapDevices({2: 3, 3: 4})
+        self.assertEqual([3, 1, 4], [task.deviceHandle for task in scheduler.tasks])
+        self.assertEqual({3: 1, 1: 2}, scheduler.deviceTimeouts)
+
+        scheduler.removeDevices([3])
+        self.assertEqual([1, 4], [task.deviceHandle for task in scheduler.tasks])
+        self.assertEqual({1: 2}, scheduler.deviceTimeouts)
+
+    def testFailedAddAddsNoDevice(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(devicesPerDriver=2)
+        channelCatalog = ChannelCatalog(yasdiMaster)
+        scheduler = PollScheduler(yasdiMaster, channelCatalog, [ChannelSchedule(CHANNEl_NAME_PAC, interval=2)],
+                                  clock=lambda: 0.0)
+        findChannel = channelCatalog.findChannel
+
+        def failOnSecondDevice(deviceHandle, channelName):
+            if deviceHandle == 2:
+                raise TimeoutError("hanging call")
+            return findChannel(deviceHandle, channelName)
+
+        channelCatalog.findChannel = failOnSecondDevice
+        self.assertRaises(TimeoutError, scheduler.addDevices, [1, 2])
+        self.assertEqual([], scheduler.tasks)
+        channelCatalog.findChannel = findChannel
+        self.assertEqual([], scheduler.addDevices([1, 2]))
+        self.assertEqual([1, 2], [task.deviceHandle for task in scheduler.tasks])
+
+
+if __name__ == '__main__':
+    unittest.main()
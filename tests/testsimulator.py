@@ -0,0 +1,73 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the simulated YASDI library. No hardware needed.
+"""
+
+import math
+import unittest
+from yasdiwrapper.yasdi import *
+from yasdiwrapper.yasdimaster import *
+from yasdiwrapper.sd1channels import *
+from tests.simulation import detectedMaster
+
+
+class SimulatedYasdiTests(unittest.TestCase):
+
+    def setUp(self):
+        self.simulator, self.yasdi, self.yasdiMaster = detectedMaster()
+
+    def testYasdiDrivers(self):
+        driverHandleList = self.yasdi.yasdiGetDrivers()
+        self.assertEqual([1], driverHandleList)
+        self.assertEqual("COM1", self.yasdi.yasdiGetDriverName(driverHandleList[0]))
+        self.assertTrue(self.yasdi.yasdiSetDriverOffline(driverHandleList[0]))
+
+    def testYasdiMaster(self):
+        deviceHandles = self.yasdiMaster.GetDeviceHandles()
+        self.assertEqual(2, len(deviceHandles))
+
+        firstDeviceHandle = deviceHandles[0]
+        self.assertEqual("WR21TL06 2000000001", self.yasdiMaster.GetDeviceName(firstDeviceHandle))
+        self.assertEqual(2000000001, self.yasdiMaster.GetDeviceSN(firstDeviceHandle))
+        self.assertEqual("WR21TL06", self.yasdiMaster.GetDeviceType(firstDeviceHandle))
+
+        spotChannelList = self.yasdiMaster.GetChannelHandlesEx(firstDeviceHandle, SPOTCHANNELS)
+        paramChannelList = self.yasdiMaster.GetChannelHandlesEx(firstDeviceHandle, PARAMCHANNELS)
+        allChannelList = self.yasdiMaster.GetChannelHandlesEx(firstDeviceHandle, ALLCHANNELS)
+        self.assertGreater(len(spotChannelList), 0)
+        self.assertGreater(len(paramChannelList), 0)
+        self.assertGreater(len(allChannelList), len(spotChannelList) + len(paramChannelList) - 1)
+
+        channelHandlePac = self.yasdiMaster.FindChannelName(firstDeviceHandle, CHANNEl_NAME_PAC)
+        self.assertNotEqual(INVALID_HANDLE, channelHandlePac)
+        self.assertEqual(CHANNEl_NAME_PAC, self.yasdiMaster.GetChannelName(channelHandlePac))
+        self.assertEqual("W", self.yasdiMaster.GetChannelUnit(channelHandlePac))
+        self.assertEqual(INVALID_HANDLE, self.yasdiMaster.FindChannelName(firstDeviceHandle, "Unknown"))
+
+        channelValue = self.yasdiMaster.GetChannelValue(channelHandlePac, firstDeviceHandle, 1)
+        self.assertFalse(math.isnan(channelValue))
+        self.assertGreater(self.yasdiMaster.GetChannelValueTimeStamp(channelHandlePac, firstDeviceHandle), 0)
+
+        channelHandleStatus = self.yasdiMaster.FindChannelName(firstDeviceHandle, CHANNEL_NAME_STATUS)
+        self.assertEqual(5, self.yasdiMaster.GetChannelStatTextCnt(channelHandleStatus))
+        self.assertEqual("Mpp", self.yasdiMaster.GetChannelStatText(channelHandleStatus, 2))
+        self.assertEqual((0x0809, 8), self.yasdiMaster.GetChannelMask(channelHandleStatus))
+
+        channelHandlePlimit = self.yasdiMaster.FindChannelName(firstDeviceHandle, "Plimit")
+        self.assertEqual((0.0, 3000.0), self.yasdiMaster.GetChannelValRange(channelHandlePlimit))
+        self.assertEqual((None, None), self.yasdiMaster.GetChannelValRange(channelHandlePac))
+        self.assertTrue(self.yasdiMaster.SetChannelValue(channelHandlePlimit, firstDeviceHandle, 1500))
+        self.assertEqual(1500.0, self.yasdiMaster.GetChannelValue(channelHandlePlimit, firstDeviceHandle, 0))
+        self.assertFalse(self.yasdiMaster.SetChannelValue(channelHandlePlimit, firstDeviceHandle, 5000))
+
+    def testInjectedTimeout(self):
+        firstDeviceHandle = self.yasdiMaster.GetDeviceHandles()[0]
+        channelHandlePac = self.yasdiMaster.FindChannelName(firstDeviceHandle, CHANNEl_NAME_PAC)
+        self.simulator.injectError(YE_TIMEOUT, deviceHandle=firstDeviceHandle, count=1)
+        self.assertTrue(math.isnan(self.yasdiMaster.GetChannelValue(channelHandlePac, firstDeviceHandle, 0)))
+        self.assertFalse(math.isnan(self.yasdiMaster.GetChannelValue(channelHandlePac, firstDeviceHandle, 0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the output sinks.
+"""
+
+import os
+import unittest
+from yasdiwrapper.sd1channels import *
+from yasdiwrapper.channelcatalog import ChannelCatalog, ChannelInfo
+from yasdiwrapper.sinks import SinkPipeline, SnapshotSink, CsvSink, BinarySink, readBinaryRecords
+from tests.simulation import detectedMaster, temporaryDirectory
+
+
+class SinkTests(unittest.TestCase):
+
+    def testSinks(self):
+        simulator, yasdi, yasdiMaster = detectedMaster()
+        channelCatalog = ChannelCatalog(yasdiMaster)
+        pac = channelCatalog.findChannel(1, CHANNEl_NAME_PAC)
+        eTotal = channelCatalog.findChannel(1, CHANNEl_NAME_ETOTAL)
+        directory = temporaryDirectory(self)
+        snapshotFile = os.path.join(directory, "data.csv")
+        binarySink = BinarySink(directory)
+        sinkPipeline = SinkPipeline([SnapshotSink(snapshotFile), CsvSink(directory), binarySink])
+        for second in range(3):
+            sinkPipeline.write([("WR1", pac, 1700000000 + second, 100.0 + second),
+                                ("WR1", eTotal, 1700000000 + second, 5.5)])
+        sinkPipeline.close()
+
+        with open(snapshotFile, encoding="utf-8") as f:
+            self.assertEqual(3, len(f.readlines()))
+        records = list(readBinaryRecords(binarySink.rotatingFile.path))
+        self.assertEqual(6, len(records))
+        self.assertEqual(("WR1", "Pac", "W", 1700000002, 102.0), records[4])
+
+
+    def testRestartContinuesFiles(self):
+        pac, eTotal = ChannelInfo("Pac", unit="W"), ChannelInfo("E-Total", unit="kWh")
+        directory = temporaryDirectory(self)
+        binarySink, csvSink = BinarySink(directory), CsvSink(directory)
+        for sink in (binarySink, csvSink):
+            sink.write([("Wechselrichter Süd", pac, 1700000000, 100.0)])
+            sink.close()
+
+        # Power loss during a write: the files end with a partly written record
+        with open(binarySink.rotatingFile.path, "ab") as f:
+            f.write(b"\x01\x00\x00")
+        with open(csvSink.rotatingFile.path, "a", encoding="utf-8") as f:
+            f.write("Wechselrichter Süd;Pa")
+
+        # After a restart the same files are continued, the new key is added to the existing key table
+        binarySink, csvSink = BinarySink(directory), CsvSink(directory)
+        for sink in (binarySink, csvSink):
+            sink.write([("Wechselrichter Süd", eTotal, 1700000001, 5.5),
+                        ("Wechselrichter Süd", pac, 1700000001, 101.0)])
+            sink.close()
+        self.assertEqual([("Wechselrichter Süd", "Pac", "W", 1700000000, 100.0),
+                          ("Wechselrichter Süd", "E-Total", "kWh", 1700000001, 5.5),
+                          ("Wechselrichter Süd", "Pac", "W", 1700000001, 101.0)],
+                         list(readBinaryRecords(binarySink.rotatingFile.path)))
+        self.assertEqual(os.path.getsize(csvSink.rotatingFile.path), csvSink.rotatingFile.size)
+        with open(csvSink.rotatingFile.path, "r", encoding="utf-8") as f:
+            self.assertEqual(["Wechselrichter Süd;Pa", "Wechselrichter Süd;E-Total;kWh;1700000001;5.5"],
+                             f.read().splitlines()[2:4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unittests of the value cache against the simulated YASDI library.
+"""
+
+import threading
+import time
+import unittest
+from yasdiwrapper.sd1channels import *
+from yasdiwrapper.valuecache import CachedYasdiMaster
+from tests.simulation import detectedMaster
+
+
+class ValueCacheTests(unittest.TestCase):
+
+    def testConcurrentReadsAreCoalesced(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(devicesPerDriver=1, timeScale=1)
+        cachedMaster = CachedYasdiMaster(yasdiMaster, maxEntries=2)
+        pac = yasdiMaster.FindChannelName(1, CHANNEl_NAME_PAC)
+        barrier = threading.Barrier(8)
+        values = []
+
+        def readPac():
+            barrier.wait()
+            values.append(cachedMaster.GetChannelValue(pac, 1, 5))
+
+        threads = [threading.Thread(target=readPac) for _ in range(8)]
+        callCount = simulator.callCount
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, simulator.callCount - callCount)
+        self.assertEqual(1, len(set(values)))
+
+        # Young enough values are served from memory, a maximal age of 0 always reads the device
+        self.assertEqual(values[0], cachedMaster.GetChannelValue(pac, 1, 5))
+        self.assertEqual(1, simulator.callCount - callCount)
+        self.assertGreater(cachedMaster.GetChannelValueTimeStamp(pac, 1), 0)
+        cachedMaster.GetChannelValue(pac, 1, 0)
+        self.assertEqual(2, simulator.callCount - callCount)
+
+        # Bounded size: least recently used values are evicted
+        for channelName in (CHANNEl_NAME_ETOTAL, CHANNEL_NAME_STATUS):
+            cachedMaster.GetChannelValue(yasdiMaster.FindChannelName(1, channelName), 1, 5)
+        self.assertEqual(2, len(cachedMaster.values))
+        self.assertNotIn((1, pac), cachedMaster.values)
+
+    def testPendingReadOfAnOlderValueIsNotJoined(self):
+        simulator, yasdi, yasdiMaster = detectedMaster(devicesPerDriver=1, timeScale=0)
+        now = [1000.0]
+        cachedMaster = CachedYasdiMaster(yasdiMaster, maxEntryAge=300.0, clock=lambda: now[0])
+        pac = yasdiMaster.FindChannelName(1, CHANNEl_NAME_PAC)
+        simulator.injectHang(0.5, releasedByReset=False)
+        callCount = simulator.callCount
+        tolerantReader = threading.Thread(target=cachedMaster.GetChannelValue, args=(pac, 1, 60))
+        tolerantReader.start()
+        while not cachedMaster.pendingReads:
+            time.sleep(0.01)
+        # The pending read may deliver a value of 60 seconds: a caller which accepts 1 second reads itself
+        cachedMaster.GetChannelValue(pac, 1, 1)
+        self.assertEqual(2, simulator.callCount - callCount)
+        tolerantReader.join()
+        self.assertEqual({}, cachedMaster.pendingReads)
+
+        # Entries older than 'maxEntryAge' don't deliver a timestamp
+        cachedMaster.values[(1, pac)].timestamp = 1
+        simulator.devices[1].values.clear()
+        self.assertFalse(cachedMaster.GetChannelValueTimeStamp(pac, 1))
+        self.assertNotIn((1, pac), cachedMaster.values)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,8 +15,11 @@ os.environ["LD_LIBRARY_PATH"] = os.getcwd() # for Linux/Unix
 
 class YasdiTests(unittest.TestCase):
 
-    yasdiMaster = YasdiMaster()
-    yasdi = Yasdi()
+    @classmethod
+    def setUpClass(cls):
+        # The libraries are loaded and initialized when the tests run, not when they are collected
+        cls.yasdiMaster = YasdiMaster()
+        cls.yasdi = Yasdi()
 
     def setUp(self):
         """"""
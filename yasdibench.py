@@ -0,0 +1,328 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Benchmarks of the Python wrapper against the simulated YASDI library (no hardware, no bus waiting times).
+
+Measures the latency of every YasdiMaster method, the poll cycle time of the demon (poll scheduler with bus admission,
+metrics of all reads, all sinks) for growing counts of devices and channels, the memory allocated per poll cycle and
+the startup time (import of the demon, creation of the wrapper objects). The results can be saved as baseline and later
+runs compared against it:
+
+    python3 yasdibench.py --save-baseline bench_baseline.json
+    python3 yasdibench.py --baseline bench_baseline.json
+
+The simulated library itself is implemented in Python, so the absolute numbers contain its overhead as well.
+They are meant for comparisons between versions of the wrapper, not as absolute times of the native library.
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from yasdiwrapper.yasdi import Yasdi, YE_OK
+from yasdiwrapper.yasdimaster import YasdiMaster, SPOTCHANNELS, CMD_DEVICE_DETECTION
+from yasdiwrapper.channelcatalog import ChannelCatalog
+from yasdiwrapper.buspoller import BusPoller
+from yasdiwrapper.pollscheduler import PollScheduler, ChannelSchedule
+from yasdiwrapper.busmodel import BusModel, BusAdmission
+from yasdiwrapper.changefilter import ChangeFilter, FilteredSink, ReportRule
+from yasdiwrapper.history import TimeSeriesStore
+from yasdiwrapper.liveboard import LiveBoardWriter
+from yasdiwrapper.sinks import SinkPipeline, SnapshotSink, CsvSink
+from yasdiwrapper.metrics import Metrics, InstrumentedYasdiMaster
+from yasdiwrapper.simulator import SimulatedYasdi, defaultChannels
+
+# Constants
+
+DEVICE_COUNTS = [1, 10, 25, 50]
+CHANNEL_COUNTS = [2, 16, 64, 255]
+PERCENTILES = [50, 90, 99]
+# Poll cycles of an allocation measurement
+ALLOCATION_CYCLES = 20
+STARTUP_REPEATS = 5
+# Bus of the poll cycle: all devices on one driver, polled by its worker thread like in the demon
+BENCH_BUS = 1
+BENCH_BAUDRATE = 19200
+# Seconds between two poll cycles of the scheduler and the bus admission: every channel is due and the admission
+# window holds all reads of a cycle (50 devices x 255 channels need about 700 s at 19200 baud)
+CYCLE_SECONDS = 100000.0
+# Values per series in the history store (the demon keeps a day, the benchmark only needs the appends)
+HISTORY_CAPACITY = 100
+HISTORY_MAX_SERIES = 128
+
+# Runs in a new interpreter: prints the nanoseconds of the import of the demon and of the creation of the wrapper
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter_ns()
+import yasdidemon
+imported = time.perf_counter_ns()
+from yasdiwrapper.yasdi import Yasdi
+from yasdiwrapper.yasdimaster import YasdiMaster
+from yasdiwrapper.simulator import SimulatedYasdi
+simulator = SimulatedYasdi(timeScale=0)
+created = time.perf_counter_ns()
+Yasdi(), Yasdi(library=simulator), YasdiMaster(library=simulator)
+print(imported - start, time.perf_counter_ns() - created)
+"""
+
+
+# Implementation
+
+def createMaster(deviceCount, channelCount=0):
+    """Simulated yasdi with all devices detected. At least 'channelCount' spot channels per device."""
+    spotChannelCount = sum(1 for channel in defaultChannels() if channel.group == SPOTCHANNELS)
+    extraChannels = max(0, channelCount - spotChannelCount)
+    simulator = SimulatedYasdi(devicesPerDriver=deviceCount, timeScale=0,
+                               deviceTypes={"WR21TL06": defaultChannels(extraChannels)})
+    yasdi = Yasdi(library=simulator)
+    yasdiMaster = YasdiMaster(library=simulator)
+    for driverHandle in yasdi.yasdiGetDrivers():
+        yasdi.yasdiSetDriverOnline(driverHandle)
+    yasdiMaster.DoMasterCmdEx(cmd=CMD_DEVICE_DETECTION, param1=deviceCount)
+    return yasdiMaster
+
+
+def percentiles(durations) -> dict:
+    """Percentiles and maximum of a list of durations (ns) in microseconds"""
+    durations = sorted(durations)
+    result = {f"p{percentile}": durations[min(len(durations) - 1, len(durations) * percentile // 100)] / 1000.0
+              for percentile in PERCENTILES}
+    result["max"] = durations[-1] / 1000.0
+    return result
+
+
+def measure(function, repeats) -> dict:
+    clock = time.perf_counter_ns
+    durations = []
+    for _ in range(repeats):
+        start = clock()
+        function()
+        durations.append(clock() - start)
+    return percentiles(durations)
+
+
+def benchmarkMethods(repeats) -> dict:
+    """Latency of every YasdiMaster method (microseconds)"""
+    yasdiMaster = createMaster(1)
+    deviceHandle = yasdiMaster.GetDeviceHandles()[0]
+    pac = yasdiMaster.FindChannelName(deviceHandle, "Pac")
+    status = yasdiMaster.FindChannelName(deviceHandle, "Status")
+    plimit = yasdiMaster.FindChannelName(deviceHandle, "Plimit")
+    methods = {
+        "DoMasterCmdEx": lambda: yasdiMaster.DoMasterCmdEx(cmd=CMD_DEVICE_DETECTION, param1=1),
+        "GetDeviceHandles": lambda: yasdiMaster.GetDeviceHandles(),
+        "GetDeviceName": lambda: yasdiMaster.GetDeviceName(deviceHandle),
+        "GetDeviceSN": lambda: yasdiMaster.GetDeviceSN(deviceHandle),
+        "GetDeviceType": lambda: yasdiMaster.GetDeviceType(deviceHandle),
+        "GetChannelHandlesEx": lambda: yasdiMaster.GetChannelHandlesEx(deviceHandle, SPOTCHANNELS),
+        "FindChannelName": lambda: yasdiMaster.FindChannelName(deviceHandle, "Pac"),
+        "GetChannelName": lambda: yasdiMaster.GetChannelName(pac),
+        "GetChannelValue": lambda: yasdiMaster.GetChannelValue(pac, deviceHandle, 0),
+        "GetChannelValueTimeStamp": lambda: yasdiMaster.GetChannelValueTimeStamp(pac, deviceHandle),
+        "GetChannelUnit": lambda: yasdiMaster.GetChannelUnit(pac),
+        "SetChannelValue": lambda: yasdiMaster.SetChannelValue(plimit, deviceHandle, 1000.0),
+        "GetChannelStatTextCnt": lambda: yasdiMaster.GetChannelStatTextCnt(status),
+        "GetChannelStatText": lambda: yasdiMaster.GetChannelStatText(status, 2),
+        "GetChannelMask": lambda: yasdiMaster.GetChannelMask(pac),
+        "GetChannelValRange": lambda: yasdiMaster.GetChannelValRange(plimit),
+    }
+    return {name: measure(method, repeats) for name, method in methods.items()}
+
+
+def pollCyclePerValue(yasdiMaster, deviceHandles, channelNames):
+    """Poll cycle with one call chain per value (lookup, value, timestamp, unit)"""
+    for deviceHandle in deviceHandles:
+        for channelName in channelNames:
+            channelHandle = yasdiMaster.FindChannelName(deviceHandle, channelName)
+            yasdiMaster.GetChannelValue(channelHandle, deviceHandle, 0)
+            yasdiMaster.GetChannelValueTimeStamp(channelHandle, deviceHandle)
+            yasdiMaster.GetChannelUnit(channelHandle)
+
+
+class PollCycle:
+
+    """The poll cycle of the demon (see YasdiDemon.pollLiveData) with all devices on one bus: the due channels are read
+    by the poll scheduler in the worker thread of the bus, limited by the bus admission and measured by the metrics.
+    The valid values are written into all sinks (files in 'directory').
+    """
+
+    def __init__(self, yasdiMaster, deviceHandles, channelNames, directory):
+        self.metrics = Metrics()
+        self.yasdiMaster = InstrumentedYasdiMaster(yasdiMaster, self.metrics)
+        self.now = 0.0
+        channelCatalog = ChannelCatalog(self.yasdiMaster)
+        admission = BusAdmission(BusModel(BENCH_BAUDRATE), window=CYCLE_SECONDS, clock=lambda: self.now)
+        self.scheduler = PollScheduler(self.yasdiMaster, channelCatalog,
+                                       [ChannelSchedule(channelName, interval=1) for channelName in channelNames],
+                                       admission=admission)
+        missing = self.scheduler.addDevices(deviceHandles)
+        if missing:
+            raise RuntimeError(f"Channels missing on the simulated devices: {missing}")
+        self.busPoller = BusPoller(self.yasdiMaster, channelCatalog, {BENCH_BUS: list(deviceHandles)})
+        self.deviceNames = {deviceHandle: yasdiMaster.GetDeviceName(deviceHandle) for deviceHandle in deviceHandles}
+        self.yasdiMaster.deviceLabels = self.deviceNames
+        # data.csv is rewritten every cycle (the demon limits it to once a minute): the upper bound of the sink time
+        self.sinkPipeline = SinkPipeline([
+            SnapshotSink(os.path.join(directory, "data.csv")),
+            FilteredSink(CsvSink(os.path.join(directory, "history")),
+                         ChangeFilter({}, ReportRule(relativeDeadband=0.02, maxSilence=300))),
+            TimeSeriesStore(capacity=HISTORY_CAPACITY, maxSeries=HISTORY_MAX_SERIES),
+            LiveBoardWriter(os.path.join(directory, "liveboard.bin"))])
+
+    def pollBus(self, bus, devicesList):
+        return self.scheduler.pollDue(self.now)
+
+    def run(self):
+        self.now += CYCLE_SECONDS
+        cycleStart = time.perf_counter()
+        pollResults = self.busPoller.runOnBuses(self.pollBus)
+        self.metrics.observe("yasdi_poll_cycle_seconds", time.perf_counter() - cycleStart)
+        records = [(self.deviceNames[deviceHandle], channel, timestamp, channelValue)
+                   for busResults in pollResults.values()
+                   for deviceHandle, channel, channelValue, timestamp, errorCode in busResults
+                   if YE_OK == errorCode]
+        sinkStart = time.perf_counter()
+        self.sinkPipeline.write(records)
+        self.metrics.observe("yasdi_sink_write_seconds", time.perf_counter() - sinkStart)
+
+    def close(self):
+        self.busPoller.shutdown()
+        self.sinkPipeline.close()
+
+
+def benchmarkPollCycles(repeats) -> dict:
+    """Poll cycle time (microseconds) and allocations per cycle for all device and channel counts"""
+    results = {}
+    for deviceCount in DEVICE_COUNTS:
+        for channelCount in CHANNEL_COUNTS:
+            yasdiMaster = createMaster(deviceCount, channelCount)
+            deviceHandles = yasdiMaster.GetDeviceHandles()
+            channelNames = [yasdiMaster.GetChannelName(channelHandle) for channelHandle
+                            in yasdiMaster.GetChannelHandlesEx(deviceHandles[0], SPOTCHANNELS)[:channelCount]]
+            if len(channelNames) != channelCount:
+                raise RuntimeError(f"The simulated device has {len(channelNames)} spot channels, {channelCount} needed")
+            cycleRepeats = max(3, repeats // (deviceCount * channelCount))
+            with tempfile.TemporaryDirectory() as directory:
+                pollCycle = PollCycle(yasdiMaster, deviceHandles, channelNames, directory)
+                try:
+                    results[f"{deviceCount}x{channelCount}"] = {
+                        "cycle": measure(pollCycle.run, cycleRepeats),
+                        "perValue": measure(lambda: pollCyclePerValue(yasdiMaster, deviceHandles, channelNames),
+                                            cycleRepeats),
+                        "allocations": allocationsPerCycle(pollCycle.run),
+                    }
+                finally:
+                    pollCycle.close()
+    return results
+
+
+def benchmarkStartup(repeats=STARTUP_REPEATS) -> dict:
+    """Import time of the demon and creation time of Yasdi and YasdiMaster in a new interpreter (microseconds)"""
+    importDurations, initDurations = [], []
+    for _ in range(repeats):
+        # Run in the directory of the benchmark, where yasdidemon is found
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        importDuration, initDuration = output.split()
+        importDurations.append(int(importDuration))
+        initDurations.append(int(initDuration))
+    return {"import yasdidemon": percentiles(importDurations), "init": percentiles(initDurations)}
+
+
+def allocationsPerCycle(function, cycles=ALLOCATION_CYCLES) -> dict:
+    """Memory of 'cycles' cycles, traced by tracemalloc:
+    - retainedBlocks: memory blocks per cycle which are still allocated after the cycles (growth, leaks)
+    - peakBytes: largest memory allocated during one cycle on top of the memory before the cycle
+    """
+    # Ignore the allocations of the measurement itself (snapshots, this loop)
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    tracemalloc.start()
+    try:
+        # Warm up while tracing: values replaced in later cycles must have been traced as well
+        function()
+        before = tracemalloc.take_snapshot()
+        peak = 0
+        for _ in range(cycles):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            function()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    # Filtered after both snapshots: the filters allocate caches of their own
+    retainedBlocks = sum(statistic.count_diff for statistic
+                         in after.filter_traces(filters).compare_to(before.filter_traces(filters), "filename"))
+    return {"retainedBlocks": retainedBlocks / cycles, "peakBytes": peak}
+
+
+def compareWithBaseline(results, baseline, tolerance) -> list:
+    """Returns a list of regressions: p50 latencies which are more than 'tolerance' (fraction) slower"""
+    regressions = []
+
+    def compare(name, current, saved):
+        if saved and current["p50"] > saved["p50"] * (1.0 + tolerance):
+            regressions.append(f"{name}: p50 {current['p50']:.1f} us, baseline {saved['p50']:.1f} us")
+
+    for method, current in results["methods"].items():
+        compare(method, current, baseline.get("methods", {}).get(method))
+    for size, current in results["pollCycles"].items():
+        saved = baseline.get("pollCycles", {}).get(size, {})
+        compare(f"poll cycle {size}", current["cycle"], saved.get("cycle"))
+    for step, current in results.get("startup", {}).items():
+        compare(f"startup {step}", current, baseline.get("startup", {}).get(step))
+    return regressions
+
+
+def printResults(results):
+    print("Method latency (us):")
+    for method, stats in results["methods"].items():
+        print(f"  {method:26s} " + " ".join(f"{key}={value:8.1f}" for key, value in stats.items()))
+    print("Poll cycle time (us), devices x channels:")
+    for size, cycle in results["pollCycles"].items():
+        print(f"  {size:8s} cycle p50={cycle['cycle']['p50']:10.1f}  per value p50={cycle['perValue']['p50']:10.1f}"
+              f"  retained blocks/cycle={cycle['allocations']['retainedBlocks']:6.1f}  peak bytes/cycle={cycle['allocations']['peakBytes']}")
+    print("Startup (us):")
+    for step, stats in results["startup"].items():
+        print(f"  {step:26s} " + " ".join(f"{key}={value:8.1f}" for key, value in stats.items()))
+
+
+def main(arguments=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of the YASDI Python wrapper (simulated library)")
+    parser.add_argument("--repeats", type=int, default=2000, help="repeats per method")
+    parser.add_argument("--save-baseline", metavar="FILE", help="store the results as baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="compare the results with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    options = parser.parse_args(arguments)
+
+    results = {"methods": benchmarkMethods(options.repeats), "pollCycles": benchmarkPollCycles(options.repeats * 10),
+               "startup": benchmarkStartup()}
+    printResults(results)
+
+    if options.save_baseline:
+        with open(options.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    if options.baseline:
+        with open(options.baseline, "r", encoding="utf-8") as f:
+            regressions = compareWithBaseline(results, json.load(f), options.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,87 +12,313 @@ __maintainer__ = "Heiko Prüssing"
 
 # imports
 
+import math
 import os
+import queue
+import signal
 import time
-from yasdiwrapper.yasdi import Yasdi, INVALID_HANDLE
+from yasdiwrapper.yasdi import Yasdi, YE_OK
 from yasdiwrapper.yasdimaster import YasdiMaster, CMD_DEVICE_DETECTION
-from yasdiwrapper.sd1channels import CHANNEl_NAME_PAC, CHANNEl_NAME_ETOTAL
+from yasdiwrapper.channelcatalog import ChannelCatalog
+from yasdiwrapper.deviceregistry import DeviceRegistry, BackgroundDetection
+from yasdiwrapper.buspoller import BusPoller, detectDevicesPerDriver
+from yasdiwrapper.pollscheduler import PollScheduler, ChannelSchedule
+from yasdiwrapper.busmodel import BusModel, BusAdmission, readYasdiConfig
+from yasdiwrapper.changefilter import ChangeFilter, FilteredSink, ReportRule
+from yasdiwrapper.history import TimeSeriesStore
+from yasdiwrapper.liveboard import LiveBoardWriter
+from yasdiwrapper.sinks import SinkPipeline, SnapshotSink, CsvSink
+from yasdiwrapper.simulator import SimulatedYasdi
+from yasdiwrapper.nativehost import NativeHost, HostedYasdi, HostedYasdiMaster, YasdiTimeoutError, YasdiHostError
+from yasdiwrapper.metrics import Metrics, InstrumentedYasdiMaster, MetricsFileExporter, MetricsHttpServer
+from yasdiwrapper.sd1channels import CHANNEl_NAME_PAC, CHANNEl_NAME_ETOTAL, CHANNEL_NAME_STATUS
 
-# Globals
+# Implementation
 
-# Search for YASDI libraries also in the current directory first
-os.environ["DYLD_LIBRARY_PATH"] = os.getcwd() # for macOS
-os.environ["LD_LIBRARY_PATH"] = os.getcwd() # for Linux/Unix
+class YasdiDemon:
 
-yasdiMasterLibrary = YasdiMaster()
-yasdiLibrary = Yasdi()
+    def __init__(self):
+        """Loads and initializes the yasdi libraries. Nothing happens on import of this module."""
+        # Recoveries of the native host (see YASDI_NATIVE_HOST): all devices have to be searched again
+        self.recoveries = queue.SimpleQueue()
+        # Metrics of all yasdi calls and of the poll loop. Written to 'metrics.prom', served on
+        # http://127.0.0.1:<YASDI_METRICS_PORT>/metrics if the environment variable is set.
+        self.metrics = Metrics()
+        self.nativeHost = None
 
+        if os.environ.get("YASDI_NATIVE_HOST"):
+            # Set YASDI_NATIVE_HOST=1 to run the yasdi libraries in a supervised worker process. A hanging call ends
+            # with a timeout, the worker is recovered (yasdiReset, then restart) and the devices are searched again.
+            self.nativeHost = NativeHost(libraryFactory=SimulatedYasdi if os.environ.get("YASDI_SIMULATOR") else None,
+                                         onRecovery=self.recoveries.put)
+            self.yasdiMasterLibrary = InstrumentedYasdiMaster(HostedYasdiMaster(self.nativeHost), self.metrics)
+            self.yasdiLibrary = HostedYasdi(self.nativeHost)
+        else:
+            # Set YASDI_SIMULATOR=1 to run the demon without hardware against a simulated yasdi library
+            simulatedLibrary = SimulatedYasdi() if os.environ.get("YASDI_SIMULATOR") else None
+            self.yasdiMasterLibrary = InstrumentedYasdiMaster(YasdiMaster(library=simulatedLibrary), self.metrics)
+            self.yasdiLibrary = Yasdi(library=simulatedLibrary)
+        self.channelCatalog = ChannelCatalog(self.yasdiMasterLibrary, "./channels.json")
+        self.deviceRegistry = DeviceRegistry(self.yasdiMasterLibrary, "./devices.json")
+        self.driverHandles = {}  # driver name -> driver handle (bus)
+        # All devices are searched again with the next poll cycle (after a recovery or a failed update of the devices)
+        self.restorePending = False
 
-# Implementation
+    def pollLiveData(self, busDevices, channelSchedules, outputFile: str="./data.csv", historyDirectory: str="./history",
+                     reportRules=None, busAdmissions=None):
+        """Polls for live data on given devices and channels. The latest values are put into a csv file, the
+        significant changes are appended to daily csv files in the history directory.
+        'busDevices' is a dictionary driver handle -> list of device handles. Every bus is polled in its own thread.
+        'channelSchedules' is a list of ChannelSchedule (poll interval and priority of each channel name).
+        'reportRules' is a dictionary channel name -> ReportRule (deadbands, heartbeat) for the history files.
+        Channels without a rule are written with every value.
+        'busAdmissions' is a dictionary driver handle -> BusAdmission (bandwidth of the bus). Reads which don't fit
+        on a bus are delayed or skipped by priority.
+        """
 
-class YasdiDemon:
+        # Sleep time if there is nothing to poll at all
+        IDLE_SLEEP_SECONDS = 2
+        # Search for new devices on each bus in the background every 5 minutes, for known devices not found yet every
+        # 10 seconds (the delays double after each attempt which found nothing)
+        DETECTION_INTERVAL_SECONDS = 300
+        DETECTION_RETRY_SECONDS = 10
+        # data.csv is rewritten at most once a minute (wear of SD cards), the live board has the current values
+        SNAPSHOT_INTERVAL_SECONDS = 60
+        # Limit of the in-memory history: 128 series (e.g. 3 channels of 42 devices) of one day need about 66 MB
+        HISTORY_MAX_SERIES = 128
+
+        self.channelSchedules = channelSchedules
+        self.busAdmissions = busAdmissions or {}
+        self.busPoller = BusPoller(self.yasdiMasterLibrary, self.channelCatalog, {})
+        self.schedulers = {}
+        # Device names are used as device labels in the output files and metrics
+        self.deviceNames = {}
+        self.yasdiMasterLibrary.deviceLabels = self.deviceNames
+
+        changeFilter = ChangeFilter(reportRules or {})
+        # The values of the last day (2 second poll interval) stay in memory for queries
+        self.historyStore = TimeSeriesStore(capacity=43200, maxSeries=HISTORY_MAX_SERIES)
+        # The latest values of all channels are published in shared memory for other local processes
+        # (see yasdiwrapper.liveboard.LiveBoardReader)
+        liveBoard = LiveBoardWriter()
+        sinkPipeline = SinkPipeline([SnapshotSink(outputFile, minInterval=SNAPSHOT_INTERVAL_SECONDS),
+                                     FilteredSink(CsvSink(historyDirectory), changeFilter),
+                                     self.historyStore,
+                                     liveBoard])
+        metricsExporter = MetricsFileExporter(self.metrics, "./metrics.prom")
+        metricsServer = MetricsHttpServer(self.metrics, int(os.environ["YASDI_METRICS_PORT"])) if os.environ.get("YASDI_METRICS_PORT") else None
+        self.metrics.describe("yasdi_poll_cycle_seconds", "histogram", "Duration of a poll cycle (reading all due channels)")
+        self.metrics.describe("yasdi_sink_write_seconds", "histogram", "Duration of writing the values into all sinks")
+        self.metrics.describe("yasdi_history_records_total", "counter", "Values written into the history files")
+        self.metrics.describe("yasdi_history_records_suppressed_total", "counter", "Values without significant change (not written into the history files)")
+
+        # Changes found by the background detection are applied between two poll cycles
+        registryChanges = queue.SimpleQueue()
+        # The detection attempts run in the bus workers, also on buses without devices yet
+        for driverHandle in self.driverHandles.values():
+            self.busPoller.addBus(driverHandle)
+        self.backgroundDetection = BackgroundDetection(self.yasdiMasterLibrary, self.deviceRegistry, DETECTION_INTERVAL_SECONDS, registryChanges.put,
+                                                       busPoller=self.busPoller,
+                                                       driverNames={driverHandle: driverName for driverName, driverHandle in self.driverHandles.items()} or None,
+                                                       busAdmissions=self.busAdmissions, retryInterval=DETECTION_RETRY_SECONDS)
+        try:
+            # Resolve all channels once. Every poll cycle only reads the due values.
+            try:
+                for bus, devicesList in busDevices.items():
+                    self.addDevices(bus, devicesList)
+            except (YasdiTimeoutError, YasdiHostError) as e:
+                print(f"Adding the devices failed: {e}")
+                self.restorePending = True
+            self.backgroundDetection.start()
+
+            while True:
+                while not self.recoveries.empty():
+                    self.recoveries.get()
+                    self.restorePending = True
+                try:
+                    if self.restorePending:
+                        self.restorePending = False
+                        self.restoreDevices()
+                    while not registryChanges.empty():
+                        self.applyRegistryChanges(registryChanges.get())
+                except (YasdiTimeoutError, YasdiHostError) as e:
+                    # The devices which could not be added are searched again with the next cycle
+                    print(f"Updating the devices failed: {e}")
+                    self.restorePending = True
+
+                cycleStart = time.perf_counter()
+                pollResults = self.busPoller.runOnBuses(self.pollBus)
+                self.metrics.observe("yasdi_poll_cycle_seconds", time.perf_counter() - cycleStart)
+                records = [(self.deviceNames[deviceHandle], channel, timestamp, channelValue)
+                           for busResults in pollResults.values()
+                           for deviceHandle, channel, channelValue, timestamp, errorCode in busResults
+                           if YE_OK == errorCode]
+                sinkStart = time.perf_counter()
+                reportedCount, suppressedCount = changeFilter.reportedCount, changeFilter.suppressedCount
+                sinkPipeline.write(records)
+                for busResults in pollResults.values():
+                    for deviceHandle, channel, channelValue, timestamp, errorCode in busResults:
+                        if YE_OK != errorCode:
+                            liveBoard.update(self.deviceNames[deviceHandle], channel, timestamp, channelValue, errorCode)
+                self.metrics.observe("yasdi_sink_write_seconds", time.perf_counter() - sinkStart)
+                self.metrics.increment("yasdi_history_records_total", amount=changeFilter.reportedCount - reportedCount)
+                self.metrics.increment("yasdi_history_records_suppressed_total", amount=changeFilter.suppressedCount - suppressedCount)
+                metricsExporter.export()
 
-    def pollLiveData(self, devicesList, channelsToRequest, outputFile: str="./data.csv"):
-        """Polls for live data on given devices and channel names and put it into a csv file."""
-
-        # The age of the channel value should not older than 1 second
-        AGE_OF_VALUE_SECONDS = 1
-    
-        while True:
-            outputBuffer = "ChannelName;ChannelUnit;ValueTimestamp;ChannelValue\n"
-            for deviceHandle in devicesList:
-                for channelName in channelsToRequest:
-                    channelHandle = yasdiMasterLibrary.FindChannelName(deviceHandle, channelName)
-                    if INVALID_HANDLE == channelHandle:
-                        print(f"Error: Channel {channelName} is missing on device {yasdiMasterLibrary.GetDeviceName(deviceHandle)}. Check your device detection...")
-                    else:
-                        channelValue = yasdiMasterLibrary.GetChannelValue(channelHandle, deviceHandle, AGE_OF_VALUE_SECONDS)
-                        timestamp = yasdiMasterLibrary.GetChannelValueTimeStamp(channelHandle, deviceHandle)
-                        channelUnit = yasdiMasterLibrary.GetChannelUnit(channelHandle)
-                        # print(f"{channelName};{channelUnit};{timestamp};{channelValue}")
-                        outputBuffer = outputBuffer + f"{channelName};{channelUnit};{timestamp};{channelValue}\n"
-            
-            # Write data to a csv file
-            with open(outputFile, 'w', encoding="utf-8") as f:
-                f.write(outputBuffer)
-                f.close()
-
-            time.sleep(2)
+                sleepTime = min((scheduler.timeUntilNextDue() for scheduler in self.schedulers.values()), default=IDLE_SLEEP_SECONDS)
+                time.sleep(IDLE_SLEEP_SECONDS if sleepTime == math.inf else sleepTime)
+        finally:
+            self.backgroundDetection.stop()
+            self.busPoller.shutdown()
+            sinkPipeline.close()
+            metricsExporter.export(force=True)
+            if metricsServer is not None:
+                metricsServer.shutdown()
+
+    def pollBus(self, bus, devicesList):
+        """Reads the due channels of a bus. A failed bus delivers no results, the other buses are not affected."""
+        scheduler = self.schedulers.get(bus)
+        if scheduler is None:
+            # Bus without devices (yet)
+            return []
+        try:
+            return scheduler.pollDue()
+        except (YasdiTimeoutError, YasdiHostError) as e:
+            print(f"Poll of bus {bus} failed: {e}")
+            return []
+
+    def addDevices(self, bus, devicesList):
+        """Adds devices of a bus (driver handle, None if unknown) to the poll loop. If a call into yasdi fails, none of
+        the devices is added.
+        """
+        deviceNames = {deviceHandle: self.yasdiMasterLibrary.GetDeviceName(deviceHandle) for deviceHandle in devicesList}
+        if bus not in self.schedulers:
+            self.schedulers[bus] = PollScheduler(self.yasdiMasterLibrary, self.channelCatalog, self.channelSchedules,
+                                                 admission=self.busAdmissions.get(bus))
+        for deviceHandle, channelName in self.schedulers[bus].addDevices(devicesList):
+            print(f"Error: Channel {channelName} is missing on device {deviceNames[deviceHandle]}. Check your device detection...")
+        self.busPoller.addDevices(bus, devicesList)
+        self.deviceNames.update(deviceNames)
+        admission = self.busAdmissions.get(bus)
+        if admission is not None:
+            warning = admission.checkSchedules(self.channelSchedules, len(self.busPoller.busDevices[bus]))
+            if warning is not None:
+                print(f"Warning: Bus {bus} is overloaded: {warning}")
+
+    def applyRegistryChanges(self, changes, candidates=None):
+        """Applies the changes found by the background device detection. 'candidates' are the devices which are
+        polled if they are not yet (default: the new and the found devices of the changes).
+        """
+        # Missing devices are removed first: their former handles may be given to other devices in the same change
+        for device in changes.missing:
+            print(f"Device {device.name} is not available anymore.")
+        if changes.releasedHandles:
+            self.busPoller.removeDevices(changes.releasedHandles)
+            for scheduler in self.schedulers.values():
+                scheduler.removeDevices(changes.releasedHandles)
+            for deviceHandle in changes.releasedHandles:
+                self.deviceNames.pop(deviceHandle, None)
+        if changes.remapped:
+            self.busPoller.remapDevices(changes.remapped)
+            for scheduler in self.schedulers.values():
+                scheduler.remapDevices(changes.remapped)
+            # The dictionary is shared with the metrics (device labels): it is replaced in place in one step
+            deviceNames = {changes.remapped.get(deviceHandle, deviceHandle): name for deviceHandle, name in self.deviceNames.items()}
+            self.deviceNames.clear()
+            self.deviceNames.update(deviceNames)
+        # A device found again is polled by the worker of the driver it was last seen on. The driver of a new device is
+        # unknown if there are several drivers: it is polled after all buses (see BusPoller).
+        polledDevices = {deviceHandle for devicesList in self.busPoller.busDevices.values() for deviceHandle in devicesList}
+        newBusDevices = {}
+        for device in changes.newDevices + changes.found if candidates is None else candidates:
+            if device.handle is None or device.handle in polledDevices:
+                continue
+            bus = self.driverHandles.get(device.driverName)
+            if bus is None and len(self.driverHandles) == 1:
+                bus = next(iter(self.driverHandles.values()))
+            newBusDevices.setdefault(bus, []).append(device.handle)
+            print(f"Found device: {device.name} on interface driver '{device.driverName or 'unknown'}'")
+        for bus, devicesList in newBusDevices.items():
+            self.addDevices(bus, devicesList)
+
+    def restoreDevices(self):
+        """Searches all devices again after a recovery of the native host (all handles of yasdi are invalid). Only one
+        device is waited for, the other known devices are found by the background detection.
+        """
+        print("yasdi was recovered, searching the devices again...")
+        for driverHandle in self.yasdiLibrary.yasdiGetDrivers():
+            self.yasdiLibrary.yasdiSetDriverOnline(driverHandle)
+        self.yasdiMasterLibrary.DoMasterCmdEx(cmd=CMD_DEVICE_DETECTION, param1=1)
+        self.channelCatalog.rebindHandles(self.yasdiMasterLibrary.GetDeviceHandles())
+        # All known devices which are not polled (e.g. after a failed update) are added again
+        changes = self.deviceRegistry.refresh()
+        self.applyRegistryChanges(changes, list(self.deviceRegistry.devices.values()))
+        self.backgroundDetection.searchAgain()
 
     def start(self):
         try:
-            driverHandleList = yasdiLibrary.yasdiGetDrivers()
+            driverHandleList = self.yasdiLibrary.yasdiGetDrivers()
             if len(driverHandleList) == 0:
                 raise Exception("Error: No configured interfaces available! Please check your YASDI configuration try again...")
 
-            # Open all interfaces (drivers)
-            for driverHandle in driverHandleList:
-                print(f"Open interface driver '{yasdiLibrary.yasdiGetDriverName(driverHandle)}'. Success = {yasdiLibrary.yasdiSetDriverOnline(driverHandle)}" )
-
-            # Search for SMA devices (inverters, etc...)
+            # Open all interfaces (drivers) one by one and search for SMA devices (inverters, etc...) on each of them.
+            # Only one device per driver is waited for, so the poll starts early. The other known devices from the
+            # last run and new devices are searched later in the background, on each bus between its poll cycles.
             print("Start searching SMA devices...")
-            COUNT_OF_DEVICES_TO_BE_SEARCHED = 1
-            if not yasdiMasterLibrary.DoMasterCmdEx(cmd=CMD_DEVICE_DETECTION, param1=COUNT_OF_DEVICES_TO_BE_SEARCHED):
-                print("Device detection failed for some reason. Maybe not all devices are found as requested.")
+            COUNT_OF_DEVICES_TO_BE_SEARCHED_PER_DRIVER = 1
+            driverNames = {driverHandle: self.yasdiLibrary.yasdiGetDriverName(driverHandle) for driverHandle in driverHandleList}
+            self.driverHandles = {driverName: driverHandle for driverHandle, driverName in driverNames.items()}
+            busDevices = detectDevicesPerDriver(self.yasdiLibrary, self.yasdiMasterLibrary, driverHandleList, COUNT_OF_DEVICES_TO_BE_SEARCHED_PER_DRIVER)
+            for driverHandle, devicesList in busDevices.items():
+                self.deviceRegistry.refresh(driverNames[driverHandle], devicesList)
 
-            # Get the list of found SMA devices
-            devicesList = yasdiMasterLibrary.GetDeviceHandles()
-            for deviceHandle in devicesList:
-                print(f"Found device: {yasdiMasterLibrary.GetDeviceName(deviceHandle)}")
+            # Show the list of found SMA devices
+            for driverHandle, devicesList in busDevices.items():
+                for deviceHandle in devicesList:
+                    print(f"Found device: {self.yasdiMasterLibrary.GetDeviceName(deviceHandle)} on interface driver '{driverNames[driverHandle]}'")
+            for device in self.deviceRegistry.devices.values():
+                if device.handle is None:
+                    print(f"Known device {device.name} not found (yet).")
 
-            if len(devicesList) == 0:
+            if sum(len(devicesList) for devicesList in busDevices.values()) == 0:
                 raise Exception("ERROR: No SMA inverters found! Check your hardware or yasdi configuration and try again...")
+
+            # The requests of each bus are limited to the bandwidth of its configured baud rate
+            ports = readYasdiConfig("./yasdi.ini")
+            busAdmissions = {driverHandle: BusAdmission(BusModel(ports[driverName].baudrate))
+                             for driverHandle, driverName in driverNames.items()
+                             if driverName in ports and ports[driverName].baudrate}
         
             # Endless poll for live data from devices:
-            self.pollLiveData(devicesList, [CHANNEl_NAME_PAC, CHANNEl_NAME_ETOTAL])
+            self.pollLiveData(busDevices, [ChannelSchedule(CHANNEl_NAME_PAC, interval=2, priority=0),
+                                           ChannelSchedule(CHANNEl_NAME_ETOTAL, interval=60, priority=1),
+                                           ChannelSchedule(CHANNEL_NAME_STATUS, interval=10, priority=2)],
+                              reportRules={CHANNEl_NAME_PAC: ReportRule(absoluteDeadband=10, relativeDeadband=0.02, maxSilence=300),
+                                           CHANNEl_NAME_ETOTAL: ReportRule(absoluteDeadband=0, maxSilence=900),
+                                           CHANNEL_NAME_STATUS: ReportRule(exactChange=True, maxSilence=3600)},
+                              busAdmissions=busAdmissions)
 
         #except Exception as e:
         #    print(f"=> Exception: {e}")
 
         finally:
-            yasdiMasterLibrary.yasdiMasterShutdown()
+            if self.nativeHost is not None:
+                # Shuts yasdi down in the worker and ends it, also if the worker is already gone (e.g. SIGTERM of the
+                # whole process group)
+                self.nativeHost.close()
+            else:
+                self.yasdiMasterLibrary.yasdiMasterShutdown()
+
+
+def stopOnSignal(signum, frame):
+    """Ends the demon (e.g. SIGTERM of systemd) through the normal exit path: the poll loop closes all files, so the
+    buffered history is written.
+    """
+    signal.signal(signum, signal.SIG_IGN)
+    raise SystemExit(0)
 
 
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, stopOnSignal)
     yasdiDemon = YasdiDemon()
     yasdiDemon.start()
@@ -0,0 +1,145 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""asyncio facade of the YASDI master wrapper.
+
+All calls of the facade are executed one after another by a dedicated worker thread, so the event loop never blocks
+on serial I/O. The serialization is local to the facade: other code which calls the same YasdiMaster directly must
+either pass its own executor to the facade or submit its calls to 'executor' as well.
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from yasdiwrapper.yasdimaster import YasdiMaster, SPOTCHANNELS, CMD_DEVICE_DETECTION
+
+
+# Implementation
+
+class AsyncYasdiMaster:
+
+    """Awaitable versions of the YasdiMaster methods.
+
+    Every method accepts an optional 'timeout' in seconds (default: 'defaultTimeout' of the instance, None = wait
+    forever). On timeout asyncio.TimeoutError is raised. A cancelled or timed out call which is still waiting for
+    the worker is removed from the queue. A call which is already running inside the native library can't be
+    interrupted: it runs to its end in the worker thread and its result is dropped.
+    """
+
+    def __init__(self, yasdiMaster, defaultTimeout=None, executor=None):
+        """'executor' is a single threaded executor shared with other users of 'yasdiMaster' (default: own one)"""
+        self.yasdiMaster = yasdiMaster
+        self.defaultTimeout = defaultTimeout
+        self.ownExecutor = executor is None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yasdi-master") \
+            if executor is None else executor
+
+    @classmethod
+    async def create(cls, ini_file="." + os.sep + "yasdi.ini", defaultTimeout=None, executor=None):
+        """Creates and initializes the YasdiMaster inside the worker thread"""
+        instance = cls(None, defaultTimeout, executor)
+        instance.yasdiMaster = await instance._call(YasdiMaster, ini_file)
+        return instance
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.yasdiMasterShutdown()
+        self.close()
+
+    def close(self):
+        """Stops the own worker thread. Pending calls are cancelled. A shared executor is left to its owner."""
+        if self.ownExecutor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _call(self, method, *args, timeout=None):
+        """Runs 'method' in the worker thread and waits for its result"""
+        future = asyncio.get_running_loop().run_in_executor(self.executor, method, *args)
+        if timeout is None:
+            timeout = self.defaultTimeout
+        return await asyncio.wait_for(future, timeout)
+
+    async def yasdiMasterShutdown(self, timeout=None):
+        return await self._call(self.yasdiMaster.yasdiMasterShutdown, timeout=timeout)
+
+    async def yasdiReset(self, timeout=None):
+        return await self._call(self.yasdiMaster.yasdiReset, timeout=timeout)
+
+    async def DoMasterCmdEx(self, cmd=CMD_DEVICE_DETECTION, param1=None, param2=None, timeout=None) -> bool:
+        return await self._call(self.yasdiMaster.DoMasterCmdEx, cmd, param1, param2, timeout=timeout)
+
+    async def detectDevices(self, countOfDevices, timeout=None) -> list:
+        """Runs a device detection and returns the list of all device handles found. 'timeout' bounds both steps
+        together.
+        """
+        return await self._call(self._detectDevices, countOfDevices, timeout=timeout)
+
+    def _detectDevices(self, countOfDevices):
+        self.yasdiMaster.DoMasterCmdEx(CMD_DEVICE_DETECTION, countOfDevices)
+        return self.yasdiMaster.GetDeviceHandles()
+
+    async def GetDeviceHandles(self, timeout=None) -> list:
+        return await self._call(self.yasdiMaster.GetDeviceHandles, timeout=timeout)
+
+    async def GetDeviceName(self, deviceHandle, timeout=None) -> str:
+        return await self._call(self.yasdiMaster.GetDeviceName, deviceHandle, timeout=timeout)
+
+    async def GetDeviceSN(self, deviceHandle, timeout=None) -> int:
+        return await self._call(self.yasdiMaster.GetDeviceSN, deviceHandle, timeout=timeout)
+
+    async def GetDeviceType(self, deviceHandle, timeout=None) -> str:
+        return await self._call(self.yasdiMaster.GetDeviceType, deviceHandle, timeout=timeout)
+
+    async def GetChannelHandlesEx(self, deviceHandle, channelType=SPOTCHANNELS, timeout=None) -> list:
+        return await self._call(self.yasdiMaster.GetChannelHandlesEx, deviceHandle, channelType, timeout=timeout)
+
+    async def FindChannelName(self, deviceHandle, channelName, timeout=None) -> int:
+        return await self._call(self.yasdiMaster.FindChannelName, deviceHandle, channelName, timeout=timeout)
+
+    async def GetChannelName(self, channelHandle, timeout=None) -> str:
+        return await self._call(self.yasdiMaster.GetChannelName, channelHandle, timeout=timeout)
+
+    async def GetChannelValue(self, channel_handle, device_handle, max_val_age=1, timeout=None) -> float:
+        return await self._call(self.yasdiMaster.GetChannelValue, channel_handle, device_handle, max_val_age,
+                                timeout=timeout)
+
+    async def GetChannelValueTimeStamp(self, channelHandle, deviceHandle, timeout=None) -> int:
+        return await self._call(self.yasdiMaster.GetChannelValueTimeStamp, channelHandle, deviceHandle,
+                                timeout=timeout)
+
+    async def GetChannelValues(self, channelHandles, deviceHandles, values, timestamps, errorCodes, count,
+                               max_val_age=1, timeout=None):
+        return await self._call(self.yasdiMaster.GetChannelValues, channelHandles, deviceHandles, values,
+                                timestamps, errorCodes, count, max_val_age, timeout=timeout)
+
+    async def GetChannelUnit(self, channelHandle, timeout=None) -> str:
+        return await self._call(self.yasdiMaster.GetChannelUnit, channelHandle, timeout=timeout)
+
+    async def SetChannelValue(self, channel_handle, device_handle, value: float, timeout=None) -> bool:
+        return await self._call(self.yasdiMaster.SetChannelValue, channel_handle, device_handle, value,
+                                timeout=timeout)
+
+    async def SetChannelValueCode(self, channel_handle, device_handle, value: float, timeout=None) -> int:
+        return await self._call(self.yasdiMaster.SetChannelValueCode, channel_handle, device_handle, value,
+                                timeout=timeout)
+
+    async def GetChannelStatTextCnt(self, channelHandle, timeout=None) -> int:
+        return await self._call(self.yasdiMaster.GetChannelStatTextCnt, channelHandle, timeout=timeout)
+
+    async def GetChannelStatText(self, channelHandle, textIndex: int, timeout=None) -> str:
+        return await self._call(self.yasdiMaster.GetChannelStatText, channelHandle, textIndex, timeout=timeout)
+
+    async def GetChannelMask(self, channelHandle, timeout=None) -> (int, int):
+        return await self._call(self.yasdiMaster.GetChannelMask, channelHandle, timeout=timeout)
+
+    async def GetChannelValRange(self, channelHandle, timeout=None) -> (float, float):
+        return await self._call(self.yasdiMaster.GetChannelValRange, channelHandle, timeout=timeout)
@@ -0,0 +1,187 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""ctypes prototypes (argtypes/restype) of all used functions of libyasdi and libyasdimaster.
+
+The prototypes are taken from the YASDI headers 'yasdi.h' and 'yasdimaster.h' (DWORD = 32 bit unsigned).
+They are declared once at load time, so ctypes doesn't have to guess argument and return types on every call.
+
+The native libraries are loaded on the first call of one of their functions and only once per process. They are
+searched without starting any process (ctypes.util.find_library runs ldconfig or the compiler on Linux):
+    1. the path set in 'libraryPaths' (e.g. libraryPaths["yasdimaster"] = "/opt/yasdi/lib/libyasdimaster.so")
+    2. the directory of the environment variable YASDI_LIBRARY_DIR
+    3. the current directory
+    4. the search path of the dynamic linker
+find_library() is the last resort only (imported on demand, ctypes.util itself is slow to import).
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import ctypes
+import os
+import sys
+import threading
+from ctypes import POINTER, c_char, c_char_p, c_double, c_int, c_uint16, c_uint32, c_void_p
+
+
+# Constants
+
+DWORD = c_uint32
+WORD = c_uint16
+BOOL = c_int
+
+# Output string buffers are passed as pointer to char (a c_char array can be passed directly)
+CHAR_BUFFER = POINTER(c_char)
+
+# File name of a native library
+if sys.platform == "win32":
+    LIBRARY_FILE_NAME = "{}.dll"
+elif sys.platform == "darwin":
+    LIBRARY_FILE_NAME = "lib{}.dylib"
+else:
+    LIBRARY_FILE_NAME = "lib{}.so"
+
+# function name -> (restype, argtypes)
+YASDI_PROTOTYPES = {
+    "yasdiInitialize":          (c_int, (c_char_p, POINTER(DWORD))),
+    "yasdiShutdown":            (None, ()),
+    "yasdiGetDriver":           (DWORD, (POINTER(DWORD), c_int)),
+    "yasdiGetDriverName":       (BOOL, (DWORD, CHAR_BUFFER, DWORD)),
+    "yasdiSetDriverOnline":     (BOOL, (DWORD,)),
+    "yasdiSetDriverOffline":    (None, (DWORD,)),
+}
+
+YASDI_MASTER_PROTOTYPES = {
+    "yasdiMasterInitialize":    (c_int, (c_char_p, POINTER(DWORD))),
+    "yasdiMasterShutdown":      (None, ()),
+    "yasdiReset":               (None, ()),
+    "GetDeviceHandles":         (DWORD, (POINTER(DWORD), DWORD)),
+    "GetDeviceName":            (c_int, (DWORD, CHAR_BUFFER, c_int)),
+    "GetDeviceSN":              (c_int, (DWORD, POINTER(DWORD))),
+    "GetDeviceType":            (c_int, (DWORD, CHAR_BUFFER, c_int)),
+    "GetChannelHandlesEx":      (DWORD, (DWORD, POINTER(DWORD), DWORD, c_int)),
+    "FindChannelName":          (DWORD, (DWORD, c_char_p)),
+    "GetChannelName":           (c_int, (DWORD, CHAR_BUFFER, DWORD)),
+    # The value pointer is declared as void pointer: it accepts byref(c_double) as well as plain addresses of
+    # elements of a c_double array (see YasdiMaster.GetChannelValues)
+    "GetChannelValue":          (c_int, (DWORD, DWORD, c_void_p, CHAR_BUFFER, DWORD, DWORD)),
+    "GetChannelValueTimeStamp": (DWORD, (DWORD, DWORD)),
+    "GetChannelUnit":           (c_int, (DWORD, CHAR_BUFFER, DWORD)),
+    "SetChannelValue":          (c_int, (DWORD, DWORD, c_double)),
+    "GetChannelStatTextCnt":    (c_int, (DWORD,)),
+    "GetChannelStatText":       (c_int, (DWORD, c_int, CHAR_BUFFER, c_int)),
+    "GetChannelMask":           (c_int, (DWORD, POINTER(WORD), POINTER(c_int))),
+    "yasdiDoMasterCmdEx":       (c_int, (c_char_p, DWORD, DWORD, DWORD)),
+    "GetChannelValRange":       (c_int, (DWORD, POINTER(c_double), POINTER(c_double))),
+}
+
+
+# libyasdimaster needs libyasdi: loaded before if it is found, the dynamic linker reuses it instead of searching its
+# own copy. Otherwise libyasdimaster resolves it itself (rpath, library path of the system).
+LIBRARY_DEPENDENCIES = {"yasdimaster": ("yasdi",)}
+
+# Configured paths of the native libraries: library name (e.g. "yasdi") -> path
+libraryPaths = {}
+
+
+# Implementation
+
+loadedLibraries = {}  # library name -> CDLL
+sharedFunctions = {}  # library name -> LibraryFunctions
+loadLock = threading.Lock()
+
+
+def libraryCandidates(name) -> list:
+    """Paths and names to try for a native library, in search order"""
+    fileName = LIBRARY_FILE_NAME.format(name)
+    candidates = []
+    if name in libraryPaths:
+        candidates.append(libraryPaths[name])
+    if os.environ.get("YASDI_LIBRARY_DIR"):
+        candidates.append(os.path.join(os.environ["YASDI_LIBRARY_DIR"], fileName))
+    localFile = os.path.join(os.getcwd(), fileName)
+    if os.path.exists(localFile):
+        candidates.append(localFile)
+    candidates.append(fileName)
+    return candidates
+
+
+def loadLibrary(name):
+    """Loads a native library (and the libraries it needs, if found) once per process. Raises OSError if it is not
+    found.
+    """
+    for dependency in LIBRARY_DEPENDENCIES.get(name, ()):
+        try:
+            loadLibrary(dependency)
+        except OSError:
+            # The dynamic linker may still find it while loading the library itself
+            pass
+    with loadLock:
+        library = loadedLibraries.get(name)
+        if library is None:
+            for candidate in libraryCandidates(name):
+                try:
+                    library = ctypes.CDLL(candidate)
+                    break
+                except OSError:
+                    pass
+            else:
+                # ctypes.util is slow to import and starts processes: only used if nothing else was found
+                from ctypes.util import find_library
+                path = find_library(name)
+                if path is None:
+                    raise OSError(f"Library {LIBRARY_FILE_NAME.format(name)} not found. Set YASDI_LIBRARY_DIR.")
+                library = ctypes.CDLL(path)
+            loadedLibraries[name] = library
+        return library
+
+
+def nativeFunctions(name, prototypes) -> "LibraryFunctions":
+    """The functions of a native library, shared by all wrapper objects. The library is loaded on the first call."""
+    with loadLock:
+        functions = sharedFunctions.get(name)
+        if functions is None:
+            functions = sharedFunctions[name] = LibraryFunctions(name, prototypes)
+        return functions
+
+
+class LibraryFunctions:
+
+    """Namespace with the prototyped foreign function objects of a library as plain attributes.
+    'library' is a loaded library (or a simulator) or the name of a native library, which is loaded (see
+    loadLibrary()) when the first function is used.
+    """
+
+    def __init__(self, library, prototypes):
+        self.prototypes = prototypes
+        self.bindLock = threading.Lock()
+        if isinstance(library, str):
+            self.libraryName = library
+            self.library = None
+        else:
+            self.libraryName = None
+            self.bind(library)
+
+    def bind(self, library):
+        for name, (restype, argtypes) in self.prototypes.items():
+            function = getattr(library, name)
+            function.restype = restype
+            function.argtypes = argtypes
+            setattr(self, name, function)
+        self.library = library
+
+    def __getattr__(self, name):
+        # Only called for attributes which are not set yet: the functions of a library which is not loaded
+        prototypes = self.__dict__.get("prototypes", {})
+        if name not in prototypes or self.__dict__.get("libraryName") is None:
+            raise AttributeError(name)
+        with self.bindLock:
+            if self.library is None:
+                self.bind(loadLibrary(self.libraryName))
+        return self.__dict__[name]
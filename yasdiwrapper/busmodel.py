@@ -0,0 +1,203 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Bandwidth model of the buses configured in yasdi.ini and admission control of the requests.
+
+A RS485 line with 1200 baud carries about one telegram (request and answer) per 0.7 seconds. The BusModel starts
+with the telegram time calculated from the configured baud rate and learns the real time per request from the
+measured call durations. The BusAdmission keeps the requests of a bus within a share of its capacity: requests are
+admitted, delayed (high priority) or shed (low priority) if the bus is busy.
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import configparser
+import threading
+import time
+
+
+# Constants
+
+# Size of request and answer telegram (bytes) of a SMAData1 channel request, including framing
+TELEGRAM_BYTES = 40
+# Bits per byte on the serial line (start bit + 8 data bits + stop bit)
+BITS_PER_BYTE = 10
+# Fixed turnaround time of a device between request and answer (seconds)
+DEVICE_TURNAROUND = 0.01
+
+# A read faster than this share of the calculated line time did not use the bus (answered from the value cache of
+# yasdi). It does not tell anything about the bus.
+MIN_BUS_SHARE = 0.5
+
+# Sections of yasdi.ini which don't describe a port
+NON_PORT_SECTIONS = ("DriverModules", "Misc")
+
+# Decisions of BusAdmission.request()
+ADMIT = "admit"
+DELAY = "delay"
+SHED = "shed"
+
+
+# Implementation
+
+class PortConfig:
+
+    """A port (driver) of yasdi.ini"""
+
+    __slots__ = ("name", "device", "media", "baudrate", "protocol")
+
+    def __init__(self, name, device=None, media=None, baudrate=None, protocol=None):
+        self.name = name
+        self.device = device
+        self.media = media
+        self.baudrate = baudrate
+        self.protocol = protocol
+
+
+def readYasdiConfig(iniFile) -> dict:
+    """Reads the ports of a yasdi configuration file. Returns port (driver) name -> PortConfig."""
+    parser = configparser.ConfigParser(inline_comment_prefixes=("#", ";"), strict=False, interpolation=None)
+    parser.optionxform = str
+    parser.read(iniFile, encoding="utf-8")
+    ports = {}
+    for name in parser.sections():
+        if name in NON_PORT_SECTIONS:
+            continue
+        section = parser[name]
+        baudrate = section.get("Baudrate")
+        ports[name] = PortConfig(name,
+                                 device=section.get("Device"),
+                                 media=section.get("Media"),
+                                 baudrate=int(baudrate) if baudrate else None,
+                                 protocol=section.get("Protocol"))
+    return ports
+
+
+class BusModel:
+
+    """Time per request of a bus. Calculated from the baud rate until call durations were measured."""
+
+    def __init__(self, baudrate, smoothing=0.1):
+        """'smoothing': weight of a new measurement in the moving average"""
+        self.baudrate = baudrate
+        self.smoothing = smoothing
+        self.measuredSeconds = None
+
+    def calculatedSeconds(self) -> float:
+        """Time of one request and its answer on the line"""
+        return DEVICE_TURNAROUND + 2 * TELEGRAM_BYTES * BITS_PER_BYTE / self.baudrate
+
+    def requestSeconds(self) -> float:
+        return self.measuredSeconds if self.measuredSeconds is not None else self.calculatedSeconds()
+
+    def observe(self, seconds, requests=1):
+        """Adds a measured duration of 'requests' requests (e.g. one batch read)"""
+        if requests <= 0:
+            return
+        perRequest = seconds / requests
+        if self.measuredSeconds is None:
+            self.measuredSeconds = perRequest
+        else:
+            self.measuredSeconds += self.smoothing * (perRequest - self.measuredSeconds)
+
+    def observeReads(self, durations):
+        """Adds the durations of single successful reads. Reads answered from the value cache are ignored."""
+        minSeconds = MIN_BUS_SHARE * self.calculatedSeconds()
+        busDurations = [seconds for seconds in durations if seconds >= minSeconds]
+        self.observe(sum(busDurations), len(busDurations))
+
+    def requestsPerSecond(self) -> float:
+        return 1.0 / self.requestSeconds()
+
+    def utilization(self, schedules, deviceCount) -> float:
+        """Share of the bus capacity needed to poll the channels of 'schedules' (ChannelSchedule) on 'deviceCount'
+        devices. Values above 1 can not be polled in time.
+        """
+        return sum(deviceCount / schedule.interval for schedule in schedules) * self.requestSeconds()
+
+
+class BusAdmission:
+
+    """Admission control of the requests of one bus (token bucket of bus time).
+
+    The bucket is refilled with 'maxUtilization' seconds of bus time per second and holds at most 'window' seconds
+    of it. A request which doesn't fit is delayed if its priority is below 'shedPriority' and shed otherwise
+    (0 is the highest priority, see ChannelSchedule).
+    """
+
+    def __init__(self, busModel, maxUtilization=0.8, window=10.0, shedPriority=1, clock=time.monotonic):
+        self.busModel = busModel
+        self.maxUtilization = maxUtilization
+        self.window = window
+        self.shedPriority = shedPriority
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.capacity = window * maxUtilization
+        self.tokens = self.capacity
+        self.lastRefill = clock()
+        self.admitted = 0
+        self.delayed = 0
+        self.shed = 0
+
+    def refill(self, now):
+        """Caller must hold the lock"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.lastRefill) * self.maxUtilization)
+        self.lastRefill = now
+
+    def request(self, priority=0, requests=1) -> str:
+        """Decides about 'requests' requests of a priority: ADMIT, DELAY or SHED"""
+        cost = requests * self.busModel.requestSeconds()
+        with self.lock:
+            self.refill(self.clock())
+            if self.tokens >= cost:
+                self.tokens -= cost
+                self.admitted += 1
+                return ADMIT
+            if priority >= self.shedPriority:
+                self.shed += 1
+                return SHED
+            self.delayed += 1
+            return DELAY
+
+    def waitTime(self, requests=1) -> float:
+        """Seconds until 'requests' requests will be admitted"""
+        cost = requests * self.busModel.requestSeconds()
+        with self.lock:
+            self.refill(self.clock())
+            return max(0.0, (cost - self.tokens) / self.maxUtilization)
+
+    def acquire(self, requests=1, sleep=time.sleep):
+        """Waits until the requests are admitted (e.g. for parameter writes which must not be shed)"""
+        while self.request(priority=0, requests=requests) != ADMIT:
+            sleep(self.waitTime(requests))
+
+    def charge(self, seconds):
+        """Takes bus time used outside of the admitted requests (e.g. a device detection) from the bucket. The
+        following requests wait until it is refilled.
+        """
+        if seconds <= 0:
+            return
+        with self.lock:
+            self.refill(self.clock())
+            self.tokens -= seconds
+
+    def observe(self, seconds, requests=1):
+        self.busModel.observe(seconds, requests)
+
+    def observeReads(self, durations):
+        self.busModel.observeReads(durations)
+
+    def checkSchedules(self, schedules, deviceCount) -> str:
+        """Returns a warning if the schedules do not fit into the admitted share of the bus, otherwise None"""
+        utilization = self.busModel.utilization(schedules, deviceCount)
+        if utilization <= self.maxUtilization:
+            return None
+        return (f"{deviceCount} devices need {utilization:.0%} of the bus ({self.busModel.requestSeconds():.3f} s per "
+                f"request, {self.maxUtilization:.0%} admitted). Channels with priority >= {self.shedPriority} will be "
+                f"skipped, use longer intervals or less channels.")
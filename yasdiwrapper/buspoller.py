@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Concurrent polling of devices connected to different YASDI drivers (buses / serial ports).
+
+Every bus gets its own worker thread. Devices on different buses are read in parallel while all requests of one
+bus are serialized. The cycle time is therefore bound by the slowest bus instead of the sum of all buses.
+
+Devices whose bus is unknown (bus None, e.g. found by a detection with all drivers online) may share a bus with any
+worker. They are read in the calling thread after all buses are done, never in parallel to a bus worker.
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+from concurrent.futures import ThreadPoolExecutor
+from yasdiwrapper.yasdimaster import CMD_DEVICE_DETECTION
+from yasdiwrapper.channelreader import ChannelReader
+
+
+# Implementation
+
+def detectDevicesPerDriver(yasdi, yasdiMaster, driverHandles, countOfDevicesPerDriver=1) -> dict:
+    """Sets the drivers online one after another and runs a device detection after each one. New found devices
+    belong to the driver which was set online last. YASDI itself does not tell on which driver a device is connected.
+    'countOfDevicesPerDriver' is the count of devices to search on each driver, or a dictionary driver handle -> count.
+    Returns a dictionary driver handle -> list of device handles.
+    """
+    busDevices = {}
+    knownDevices = set()
+    for driverHandle in driverHandles:
+        if not yasdi.yasdiSetDriverOnline(driverHandle):
+            busDevices[driverHandle] = []
+            continue
+        if isinstance(countOfDevicesPerDriver, dict):
+            countOfDevices = countOfDevicesPerDriver.get(driverHandle, 1)
+        else:
+            countOfDevices = countOfDevicesPerDriver
+        if not yasdiMaster.DoMasterCmdEx(cmd=CMD_DEVICE_DETECTION, param1=len(knownDevices) + countOfDevices):
+            print(f"Device detection on driver '{yasdi.yasdiGetDriverName(driverHandle)}' failed for some reason. Maybe not all devices are found as requested.")
+        newDevices = [deviceHandle for deviceHandle in yasdiMaster.GetDeviceHandles() if deviceHandle not in knownDevices]
+        knownDevices.update(newDevices)
+        busDevices[driverHandle] = newDevices
+    return busDevices
+
+
+class BusPoller:
+
+    """Reads the same channel names from all devices of all buses. One worker thread (and one ChannelReader with
+    its own result buffer) per bus.
+    """
+
+    def __init__(self, yasdiMaster, channelCatalog, busDevices: dict):
+        """'busDevices' is a dictionary bus (driver handle) -> list of device handles, see detectDevicesPerDriver()"""
+        self.yasdiMaster = yasdiMaster
+        self.channelCatalog = channelCatalog
+        self.busDevices = {}
+        self.readers = {}
+        self.executors = {}
+        for bus, devices in busDevices.items():
+            self.addDevices(bus, devices)
+
+    def addDevices(self, bus, deviceHandles):
+        """Adds devices to a bus (a new worker is created for a new bus, None = unknown bus). Must not be called during
+        a poll cycle.
+        """
+        if len(deviceHandles) == 0:
+            return
+        self.addBus(bus)
+        self.busDevices[bus].extend(deviceHandles)
+
+    def addBus(self, bus):
+        """Creates the worker of a bus without devices yet (e.g. for a device detection on the bus). Must not be
+        called during a poll cycle.
+        """
+        if bus not in self.busDevices:
+            self.busDevices[bus] = []
+            self.readers[bus] = ChannelReader(self.yasdiMaster, self.channelCatalog)
+            if bus is not None:
+                self.executors[bus] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"yasdi-bus-{bus}")
+
+    def removeDevices(self, deviceHandles):
+        """Removes devices from their buses. The worker of a bus stays. Must not be called during a poll cycle."""
+        deviceHandles = set(deviceHandles)
+        for devices in self.busDevices.values():
+            devices[:] = [deviceHandle for deviceHandle in devices if deviceHandle not in deviceHandles]
+
+    def remapDevices(self, mapping):
+        """Replaces device handles: 'mapping' is a dictionary old handle -> new handle. Must not be called during a
+        poll cycle.
+        """
+        for devices in self.busDevices.values():
+            devices[:] = [mapping.get(deviceHandle, deviceHandle) for deviceHandle in devices]
+
+    def prepare(self, channelNames) -> dict:
+        """Resolves all channels of all buses in the calling thread. Returns dictionary bus -> ChannelReadBuffer."""
+        return {bus: self.readers[bus].prepare(devices, channelNames) for bus, devices in self.busDevices.items()}
+
+    def readChannels(self, channelNames, maxValAge=1) -> dict:
+        """Reads all channels of all devices. The buses are read in parallel. Returns when all buses are done.
+        Returns dictionary bus -> ChannelReadBuffer.
+        """
+        self.prepare(channelNames)
+        return self.runOnBuses(lambda bus, devices: self.readers[bus].readChannels(devices, channelNames, maxValAge))
+
+    def runOnBuses(self, function) -> dict:
+        """Calls function(bus, deviceHandles) for every bus in the worker thread of the bus. The buses run in
+        parallel, the unknown bus (None) afterwards in the calling thread. Returns when all buses are done. Returns
+        dictionary bus -> result of the function.
+        """
+        futures = {bus: self.executors[bus].submit(function, bus, devices) for bus, devices in self.busDevices.items()
+                   if bus is not None}
+        results = {bus: future.result() for bus, future in futures.items()}
+        if None in self.busDevices:
+            results[None] = function(None, self.busDevices[None])
+        return results
+
+    def runOnBus(self, bus, function):
+        """Calls function() in the worker thread of a bus, between the poll cycles of the bus, and returns its
+        result. Can be called from any thread.
+        """
+        return self.executors[bus].submit(function).result()
+
+    def shutdown(self):
+        """Stops all worker threads"""
+        for executor in self.executors.values():
+            executor.shutdown(wait=True)
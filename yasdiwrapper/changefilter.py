@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Change detection between the channel reads and the output sinks.
+
+Only significant changes are passed on: a value is reported if it leaves the deadband around the last reported value
+of its channel, if the channel was silent for too long (heartbeat) or, for status channels, if the status (text)
+changed. Records are the same as for the sinks: (device, channel info, timestamp, value).
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import math
+
+
+# Implementation
+
+class ReportRule:
+
+    """When a new value of a channel is reported:
+    - absoluteDeadband: the value differs by more than this from the last reported value
+    - relativeDeadband: the value differs by more than this fraction (e.g. 0.02) of the last reported value
+    - exactChange: any change is reported. Status channels compare the status texts (see ChannelInfo.statText()).
+    - maxSilence: seconds (value timestamps) after which the value is reported anyway (None = never)
+    If both deadbands are given, the larger band applies. Without deadbands and exactChange every value is reported.
+    """
+
+    __slots__ = ("absoluteDeadband", "relativeDeadband", "exactChange", "maxSilence")
+
+    def __init__(self, absoluteDeadband=None, relativeDeadband=None, exactChange=False, maxSilence=None):
+        self.absoluteDeadband = absoluteDeadband
+        self.relativeDeadband = relativeDeadband
+        self.exactChange = exactChange
+        self.maxSilence = maxSilence
+
+    def significant(self, channel, lastValue, value) -> bool:
+        """Is 'value' a significant change against 'lastValue'?"""
+        if math.isnan(value) or math.isnan(lastValue):
+            return not (math.isnan(value) and math.isnan(lastValue))
+        if self.exactChange:
+            if channel.statTexts:
+                return channel.statText(value) != channel.statText(lastValue)
+            return value != lastValue
+        if self.absoluteDeadband is None and self.relativeDeadband is None:
+            return True
+        band = max(self.absoluteDeadband or 0.0, (self.relativeDeadband or 0.0) * abs(lastValue))
+        return abs(value - lastValue) > band
+
+
+class ChangeFilter:
+
+    """Filters records by the ReportRule of their channel name. Channels without rule use 'defaultRule'
+    (None = all values are reported).
+    """
+
+    def __init__(self, rules: dict, defaultRule: ReportRule=None):
+        self.rules = dict(rules)
+        self.defaultRule = defaultRule
+        self.lastReported = {}  # (device, channel name) -> (timestamp, value)
+        self.reportedCount = 0
+        self.suppressedCount = 0
+
+    def filter(self, records) -> list:
+        """Returns the records which have to be reported"""
+        reported = []
+        count = 0
+        for record in records:
+            count += 1
+            device, channel, timestamp, value = record
+            rule = self.rules.get(channel.name, self.defaultRule)
+            key = (device, channel.name)
+            last = self.lastReported.get(key)
+            if rule is not None and last is not None:
+                lastTimestamp, lastValue = last
+                silent = rule.maxSilence is not None and timestamp - lastTimestamp >= rule.maxSilence
+                if not silent and not rule.significant(channel, lastValue, value):
+                    continue
+            self.lastReported[key] = (timestamp, value)
+            reported.append(record)
+        self.reportedCount += len(reported)
+        self.suppressedCount += count - len(reported)
+        return reported
+
+    def forget(self, device):
+        """Drops the state of a device: its next values are reported in any case"""
+        for key in [key for key in self.lastReported if key[0] == device]:
+            del self.lastReported[key]
+
+
+class FilteredSink:
+
+    """Sink which passes only the records reported by a ChangeFilter to another sink"""
+
+    def __init__(self, sink, changeFilter):
+        self.sink = sink
+        self.changeFilter = changeFilter
+
+    def write(self, records):
+        self.sink.write(self.changeFilter.filter(records))
+
+    def close(self):
+        self.sink.close()
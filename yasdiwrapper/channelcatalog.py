@@ -0,0 +1,215 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Channel meta data catalog for the YASDI master wrapper.
+
+All devices of the same device type (see YasdiMaster.GetDeviceType) share the same set of channels.
+The meta data of these channels (name, unit, mask, value range, status texts) never changes, so it is
+resolved only once per device type and can be stored on disk to skip the complete meta data walk on
+the next start.
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import json
+import os
+from yasdiwrapper.yasdi import INVALID_HANDLE
+from yasdiwrapper.yasdimaster import ALLCHANNELS
+
+
+# Constants
+
+# Version of the catalog file format. Files with another version are ignored.
+CATALOG_FILE_VERSION = 1
+
+
+# Implementation
+
+class ChannelInfo:
+
+    """Static meta data of one channel of a device type"""
+
+    __slots__ = ("name", "handle", "unit", "channelType", "channelIndex", "rangeMin", "rangeMax", "statTexts")
+
+    def __init__(self, name, handle=INVALID_HANDLE, unit="", channelType=0, channelIndex=0,
+                 rangeMin=None, rangeMax=None, statTexts=()):
+        self.name = name
+        self.handle = handle
+        self.unit = unit
+        self.channelType = channelType
+        self.channelIndex = channelIndex
+        self.rangeMin = rangeMin
+        self.rangeMax = rangeMax
+        self.statTexts = tuple(statTexts)
+
+    def statText(self, value) -> str:
+        """Returns the status text of a (status) channel value or None if the channel has no status texts"""
+        try:
+            return self.statTexts[int(value)]
+        except (IndexError, ValueError, TypeError):
+            return None
+
+    def toDict(self) -> dict:
+        """Serializable representation. The channel handle is not stored, it is only valid for one yasdi session."""
+        return {"name": self.name,
+                "unit": self.unit,
+                "mask": [self.channelType, self.channelIndex],
+                "range": [self.rangeMin, self.rangeMax],
+                "statTexts": list(self.statTexts)}
+
+    @classmethod
+    def fromDict(cls, data):
+        return cls(data["name"],
+                   unit=data["unit"],
+                   channelType=data["mask"][0],
+                   channelIndex=data["mask"][1],
+                   rangeMin=data["range"][0],
+                   rangeMax=data["range"][1],
+                   statTexts=data["statTexts"])
+
+
+class DeviceTypeChannels:
+
+    """All channels of one device type. Channels are stored in a list and indexed by name and handle."""
+
+    def __init__(self, deviceType, channels):
+        self.deviceType = deviceType
+        self.channels = list(channels)
+        self.byName = {info.name: position for position, info in enumerate(self.channels)}
+        self.byHandle = {info.handle: position for position, info in enumerate(self.channels)
+                         if info.handle != INVALID_HANDLE}
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __iter__(self):
+        return iter(self.channels)
+
+    def findByName(self, channelName) -> ChannelInfo:
+        position = self.byName.get(channelName)
+        return None if position is None else self.channels[position]
+
+    def findByHandle(self, channelHandle) -> ChannelInfo:
+        position = self.byHandle.get(channelHandle)
+        return None if position is None else self.channels[position]
+
+    def bindHandle(self, info, channelHandle):
+        """Sets the channel handle of a channel loaded from disk"""
+        info.handle = channelHandle
+        self.byHandle[channelHandle] = self.byName[info.name]
+
+
+class ChannelCatalog:
+
+    """Resolves and caches the channel meta data per device type using a YasdiMaster instance.
+    If a catalog file is given, the meta data is loaded from and stored into it.
+    """
+
+    def __init__(self, yasdiMaster, catalogFile: str=None):
+        self.yasdiMaster = yasdiMaster
+        self.catalogFile = catalogFile
+        self.deviceTypes = {}    # device type -> DeviceTypeChannels
+        self.deviceTypeOf = {}   # device handle -> device type
+        if catalogFile is not None:
+            self.load()
+
+    def getDeviceType(self, deviceHandle) -> str:
+        """Device type of a device. Cached, because it never changes for a device handle."""
+        deviceType = self.deviceTypeOf.get(deviceHandle)
+        if deviceType is None:
+            deviceType = self.yasdiMaster.GetDeviceType(deviceHandle)
+            self.deviceTypeOf[deviceHandle] = deviceType
+        return deviceType
+
+    def getChannels(self, deviceHandle) -> DeviceTypeChannels:
+        """Returns all channels of the device type of a device. The meta data is read from the device type
+        on first access only.
+        """
+        deviceType = self.getDeviceType(deviceHandle)
+        channels = self.deviceTypes.get(deviceType)
+        if channels is None:
+            channels = self.readDeviceTypeChannels(deviceHandle, deviceType)
+            self.deviceTypes[deviceType] = channels
+            if self.catalogFile is not None:
+                self.save()
+        return channels
+
+    def findChannel(self, deviceHandle, channelName) -> ChannelInfo:
+        """Lookup for a channel by name. Returns None if the device type does not have such a channel."""
+        channels = self.getChannels(deviceHandle)
+        info = channels.findByName(channelName)
+        if info is not None and info.handle == INVALID_HANDLE:
+            # Loaded from the catalog file: the channel handle has to be resolved once in this yasdi session
+            channelHandle = self.yasdiMaster.FindChannelName(deviceHandle, channelName)
+            if channelHandle == INVALID_HANDLE:
+                return None
+            channels.bindHandle(info, channelHandle)
+        return info
+
+    def rebindHandles(self, deviceHandles):
+        """Resolves the channel handles of all device types again, e.g. after a yasdi reset. The ChannelInfo objects
+        are kept, so everybody holding them gets the new handles.
+        """
+        self.deviceTypeOf.clear()
+        rebound = set()
+        for deviceHandle in deviceHandles:
+            deviceType = self.getDeviceType(deviceHandle)
+            channels = self.deviceTypes.get(deviceType)
+            if channels is None or deviceType in rebound:
+                continue
+            rebound.add(deviceType)
+            channels.byHandle.clear()
+            for info in channels:
+                if info.handle != INVALID_HANDLE:
+                    info.handle = INVALID_HANDLE
+                    channelHandle = self.yasdiMaster.FindChannelName(deviceHandle, info.name)
+                    if channelHandle != INVALID_HANDLE:
+                        channels.bindHandle(info, channelHandle)
+
+    def readDeviceTypeChannels(self, deviceHandle, deviceType) -> DeviceTypeChannels:
+        """Walks over all channels of a device and reads the meta data of every channel"""
+        channels = []
+        for channelHandle in self.yasdiMaster.GetChannelHandlesEx(deviceHandle, ALLCHANNELS):
+            channelType, channelIndex = self.yasdiMaster.GetChannelMask(channelHandle)
+            rangeMin, rangeMax = self.yasdiMaster.GetChannelValRange(channelHandle)
+            statTextCount = max(0, self.yasdiMaster.GetChannelStatTextCnt(channelHandle))
+            channels.append(ChannelInfo(self.yasdiMaster.GetChannelName(channelHandle),
+                                        handle=channelHandle,
+                                        unit=self.yasdiMaster.GetChannelUnit(channelHandle),
+                                        channelType=channelType,
+                                        channelIndex=channelIndex,
+                                        rangeMin=rangeMin,
+                                        rangeMax=rangeMax,
+                                        statTexts=[self.yasdiMaster.GetChannelStatText(channelHandle, textIndex)
+                                                   for textIndex in range(statTextCount)]))
+        return DeviceTypeChannels(deviceType, channels)
+
+    def load(self) -> bool:
+        """Loads the catalog file if it exists. Returns True if the file was loaded."""
+        try:
+            with open(self.catalogFile, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != CATALOG_FILE_VERSION:
+            return False
+        for deviceType, channelList in data["deviceTypes"].items():
+            self.deviceTypes[deviceType] = DeviceTypeChannels(deviceType,
+                                                              [ChannelInfo.fromDict(c) for c in channelList])
+        return True
+
+    def save(self):
+        """Stores the catalog atomically into the catalog file"""
+        data = {"version": CATALOG_FILE_VERSION,
+                "deviceTypes": {deviceType: [info.toDict() for info in channels]
+                                for deviceType, channels in self.deviceTypes.items()}}
+        tempFile = self.catalogFile + ".tmp"
+        with open(tempFile, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tempFile, self.catalogFile)
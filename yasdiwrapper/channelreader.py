@@ -0,0 +1,106 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Batched reading of many channel values of many devices.
+
+The results are written into preallocated ctypes arrays which are reused from cycle to cycle. No Python object
+is created per value while reading.
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+from ctypes import c_double, c_int, c_uint32
+from yasdiwrapper.yasdi import YE_OK, INVALID_HANDLE
+
+
+# Implementation
+
+class ChannelReadBuffer:
+
+    """Reusable result buffer of a batch read. One position per (device, channel) pair.
+
+    The arrays 'values', 'timestamps' and 'errorCodes' are ctypes arrays and support the buffer protocol,
+    so they can be wrapped without copying (e.g. memoryview(buffer.values) or numpy.frombuffer(buffer.values)).
+    """
+
+    def __init__(self, deviceHandles, channelNames, channels):
+        """'channels' contains the ChannelInfo (or None if missing) of each requested device and channel name"""
+        self.count = len(deviceHandles) * len(channelNames)
+        self.deviceHandleList = list(deviceHandles)
+        self.channelNameList = list(channelNames)
+        self.deviceHandles = (c_uint32 * self.count)()
+        self.channelHandles = (c_uint32 * self.count)()
+        self.values = (c_double * self.count)()
+        self.timestamps = (c_uint32 * self.count)()
+        self.errorCodes = (c_int * self.count)()
+        self.channels = channels
+        for position, channel in enumerate(channels):
+            self.deviceHandles[position] = self.deviceHandleList[position // len(self.channelNameList)]
+            self.channelHandles[position] = INVALID_HANDLE if channel is None else channel.handle
+
+    def __len__(self):
+        return self.count
+
+    def deviceHandle(self, position):
+        return self.deviceHandles[position]
+
+    def channelName(self, position):
+        return self.channelNameList[position % len(self.channelNameList)]
+
+    def isValid(self, position) -> bool:
+        return YE_OK == self.errorCodes[position]
+
+    def rows(self):
+        """Iterates over all results as tuples (device handle, channel info, value, timestamp, error code).
+        The channel info is None if the channel is not available on the device.
+        """
+        for position in range(self.count):
+            yield (self.deviceHandles[position],
+                   self.channels[position],
+                   self.values[position],
+                   self.timestamps[position],
+                   self.errorCodes[position])
+
+
+class ChannelReader:
+
+    """Reads the same set of channel names from a list of devices. The channel handles are resolved by a
+    ChannelCatalog once and the result buffer is reused as long as the requested devices and channels don't change.
+    """
+
+    def __init__(self, yasdiMaster, channelCatalog):
+        self.yasdiMaster = yasdiMaster
+        self.channelCatalog = channelCatalog
+        self.requestKey = None
+        self.buffer = None
+
+    def prepare(self, deviceHandles, channelNames) -> ChannelReadBuffer:
+        """Resolves the channel handles and allocates the result buffer for a request"""
+        requestKey = (tuple(deviceHandles), tuple(channelNames))
+        if requestKey != self.requestKey:
+            channels = [self.channelCatalog.findChannel(deviceHandle, channelName)
+                        for deviceHandle in deviceHandles
+                        for channelName in channelNames]
+            self.buffer = ChannelReadBuffer(deviceHandles, channelNames, channels)
+            self.requestKey = requestKey
+        return self.buffer
+
+    def readChannels(self, deviceHandles, channelNames, maxValAge=1) -> ChannelReadBuffer:
+        """Reads all channels 'channelNames' of all devices 'deviceHandles'. Returns the (reused) result buffer
+        containing value, timestamp and yasdi error code of each (device, channel) pair.
+        """
+        buffer = self.prepare(deviceHandles, channelNames)
+        self.yasdiMaster.GetChannelValues(buffer.channelHandles,
+                                          buffer.deviceHandles,
+                                          buffer.values,
+                                          buffer.timestamps,
+                                          buffer.errorCodes,
+                                          buffer.count,
+                                          maxValAge)
+        return buffer
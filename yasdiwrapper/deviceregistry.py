@@ -0,0 +1,279 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Persistent registry of all known devices, identified by their serial number.
+
+YASDI only knows devices after a device detection, and a detection which has to search for more devices than are
+connected takes minutes on a slow bus. The registry remembers serial number, name, type and driver of every device.
+On the next start the detection only waits for one device per driver. The other known devices and new devices are
+searched in the background in small steps on each bus (BackgroundDetection). Device handles which changed are
+remapped by serial number.
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import json
+import math
+import os
+import threading
+import time
+from yasdiwrapper.yasdimaster import CMD_DEVICE_DETECTION
+
+
+# Constants
+
+# Version of the registry file format. Files with another version are ignored.
+REGISTRY_FILE_VERSION = 1
+
+
+# Implementation
+
+class KnownDevice:
+
+    """A device known by its serial number. 'handle' is only valid in the current yasdi session (None if the device
+    was not found yet).
+    """
+
+    __slots__ = ("serialNumber", "name", "deviceType", "driverName", "handle")
+
+    def __init__(self, serialNumber, name, deviceType, driverName=None, handle=None):
+        self.serialNumber = serialNumber
+        self.name = name
+        self.deviceType = deviceType
+        self.driverName = driverName
+        self.handle = handle
+
+    def toDict(self) -> dict:
+        return {"serialNumber": self.serialNumber,
+                "name": self.name,
+                "deviceType": self.deviceType,
+                "driverName": self.driverName}
+
+    @classmethod
+    def fromDict(cls, data):
+        return cls(data["serialNumber"], data["name"], data["deviceType"], data["driverName"])
+
+
+class RegistryChanges:
+
+    """Result of DeviceRegistry.refresh()"""
+
+    def __init__(self):
+        self.newDevices = []  # KnownDevice found for the first time
+        self.remapped = {}    # old device handle -> new device handle
+        self.found = []       # known KnownDevice found again in this session
+        self.missing = []     # KnownDevice which had a handle and is not available anymore
+        self.releasedHandles = []  # the former device handles of the missing devices
+
+    def __bool__(self):
+        return bool(self.newDevices or self.remapped or self.found or self.missing)
+
+
+class DeviceRegistry:
+
+    """All known devices by serial number. Stored in 'registryFile' (JSON) if given."""
+
+    def __init__(self, yasdiMaster, registryFile: str=None):
+        self.yasdiMaster = yasdiMaster
+        self.registryFile = registryFile
+        self.lock = threading.Lock()
+        self.devices = {}  # serial number -> KnownDevice
+        if registryFile is not None:
+            self.load()
+
+    def countOnDriver(self, driverName) -> int:
+        """Count of known devices connected to a driver"""
+        return sum(1 for device in self.devices.values() if device.driverName == driverName)
+
+    def missingOnDriver(self, driverName) -> int:
+        """Count of known devices connected to a driver which were not found in this session (yet)"""
+        return sum(1 for device in self.devices.values() if device.driverName == driverName and device.handle is None)
+
+    def deviceOfHandle(self, deviceHandle) -> KnownDevice:
+        for device in self.devices.values():
+            if device.handle == deviceHandle:
+                return device
+        return None
+
+    def refresh(self, driverName=None, deviceHandles=None) -> RegistryChanges:
+        """Matches the device handles (default: all handles of yasdi) with the known devices by serial number.
+        Devices seen for the first time are added; with 'driverName' if the driver of the handles is known.
+        """
+        if deviceHandles is None:
+            deviceHandles = self.yasdiMaster.GetDeviceHandles()
+            allHandles = True
+        else:
+            allHandles = False
+        changes = RegistryChanges()
+        seen = set()
+        with self.lock:
+            for deviceHandle in deviceHandles:
+                serialNumber = self.yasdiMaster.GetDeviceSN(deviceHandle)
+                if serialNumber is None or (isinstance(serialNumber, float) and math.isnan(serialNumber)):
+                    continue
+                seen.add(serialNumber)
+                device = self.devices.get(serialNumber)
+                if device is None:
+                    device = KnownDevice(serialNumber, self.yasdiMaster.GetDeviceName(deviceHandle),
+                                         self.yasdiMaster.GetDeviceType(deviceHandle), driverName, deviceHandle)
+                    self.devices[serialNumber] = device
+                    changes.newDevices.append(device)
+                    continue
+                if device.handle is None:
+                    changes.found.append(device)
+                elif device.handle != deviceHandle:
+                    changes.remapped[device.handle] = deviceHandle
+                device.handle = deviceHandle
+                if device.driverName is None and driverName is not None:
+                    device.driverName = driverName
+                    changes.found.append(device)
+            if allHandles:
+                for device in self.devices.values():
+                    if device.handle is not None and device.serialNumber not in seen:
+                        changes.missing.append(device)
+                        changes.releasedHandles.append(device.handle)
+                        device.handle = None
+        if (changes.newDevices or changes.found) and self.registryFile is not None:
+            self.save()
+        return changes
+
+    def load(self) -> bool:
+        """Loads the registry file if it exists. Returns True if the file was loaded."""
+        try:
+            with open(self.registryFile, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != REGISTRY_FILE_VERSION:
+            return False
+        for deviceData in data["devices"]:
+            device = KnownDevice.fromDict(deviceData)
+            self.devices[device.serialNumber] = device
+        return True
+
+    def save(self):
+        """Stores the registry atomically into the registry file"""
+        with self.lock:
+            data = {"version": REGISTRY_FILE_VERSION,
+                    "devices": [device.toDict() for device in self.devices.values()]}
+        tempFile = self.registryFile + ".tmp"
+        with open(tempFile, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tempFile, self.registryFile)
+
+
+class BackgroundDetection:
+
+    """Searches for new devices in a background thread, one bus (driver) at a time. An attempt asks yasdi for one
+    device more than currently available, so it ends as soon as one new device answers. It runs in the worker thread
+    of the bus between its poll cycles (see BusPoller.runOnBus) and waits for the BusAdmission of the bus. The
+    detection broadcast of yasdi goes out on every online driver, so its bus time is charged to the admissions of all
+    buses.
+
+    Every bus is searched every 'interval' seconds, a bus with known devices which were not found yet every
+    'retryInterval' seconds. After an attempt which found nothing the delay of the bus doubles, up to 'maxInterval'.
+    After each attempt the registry is refreshed and onChange(RegistryChanges) is called if something changed.
+    """
+
+    def __init__(self, yasdiMaster, deviceRegistry, interval=300.0, onChange=None, busPoller=None, driverNames=None,
+                 busAdmissions=None, retryInterval=10.0, maxInterval=None, clock=time.monotonic):
+        """
+        - busPoller: BusPoller which runs the attempts in its bus workers. None = the attempts run in the detection
+          thread.
+        - driverNames: dictionary driver handle (bus) -> driver name of the buses to search. None = one attempt for
+          all drivers.
+        - busAdmissions: dictionary driver handle -> BusAdmission
+        """
+        self.yasdiMaster = yasdiMaster
+        self.deviceRegistry = deviceRegistry
+        self.interval = interval
+        self.onChange = onChange
+        self.busPoller = busPoller
+        self.driverNames = driverNames if driverNames is not None else {None: None}
+        self.busAdmissions = busAdmissions or {}
+        self.retryInterval = retryInterval
+        self.maxInterval = maxInterval if maxInterval is not None else 8 * interval
+        self.clock = clock
+        self.nextAttempts = {}   # bus -> time of the next attempt
+        self.emptyAttempts = {}  # bus -> count of attempts in a row which found nothing
+        self.restart = False
+        self.stopped = threading.Event()
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="yasdi-detection", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """Stops after the current detection attempt"""
+        self.stopped.set()
+        self.wake.set()
+
+    def searchAgain(self):
+        """Searches all buses again soon (e.g. after all devices were lost by a recovery of yasdi)"""
+        self.restart = True
+        self.wake.set()
+
+    def delay(self, bus) -> float:
+        """Seconds until the next attempt on a bus"""
+        missing = self.deviceRegistry.missingOnDriver(self.driverNames[bus]) if bus is not None else 0
+        delay = (self.retryInterval if missing else self.interval) * 2 ** min(self.emptyAttempts.get(bus, 0), 16)
+        return min(delay, self.maxInterval)
+
+    def detectOnce(self, bus=None) -> RegistryChanges:
+        """One small detection attempt on a bus: search for one more device than currently available"""
+        if bus is None or self.busPoller is None:
+            return self.detect(bus, 0.0)
+        admittedSeconds = 0.0
+        admission = self.busAdmissions.get(bus)
+        if admission is not None:
+            # The broadcast and the answers of the devices of the bus
+            requests = 1 + len(self.busPoller.busDevices.get(bus, ()))
+            admission.acquire(requests=requests)
+            admittedSeconds = requests * admission.busModel.requestSeconds()
+        return self.busPoller.runOnBus(bus, lambda: self.detect(bus, admittedSeconds))
+
+    def detect(self, bus, admittedSeconds) -> RegistryChanges:
+        start = self.clock()
+        try:
+            self.yasdiMaster.DoMasterCmdEx(cmd=CMD_DEVICE_DETECTION, param1=len(self.yasdiMaster.GetDeviceHandles()) + 1)
+        finally:
+            seconds = self.clock() - start
+            for admissionBus, admission in self.busAdmissions.items():
+                admission.charge(seconds - admittedSeconds if admissionBus == bus else seconds)
+        changes = self.deviceRegistry.refresh()
+        if changes and self.onChange is not None:
+            self.onChange(changes)
+        return changes
+
+    def run(self):
+        while not self.stopped.is_set():
+            if self.restart:
+                self.restart = False
+                self.nextAttempts.clear()
+                self.emptyAttempts.clear()
+            for bus in self.driverNames:
+                if bus not in self.nextAttempts:
+                    self.nextAttempts[bus] = self.clock() + self.delay(bus)
+            for bus, nextAttempt in list(self.nextAttempts.items()):
+                if self.stopped.is_set() or self.restart:
+                    break
+                if nextAttempt > self.clock():
+                    continue
+                try:
+                    changes = self.detectOnce(bus)
+                    found = bool(changes.newDevices or changes.found)
+                except (TimeoutError, RuntimeError) as e:
+                    # e.g. a hanging call in a NativeHost: try again later
+                    print(f"Background device detection failed: {e}")
+                    found = False
+                self.emptyAttempts[bus] = 0 if found else self.emptyAttempts.get(bus, 0) + 1
+                self.nextAttempts[bus] = self.clock() + self.delay(bus)
+            self.wake.wait(max(0.0, min(self.nextAttempts.values(), default=self.clock() + self.interval) - self.clock()))
+            self.wake.clear()
@@ -0,0 +1,244 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Snapshots of all channels (spot, parameter and test channels) of all devices and diffs between snapshots.
+
+- DeviceSnapshotReader: reads all channels of all devices with one batch read per device type
+- DeviceSnapshot: values and yasdi return codes of all channels of one device, stored in compact arrays
+- writeSnapshots / readSnapshot: one file per device (JSON header line followed by the binary arrays)
+- diffSnapshots / diffSnapshotSets: changed channel values, e.g. to audit parameter changes of many devices
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import json
+import math
+import os
+import sys
+import time
+from array import array
+from yasdiwrapper.yasdi import YE_OK
+from yasdiwrapper.channelreader import ChannelReader
+
+
+# Constants
+
+# Version of the snapshot file format. Files with another version are not read.
+SNAPSHOT_FILE_VERSION = 1
+SNAPSHOT_FILE_SUFFIX = ".snap"
+
+
+# Implementation
+
+class DeviceSnapshot:
+
+    """All channel values of one device at one point in time. 'channelNames' is shared by all snapshots of a device
+    type, 'values' (array of double) and 'errorCodes' (array of int) have one position per channel.
+    'serialNumber' is None if the serial number of the device could not be read.
+    """
+
+    __slots__ = ("serialNumber", "deviceName", "deviceType", "time", "channelNames", "values", "errorCodes")
+
+    def __init__(self, serialNumber, deviceName, deviceType, snapshotTime, channelNames, values, errorCodes):
+        self.serialNumber = serialNumber
+        self.deviceName = deviceName
+        self.deviceType = deviceType
+        self.time = snapshotTime
+        self.channelNames = channelNames
+        self.values = values
+        self.errorCodes = errorCodes
+
+    def __len__(self):
+        return len(self.channelNames)
+
+    def value(self, channelName) -> float:
+        """Value of a channel, None if the channel is unknown or the value could not be read"""
+        try:
+            position = self.channelNames.index(channelName)
+        except ValueError:
+            return None
+        return self.values[position] if YE_OK == self.errorCodes[position] else None
+
+    def asDict(self) -> dict:
+        """channel name -> value (None if the value could not be read)"""
+        return {channelName: value if YE_OK == errorCode else None
+                for channelName, value, errorCode in zip(self.channelNames, self.values, self.errorCodes)}
+
+
+class DeviceSnapshotReader:
+
+    """Reads snapshots of all channels of devices. Devices of the same device type are read with one batch read;
+    the read buffers are kept for the next snapshot.
+    """
+
+    def __init__(self, yasdiMaster, channelCatalog):
+        self.yasdiMaster = yasdiMaster
+        self.channelCatalog = channelCatalog
+        self.readers = {}  # device type -> ChannelReader
+
+    def takeSnapshots(self, deviceHandles=None, maxValAge=0) -> [DeviceSnapshot]:
+        """Reads all channels of the devices (default: all devices of yasdi). 'maxValAge' is 0 by default,
+        so parameter values are read from the device and not taken from the yasdi value cache.
+        """
+        if deviceHandles is None:
+            deviceHandles = self.yasdiMaster.GetDeviceHandles()
+        devicesOfType = {}
+        for deviceHandle in deviceHandles:
+            devicesOfType.setdefault(self.channelCatalog.getDeviceType(deviceHandle), []).append(deviceHandle)
+
+        snapshots = []
+        for deviceType, devicesList in devicesOfType.items():
+            channelNames = tuple(info.name for info in self.channelCatalog.getChannels(devicesList[0]))
+            reader = self.readers.get(deviceType)
+            if reader is None:
+                reader = self.readers[deviceType] = ChannelReader(self.yasdiMaster, self.channelCatalog)
+            snapshotTime = int(time.time())
+            buffer = reader.readChannels(devicesList, channelNames, maxValAge)
+            # Copy the values of each device out of the (reused) read buffer without a Python call per value
+            values = memoryview(buffer.values).cast("B").cast("d")
+            errorCodes = memoryview(buffer.errorCodes).cast("B").cast("i")
+            channelCount = len(channelNames)
+            for devicePosition, deviceHandle in enumerate(devicesList):
+                start = devicePosition * channelCount
+                serialNumber = self.yasdiMaster.GetDeviceSN(deviceHandle)
+                if isinstance(serialNumber, float) and math.isnan(serialNumber):
+                    # The serial number could not be read (nan)
+                    serialNumber = None
+                snapshots.append(DeviceSnapshot(serialNumber,
+                                                self.yasdiMaster.GetDeviceName(deviceHandle),
+                                                deviceType,
+                                                snapshotTime,
+                                                channelNames,
+                                                array("d", values[start:start + channelCount]),
+                                                array("i", errorCodes[start:start + channelCount])))
+        return snapshots
+
+
+def snapshotFileName(serialNumber) -> str:
+    if serialNumber is None:
+        raise ValueError("A snapshot without serial number has no file name")
+    return f"{serialNumber}{SNAPSHOT_FILE_SUFFIX}"
+
+
+def writeSnapshot(path, snapshot):
+    """Writes a snapshot into a file: one JSON header line followed by the values and the error codes
+    (native arrays, the byte order is stored in the header). The file is replaced atomically.
+    """
+    header = {"version": SNAPSHOT_FILE_VERSION,
+              "byteorder": sys.byteorder,
+              "serialNumber": snapshot.serialNumber,
+              "deviceName": snapshot.deviceName,
+              "deviceType": snapshot.deviceType,
+              "time": snapshot.time,
+              "channelNames": list(snapshot.channelNames)}
+    tempFile = path + ".tmp"
+    with open(tempFile, "wb") as f:
+        f.write(json.dumps(header).encode("utf-8") + b"\n")
+        snapshot.values.tofile(f)
+        snapshot.errorCodes.tofile(f)
+    os.replace(tempFile, path)
+
+
+def writeSnapshots(directory, snapshots) -> [str]:
+    """Writes one file per device into a directory. Returns the paths of the written files. Snapshots without serial
+    number are not written: they could not be told apart (or matched with the device in the next run).
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for snapshot in snapshots:
+        if snapshot.serialNumber is None:
+            continue
+        path = os.path.join(directory, snapshotFileName(snapshot.serialNumber))
+        writeSnapshot(path, snapshot)
+        paths.append(path)
+    return paths
+
+
+def readSnapshot(path) -> DeviceSnapshot:
+    with open(path, "rb") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != SNAPSHOT_FILE_VERSION:
+            raise ValueError(f"Unsupported snapshot file version in {path}")
+        channelCount = len(header["channelNames"])
+        values = array("d")
+        values.fromfile(f, channelCount)
+        errorCodes = array("i")
+        errorCodes.fromfile(f, channelCount)
+    if header["byteorder"] != sys.byteorder:
+        values.byteswap()
+        errorCodes.byteswap()
+    return DeviceSnapshot(header["serialNumber"], header["deviceName"], header["deviceType"], header["time"],
+                          tuple(header["channelNames"]), values, errorCodes)
+
+
+def readSnapshots(directory) -> dict:
+    """Reads all snapshot files of a directory. Returns serial number -> DeviceSnapshot."""
+    snapshots = {}
+    for fileName in sorted(os.listdir(directory)):
+        if fileName.endswith(SNAPSHOT_FILE_SUFFIX):
+            snapshot = readSnapshot(os.path.join(directory, fileName))
+            snapshots[snapshot.serialNumber] = snapshot
+    return snapshots
+
+
+def sameValue(oldValue, oldCode, newValue, newCode) -> bool:
+    if oldCode != newCode:
+        return False
+    return YE_OK != oldCode or oldValue == newValue or (math.isnan(oldValue) and math.isnan(newValue))
+
+
+def diffSnapshots(oldSnapshot, newSnapshot, channelNames=None) -> [tuple]:
+    """Changed channels between two snapshots of a device as list of (channel name, old value, new value).
+    A value is None if it could not be read or the channel did not exist. 'channelNames' limits the comparison
+    to some channels (e.g. the parameter channels).
+    """
+    wanted = None if channelNames is None else set(channelNames)
+    if oldSnapshot.channelNames == newSnapshot.channelNames:
+        # Same channel set (the usual case): nothing changed if the raw arrays are equal
+        if oldSnapshot.values.tobytes() == newSnapshot.values.tobytes() and oldSnapshot.errorCodes == newSnapshot.errorCodes:
+            return []
+        return [(channelName,
+                 oldValue if YE_OK == oldCode else None,
+                 newValue if YE_OK == newCode else None)
+                for channelName, oldValue, oldCode, newValue, newCode in zip(newSnapshot.channelNames,
+                                                                             oldSnapshot.values,
+                                                                             oldSnapshot.errorCodes,
+                                                                             newSnapshot.values,
+                                                                             newSnapshot.errorCodes)
+                if (wanted is None or channelName in wanted) and not sameValue(oldValue, oldCode, newValue, newCode)]
+    oldValues = oldSnapshot.asDict()
+    newValues = newSnapshot.asDict()
+    return [(channelName, oldValues.get(channelName), newValues.get(channelName))
+            for channelName in list(oldSnapshot.channelNames) + [name for name in newSnapshot.channelNames
+                                                                 if name not in oldValues]
+            if (wanted is None or channelName in wanted)
+            and (channelName not in oldValues or channelName not in newValues
+                 or oldValues[channelName] != newValues[channelName])]
+
+
+def diffSnapshotSets(oldSnapshots, newSnapshots, channelNames=None) -> dict:
+    """Diffs of many devices. Both arguments map serial number -> DeviceSnapshot (see readSnapshots()).
+    Returns serial number -> list of changes (see diffSnapshots()); devices without changes are left out.
+    Devices only available in one of the sets get every channel as change.
+    """
+    diffs = {}
+    for serialNumber in list(oldSnapshots) + [sn for sn in newSnapshots if sn not in oldSnapshots]:
+        oldSnapshot = oldSnapshots.get(serialNumber)
+        newSnapshot = newSnapshots.get(serialNumber)
+        if oldSnapshot is None:
+            changes = [(channelName, None, value) for channelName, value in newSnapshot.asDict().items()]
+        elif newSnapshot is None:
+            changes = [(channelName, value, None) for channelName, value in oldSnapshot.asDict().items()]
+        else:
+            changes = diffSnapshots(oldSnapshot, newSnapshot, channelNames)
+        if channelNames is not None:
+            changes = [change for change in changes if change[0] in channelNames]
+        if changes:
+            diffs[serialNumber] = changes
+    return diffs
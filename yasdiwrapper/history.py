@@ -0,0 +1,200 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""In-memory history of polled values with a fixed memory footprint.
+
+Every (device, channel) gets a ring buffer of fixed capacity. Timestamps and values are stored in typed arrays
+(array('I') and array('d'), 12 bytes per value), so the memory of the store is known in advance:
+series count * capacity * 12 bytes. The queries work on array slices (last values, time ranges, min/max/mean
+downsampling, daily energy yield of the counter channel E-Total). A query copies only the requested part of a ring:
+its positions are computed from the write position, time ranges are found by bisection in the ring itself.
+
+The package depends on the standard library only, so the buffers are no NumPy arrays. The slices support the buffer
+protocol and can be wrapped without copying for vectorized processing, e.g. numpy.frombuffer(values).
+
+The store has the sink interface (write(records), close()) and can be added to a SinkPipeline.
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import bisect
+import datetime
+from array import array
+
+
+# Constants
+
+# One day of values polled every 2 seconds
+DEFAULT_CAPACITY = 43200
+BYTES_PER_VALUE = array("I").itemsize + array("d").itemsize
+
+
+# Implementation
+
+class RingBuffer:
+
+    """Fixed capacity buffer of (timestamp, value) pairs in time order. The oldest values are overwritten."""
+
+    __slots__ = ("capacity", "timestamps", "values", "start", "count")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array("I", bytes(capacity * array("I").itemsize))
+        self.values = array("d", bytes(capacity * array("d").itemsize))
+        self.start = 0   # position of the oldest value
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def lastTimestamp(self):
+        return self.timestamps[(self.start + self.count - 1) % self.capacity] if self.count else None
+
+    def append(self, timestamp, value) -> bool:
+        """Adds a value. Values which are not newer than the last one (e.g. the same yasdi value delivered again)
+        are ignored. Returns True if the value was added.
+        """
+        if self.count and timestamp <= self.lastTimestamp():
+            return False
+        if self.count < self.capacity:
+            position = (self.start + self.count) % self.capacity
+            self.count += 1
+        else:
+            position = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.timestamps[position] = timestamp
+        self.values[position] = value
+        return True
+
+    def slice(self, first, end) -> (array, array):
+        """Copies of the timestamps and values at the positions first <= position < end in time order (0 = oldest)"""
+        first += self.start
+        end += self.start
+        if first >= self.capacity:
+            first -= self.capacity
+            end -= self.capacity
+        if end <= self.capacity:
+            return self.timestamps[first:end], self.values[first:end]
+        end -= self.capacity
+        return (self.timestamps[first:] + self.timestamps[:end],
+                self.values[first:] + self.values[:end])
+
+    def position(self, timestamp) -> int:
+        """Position in time order of the first value with a timestamp >= 'timestamp' (bisection in the ring)"""
+        firstPartEnd = min(self.start + self.count, self.capacity)
+        if self.start + self.count > self.capacity and timestamp > self.timestamps[firstPartEnd - 1]:
+            # In the newer part at the beginning of the arrays
+            return firstPartEnd - self.start + bisect.bisect_left(self.timestamps, timestamp, 0,
+                                                                  self.start + self.count - self.capacity)
+        return bisect.bisect_left(self.timestamps, timestamp, self.start, firstPartEnd) - self.start
+
+    def ordered(self) -> (array, array):
+        """Copies of the timestamps and values in time order"""
+        return self.slice(0, self.count)
+
+    def last(self, count) -> (array, array):
+        """The last 'count' timestamps and values"""
+        return self.slice(self.count - min(count, self.count), self.count)
+
+    def between(self, fromTime, toTime) -> (array, array):
+        """Timestamps and values with fromTime <= timestamp < toTime"""
+        first = self.position(fromTime)
+        return self.slice(first, max(first, self.position(toTime)))
+
+
+def downsample(timestamps, values, bucketSeconds) -> list:
+    """Aggregates time ordered values into buckets of 'bucketSeconds' (aligned to multiples of bucketSeconds).
+    Returns a list of (bucket start, minimum, maximum, mean, count) for every bucket which contains values.
+    """
+    rollups = []
+    position = 0
+    while position < len(timestamps):
+        bucketStart = timestamps[position] - timestamps[position] % bucketSeconds
+        end = bisect.bisect_left(timestamps, bucketStart + bucketSeconds, position)
+        bucket = values[position:end]
+        rollups.append((bucketStart, min(bucket), max(bucket), sum(bucket) / len(bucket), len(bucket)))
+        position = end
+    return rollups
+
+
+def dailyDeltas(timestamps, values) -> list:
+    """Increase of a counter (e.g. E-Total) per local day: list of (date, delta). The increase of a day is the last
+    value of the day minus the last value of the previous day (or the first value of the day for the first day).
+    """
+    deltas = []
+    position = 0
+    while position < len(timestamps):
+        day = datetime.date.fromtimestamp(timestamps[position])
+        nextDay = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time()).timestamp()
+        end = bisect.bisect_left(timestamps, nextDay, position)
+        reference = values[position - 1] if position > 0 else values[position]
+        deltas.append((day, values[end - 1] - reference))
+        position = end
+    return deltas
+
+
+class TimeSeriesStore:
+
+    """Ring buffers of all (device, channel name) pairs. At most 'maxSeries' series are kept (None = no limit),
+    values of further series are dropped and counted in 'droppedValues'.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, maxSeries=None):
+        self.capacity = capacity
+        self.maxSeries = maxSeries
+        self.series = {}  # (device, channel name) -> RingBuffer
+        self.droppedValues = 0
+
+    def memoryBytes(self, seriesCount=None) -> int:
+        """Memory of the value buffers of 'seriesCount' series (default: the current series)"""
+        if seriesCount is None:
+            seriesCount = len(self.series)
+        return seriesCount * self.capacity * BYTES_PER_VALUE
+
+    def write(self, records):
+        """Adds records (device, channel info, timestamp, value)"""
+        for device, channel, timestamp, value in records:
+            key = (device, channel.name)
+            ringBuffer = self.series.get(key)
+            if ringBuffer is None:
+                if self.maxSeries is not None and len(self.series) >= self.maxSeries:
+                    self.droppedValues += 1
+                    continue
+                ringBuffer = self.series[key] = RingBuffer(self.capacity)
+            ringBuffer.append(timestamp, value)
+
+    def close(self):
+        pass
+
+    def devices(self, channelName) -> list:
+        return [device for device, name in self.series if name == channelName]
+
+    def last(self, device, channelName, count=1) -> (array, array):
+        ringBuffer = self.series.get((device, channelName))
+        return ringBuffer.last(count) if ringBuffer is not None else (array("I"), array("d"))
+
+    def between(self, device, channelName, fromTime, toTime) -> (array, array):
+        ringBuffer = self.series.get((device, channelName))
+        return ringBuffer.between(fromTime, toTime) if ringBuffer is not None else (array("I"), array("d"))
+
+    def downsample(self, device, channelName, fromTime, toTime, bucketSeconds) -> list:
+        """Minimum, maximum and mean per bucket, see downsample()"""
+        return downsample(*self.between(device, channelName, fromTime, toTime), bucketSeconds)
+
+    def dailyYield(self, channelName="E-Total") -> dict:
+        """Energy yield per day of every device: device -> list of (date, yield), see dailyDeltas()"""
+        return {device: dailyDeltas(*self.series[(device, channelName)].ordered()) for device in self.devices(channelName)}
+
+    def fleetDailyYield(self, channelName="E-Total") -> dict:
+        """Energy yield per day of all devices together: date -> yield"""
+        fleetYield = {}
+        for deltas in self.dailyYield(channelName).values():
+            for day, delta in deltas:
+                fleetYield[day] = fleetYield.get(day, 0.0) + delta
+        return dict(sorted(fleetYield.items()))
@@ -0,0 +1,259 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Shared memory board with the latest value of every (device, channel) for other local processes.
+
+The poller writes into a memory mapped file with a fixed layout; readers (web UI, Modbus bridge, ...) map the same
+file and read the values directly from memory, without IPC round trips, file parsing or access to the bus:
+
+    header | keys (device, channel name, unit) of all slots | value records of all slots
+
+A slot is assigned to a (device, channel) when its first value arrives, its key never changes afterwards. Device
+labels and channel names which don't fit into their key field are rejected, so two long names can not share a
+slot. The header counts the used slots. Every value record is protected by a sequence lock: the writer makes the
+sequence odd before and even after an update, a reader retries if the sequence was odd or changed during its read.
+Python has no memory barriers for mmap writes: on weakly ordered CPUs (e.g. the ARM boards the demon runs on) a
+reader may see the new sequence before the new value. Every record therefore carries a CRC32 of its final sequence
+and its content, a reader also retries if the checksum does not match.
+
+    board = LiveBoardReader("/dev/shm/yasdi-liveboard")
+    liveValue = board.read("WR21TL06 2000000001", "Pac")
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import math
+import mmap
+import os
+import struct
+import zlib
+from yasdiwrapper.yasdi import YE_OK
+
+
+# Constants
+
+MAGIC = b"YLVB"
+LAYOUT_VERSION = 2
+
+# Header: magic, layout version, capacity (slots), used slots
+HEADER = struct.Struct("<4sHxxII")
+# Key of a slot: device label, channel name, unit (utf-8, zero padded)
+KEY = struct.Struct("<40s20s12s")
+# Value record of a slot: sequence, value timestamp, value, yasdi error code of the last read, checksum of the record
+RECORD = struct.Struct("<IIdiI")
+SEQUENCE = struct.Struct("<I")
+# Part of the record covered by the checksum
+CHECKED = struct.Struct("<IIdi")
+
+DEFAULT_CAPACITY = 1024
+# Shared memory on Linux, a normal file elsewhere
+DEFAULT_PATH = "/dev/shm/yasdi-liveboard" if os.path.isdir("/dev/shm") else "." + os.sep + "liveboard.bin"
+
+# Attempts of a reader before a record which is always being written is given up
+MAX_READ_ATTEMPTS = 1000
+
+
+# Implementation
+
+class LiveBoardError(RuntimeError):
+
+    """The file is no live board or a record could not be read consistently"""
+
+
+class LiveValue:
+
+    """Latest value of a channel. 'errorCode' is the result of the last read: the value and timestamp stay those of
+    the last successful read if it failed.
+    """
+
+    __slots__ = ("timestamp", "value", "errorCode", "unit")
+
+    def __init__(self, timestamp, value, errorCode, unit):
+        self.timestamp = timestamp
+        self.value = value
+        self.errorCode = errorCode
+        self.unit = unit
+
+    def __repr__(self):
+        return f"LiveValue({self.timestamp}, {self.value}, errorCode={self.errorCode}, unit={self.unit!r})"
+
+    @property
+    def ok(self) -> bool:
+        return YE_OK == self.errorCode
+
+
+def boardSize(capacity) -> int:
+    return HEADER.size + capacity * (KEY.size + RECORD.size)
+
+
+def encodeText(text, size) -> bytes:
+    """utf-8, cut at a character boundary to fit into 'size' bytes"""
+    return (text or "").encode("utf-8")[:size].decode("utf-8", "ignore").encode("utf-8")
+
+
+def fits(text, size) -> bool:
+    return len((text or "").encode("utf-8")) <= size
+
+
+def checksum(sequence, timestamp, value, errorCode) -> int:
+    return zlib.crc32(CHECKED.pack(sequence, timestamp, value, errorCode))
+
+
+def decodeText(data) -> str:
+    return data.rstrip(b"\0").decode("utf-8")
+
+
+class LiveBoardWriter:
+
+    """Writes the latest values into the board. Only one writer per board. It is a sink (write(records), close()) and
+    can be added to a SinkPipeline. Values of further (device, channel) pairs than 'capacity' and of keys which
+    don't fit (device label > 40, channel name > 20 bytes utf-8) are counted in 'droppedValues'. Units are cut to
+    12 bytes.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.slots = {}  # (device, channel name) -> slot number
+        self.publishedSlots = 0
+        self.droppedValues = 0
+        self.recordsOffset = HEADER.size + capacity * KEY.size
+        # A new file replaces the board of a former run atomically: readers of the old board notice the replacement
+        temporaryPath = path + ".tmp"
+        with open(temporaryPath, "wb") as file:
+            file.truncate(boardSize(capacity))
+            file.flush()
+        self.file = open(temporaryPath, "r+b")
+        self.memory = mmap.mmap(self.file.fileno(), boardSize(capacity))
+        HEADER.pack_into(self.memory, 0, MAGIC, LAYOUT_VERSION, capacity, 0)
+        os.replace(temporaryPath, path)
+
+    def slotOf(self, device, channel):
+        """Slot number of a channel, None if the board is full or the key does not fit"""
+        key = (device, channel.name)
+        slot = self.slots.get(key)
+        if slot is None:
+            if len(self.slots) >= self.capacity or not fits(device, 40) or not fits(channel.name, 20):
+                return None
+            slot = len(self.slots)
+            KEY.pack_into(self.memory, HEADER.size + slot * KEY.size, encodeText(device, 40),
+                          encodeText(channel.name, 20), encodeText(channel.unit, 12))
+            self.slots[key] = slot
+        return slot
+
+    def update(self, device, channel, timestamp, value, errorCode=YE_OK):
+        """Sets the value of a channel. A failed read ('errorCode' != YE_OK) keeps the last value and timestamp."""
+        slot = self.slotOf(device, channel)
+        if slot is None:
+            self.droppedValues += 1
+            return
+        offset = self.recordsOffset + slot * RECORD.size
+        sequence, lastTimestamp, lastValue, lastErrorCode, _ = RECORD.unpack_from(self.memory, offset)
+        if YE_OK != errorCode:
+            timestamp, value = (lastTimestamp, lastValue) if slot < self.publishedSlots else (0, math.nan)
+        sequence, finalSequence = (sequence + 1) & 0xFFFFFFFF, (sequence + 2) & 0xFFFFFFFF
+        SEQUENCE.pack_into(self.memory, offset, sequence)
+        RECORD.pack_into(self.memory, offset, sequence, timestamp, value, errorCode,
+                         checksum(finalSequence, timestamp, value, errorCode))
+        SEQUENCE.pack_into(self.memory, offset, finalSequence)
+        if slot >= self.publishedSlots:
+            # Readers see a new slot only after its key and first value are complete
+            self.publishedSlots = slot + 1
+            HEADER.pack_into(self.memory, 0, MAGIC, LAYOUT_VERSION, self.capacity, self.publishedSlots)
+
+    def write(self, records):
+        """Sets the values of records (device, channel info, timestamp, value)"""
+        for device, channel, timestamp, value in records:
+            self.update(device, channel, timestamp, value)
+
+    def close(self):
+        """The board stays in place with the last values"""
+        self.memory.flush()
+        self.memory.close()
+        self.file.close()
+
+
+class LiveBoardReader:
+
+    """Reads values of a board written by a LiveBoardWriter in another process. Call refresh() (or readAll())
+    from time to time to follow a board which was created again by a restarted writer.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.file = None
+        self.memory = None
+        self.open()
+
+    def open(self):
+        self.close()
+        self.file = open(self.path, "rb")
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        try:
+            self.memory = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self.file.close()
+            self.file = None
+            raise LiveBoardError(f"{self.path} is no live board")
+        if len(self.memory) < HEADER.size:
+            raise LiveBoardError(f"{self.path} is no live board")
+        magic, version, self.capacity, usedSlots = HEADER.unpack_from(self.memory, 0)
+        if MAGIC != magic or LAYOUT_VERSION != version or len(self.memory) < boardSize(self.capacity):
+            raise LiveBoardError(f"{self.path} is no live board of version {LAYOUT_VERSION}")
+        self.recordsOffset = HEADER.size + self.capacity * KEY.size
+        self.slots = {}  # (device, channel name) -> (slot number, unit)
+
+    def close(self):
+        if self.memory is not None:
+            self.memory.close()
+            self.file.close()
+            self.memory = self.file = None
+
+    def refresh(self):
+        """Reads the keys of new slots. Maps the new board if the writer was started again."""
+        try:
+            replaced = os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            replaced = False
+        if replaced:
+            self.open()
+        usedSlots = HEADER.unpack_from(self.memory, 0)[3]
+        for slot in range(len(self.slots), min(usedSlots, self.capacity)):
+            device, channelName, unit = KEY.unpack_from(self.memory, HEADER.size + slot * KEY.size)
+            self.slots[(decodeText(device), decodeText(channelName))] = (slot, decodeText(unit))
+
+    def keys(self) -> list:
+        """All (device, channel name) pairs on the board"""
+        self.refresh()
+        return list(self.slots)
+
+    def readSlot(self, slot):
+        """Consistent (timestamp, value, error code) of a slot"""
+        offset = self.recordsOffset + slot * RECORD.size
+        for attempt in range(MAX_READ_ATTEMPTS):
+            sequence, timestamp, value, errorCode, recordChecksum = RECORD.unpack_from(self.memory, offset)
+            if (not sequence & 1 and recordChecksum == checksum(sequence, timestamp, value, errorCode)
+                    and SEQUENCE.unpack_from(self.memory, offset)[0] == sequence):
+                return timestamp, value, errorCode
+        raise LiveBoardError(f"Slot {slot} of {self.path} could not be read")
+
+    def read(self, device, channelName) -> LiveValue:
+        """Latest value of a channel, None if it is not on the board (yet)"""
+        key = (device, channelName)
+        if key not in self.slots:
+            self.refresh()
+            if key not in self.slots:
+                return None
+        slot, unit = self.slots[key]
+        return LiveValue(*self.readSlot(slot), unit)
+
+    def readAll(self) -> dict:
+        """Latest values of all channels: (device, channel name) -> LiveValue"""
+        self.refresh()
+        return {key: LiveValue(*self.readSlot(slot), unit) for key, (slot, unit) in self.slots.items()}
@@ -0,0 +1,309 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Metrics of the YASDI wrapper and the polling demon in Prometheus text format.
+
+- Metrics: counters, gauges and histograms with fixed buckets (cheap enough to stay enabled in production)
+- InstrumentedYasdiMaster: YasdiMaster proxy which measures every call, every channel read (per device and channel),
+  counts the yasdi error codes and the stale values
+- MetricsFileExporter / MetricsHttpServer: publish the metrics as text file or on a local HTTP endpoint
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import bisect
+import os
+import threading
+import time
+from ctypes import c_double
+from yasdiwrapper.yasdi import *
+
+
+# Constants
+
+# Histogram buckets (seconds). Covers fast cached values up to timeouts on a 1200 baud line.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Names of the return codes of the value functions (some codes have other meanings for other functions)
+ERROR_CODE_NAMES = {
+    YE_OK: "YE_OK",
+    YE_UNKNOWN_HANDLE: "YE_UNKNOWN_HANDLE",
+    YE_SHUTDOWN: "YE_SHUTDOWN",
+    YE_TIMEOUT: "YE_TIMEOUT",
+    YE_VALUE_NOT_VALID: "YE_VALUE_NOT_VALID",
+    YE_NO_ACCESS_RIGHTS: "YE_NO_ACCESS_RIGHTS",
+    YE_CHAN_TYPE_MISMATCH: "YE_CHAN_TYPE_MISMATCH",
+    YE_INVAL_ARGUMENT: "YE_INVAL_ARGUMENT",
+    YE_NOT_SUPPORTED: "YE_NOT_SUPPORTED",
+    YE_DEV_DETECT_IN_PROGRESS: "YE_DEV_DETECT_IN_PROGRESS",
+    YE_TOO_MANY_REQUESTS: "YE_TOO_MANY_REQUESTS",
+}
+
+
+# Implementation
+
+class Histogram:
+
+    """Histogram with fixed bucket upper bounds"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def metricKey(item):
+    """Sort key of a metric: name and labels (label values may be numbers or strings)"""
+    (name, labels), _ = item
+    return (name, [(label, str(value)) for label, value in labels])
+
+
+def escapeLabelValue(value) -> str:
+    """Label value as required by the exposition format: backslash, double quote and line feed escaped"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def formatLabels(labels, extra="") -> str:
+    parts = [f'{name}="{escapeLabelValue(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metrics:
+
+    """Registry of all metrics. Metrics are identified by name and a tuple of (label, value) pairs. Thread safe."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.help = {}        # name -> (type, help text)
+        self.counters = {}    # (name, labels) -> value
+        self.gauges = {}      # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+
+    def describe(self, name, metricType, helpText):
+        self.help[name] = (metricType, helpText)
+
+    def increment(self, name, labels=(), amount=1):
+        with self.lock:
+            key = (name, labels)
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def setGauge(self, name, value, labels=()):
+        with self.lock:
+            self.gauges[(name, labels)] = value
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS):
+        with self.lock:
+            self.histogram(name, labels, buckets).observe(value)
+
+    def histogram(self, name, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        """Returns the histogram (created if needed). Caller must hold the lock."""
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        return histogram
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            lines = []
+            described = set()
+
+            def header(name, metricType):
+                if name not in described:
+                    described.add(name)
+                    helpType, helpText = self.help.get(name, (metricType, ""))
+                    if helpText:
+                        escapedHelp = helpText.replace("\\", "\\\\").replace("\n", "\\n")
+                        lines.append(f"# HELP {name} {escapedHelp}")
+                    lines.append(f"# TYPE {name} {helpType}")
+
+            for (name, labels), value in sorted(self.counters.items(), key=metricKey):
+                header(name, "counter")
+                lines.append(f"{name}{formatLabels(labels)} {value}")
+            for (name, labels), value in sorted(self.gauges.items(), key=metricKey):
+                header(name, "gauge")
+                lines.append(f"{name}{formatLabels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items(), key=metricKey):
+                header(name, "histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    bucketLabel = f'le="{bound}"'
+                    lines.append(f"{name}_bucket{formatLabels(labels, bucketLabel)} {cumulative}")
+                lines.append(f"{name}_sum{formatLabels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{formatLabels(labels)} {histogram.count}")
+            return "\n".join(lines) + "\n"
+
+
+class InstrumentedYasdiMaster:
+
+    """Proxy of a YasdiMaster which records metrics of all calls:
+    - yasdi_call_seconds{method}: duration of every wrapper call
+    - yasdi_channel_read_seconds{device,channel}: duration of every channel value read
+    - yasdi_channel_reads_total{code}: count of channel value reads by yasdi return code
+    - yasdi_stale_values_total / yasdi_values_total: values older than the requested maximal age
+    Device labels are the device handles unless 'deviceLabels' (device handle -> label) says otherwise.
+    """
+
+    def __init__(self, yasdiMaster, metrics, staleTolerance=2):
+        """'staleTolerance': seconds a value timestamp may be older than the requested maximal value age"""
+        self.yasdiMaster = yasdiMaster
+        self.metrics = metrics
+        self.staleTolerance = staleTolerance
+        self.deviceLabels = {}
+        self.channelNames = {}  # channel handle -> name
+        self.buffers = threading.local()  # duration buffer of each (bus worker) thread
+        metrics.describe("yasdi_call_seconds", "histogram", "Duration of YasdiMaster calls")
+        metrics.describe("yasdi_channel_read_seconds", "histogram", "Duration of channel value reads")
+        metrics.describe("yasdi_channel_reads_total", "counter", "Channel value reads by yasdi return code")
+        metrics.describe("yasdi_stale_values_total", "counter", "Values older than the requested maximal age")
+        metrics.describe("yasdi_values_total", "counter", "Valid values read")
+
+    def __getattr__(self, name):
+        """All other YasdiMaster methods are measured as a whole"""
+        method = getattr(self.yasdiMaster, name)
+        if not callable(method):
+            return method
+        metrics = self.metrics
+        labels = (("method", name),)
+
+        def timedMethod(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                metrics.observe("yasdi_call_seconds", time.perf_counter() - start, labels)
+
+        return timedMethod
+
+    def channelName(self, channelHandle) -> str:
+        name = self.channelNames.get(channelHandle)
+        if name is None:
+            name = self.channelNames[channelHandle] = self.yasdiMaster.GetChannelName(channelHandle)
+        return name
+
+    def GetChannelValue(self, channel_handle, device_handle, max_val_age=1) -> float:
+        return self.GetChannelValueCode(channel_handle, device_handle, max_val_age)[1]
+
+    def GetChannelValueCode(self, channel_handle, device_handle, max_val_age=1) -> (int, float):
+        start = time.perf_counter()
+        code, value = self.yasdiMaster.GetChannelValueCode(channel_handle, device_handle, max_val_age)
+        duration = time.perf_counter() - start
+        # Resolve the labels before the metrics lock is taken (may call into the library)
+        labels = self.readLabels(device_handle, channel_handle)
+        self.metrics.observe("yasdi_channel_read_seconds", duration, labels)
+        self.metrics.increment("yasdi_channel_reads_total", (("code", ERROR_CODE_NAMES.get(code, str(code))),))
+        return code, value
+
+    def GetChannelValues(self, channelHandles, deviceHandles, values, timestamps, errorCodes, count, max_val_age=1,
+                         durations=None):
+        start = time.perf_counter()
+        if durations is None:
+            durations = getattr(self.buffers, "durations", None)
+            if durations is None or len(durations) < count:
+                durations = self.buffers.durations = (c_double * count)()
+        self.yasdiMaster.GetChannelValues(channelHandles, deviceHandles, values, timestamps, errorCodes, count,
+                                          max_val_age, durations)
+        self.recordReads(channelHandles, deviceHandles, timestamps, errorCodes, count, max_val_age, durations)
+        self.metrics.observe("yasdi_call_seconds", time.perf_counter() - start, (("method", "GetChannelValues"),))
+
+    def readLabels(self, deviceHandle, channelHandle) -> tuple:
+        return (("device", self.deviceLabels.get(deviceHandle, deviceHandle)), ("channel", self.channelName(channelHandle)))
+
+    def recordReads(self, channelHandles, deviceHandles, timestamps, errorCodes, count, maxValueAge, durations):
+        # Resolve the channel names outside of the metrics lock (may call into the library)
+        labels = [self.readLabels(deviceHandles[position], channelHandles[position])
+                  for position in range(count) if channelHandles[position] != INVALID_HANDLE]
+        now = time.time()
+        staleLimit = now - max(maxValueAge, 1) - self.staleTolerance
+        codes = {}
+        valid = stale = 0
+        metrics = self.metrics
+        with metrics.lock:
+            labelPosition = 0
+            for position in range(count):
+                code = errorCodes[position]
+                codes[code] = codes.get(code, 0) + 1
+                if channelHandles[position] == INVALID_HANDLE:
+                    continue
+                metrics.histogram("yasdi_channel_read_seconds", labels[labelPosition]).observe(durations[position])
+                labelPosition += 1
+                if YE_OK == code:
+                    valid += 1
+                    if timestamps[position] < staleLimit:
+                        stale += 1
+        for code, amount in codes.items():
+            metrics.increment("yasdi_channel_reads_total", (("code", ERROR_CODE_NAMES.get(code, str(code))),), amount)
+        metrics.increment("yasdi_values_total", amount=valid)
+        metrics.increment("yasdi_stale_values_total", amount=stale)
+
+
+class MetricsFileExporter:
+
+    """Writes the metrics into a text file (e.g. for the node exporter textfile collector). Replaced atomically."""
+
+    def __init__(self, metrics, path, minInterval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.minInterval = minInterval
+        self.lastWrite = None
+
+    def export(self, force=False):
+        now = time.monotonic()
+        if not force and self.lastWrite is not None and now - self.lastWrite < self.minInterval:
+            return
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.metrics.render())
+        os.replace(self.path + ".tmp", self.path)
+        self.lastWrite = now
+
+
+class MetricsHttpServer:
+
+    """Serves the metrics on http://<host>:<port>/metrics in a background thread"""
+
+    def __init__(self, metrics, port=9110, host="127.0.0.1"):
+        # Imported here: http.server is slow to import and only needed if the metrics are served
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = metrics
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="yasdi-metrics", daemon=True)
+        self.thread.start()
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
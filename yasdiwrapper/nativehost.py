@@ -0,0 +1,359 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Runs the native YASDI libraries in a supervised worker process.
+
+A hanging serial read or a crash in the native code only affects the worker process. Every call has a deadline;
+a call which does not return in time is answered with YasdiTimeoutError and the worker is recovered:
+first with yasdiReset() (from another thread of the worker), and if that does not release the hanging call, the
+worker process is killed and started again. After a recovery all device handles are invalid: the 'onRecovery'
+callback tells the application to run the device detection again.
+
+Requests and results are pickled through a multiprocessing Pipe instead of shared memory buffers: a batch read
+exchanges its arrays as raw bytes in one message, which costs microseconds against milliseconds of bus time per value,
+and a pipe needs no synchronization of its own when the worker is killed and restarted.
+
+    host = NativeHost()
+    yasdi, yasdiMaster = HostedYasdi(host), HostedYasdiMaster(host)
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ctypes import addressof, memmove, sizeof, c_double, c_int, c_uint32
+from yasdiwrapper.yasdi import Yasdi
+from yasdiwrapper.yasdimaster import YasdiMaster
+
+
+# Constants
+
+# Targets of the calls in the worker process
+TARGET_YASDI = "yasdi"
+TARGET_MASTER = "master"
+TARGET_LIBRARY = "library"  # the library object itself, only available with a library factory (simulator control)
+TARGET_CONTROL = "control"
+
+# Seconds the worker process gets to load and initialize the libraries
+START_TIMEOUT = 30.0
+
+# A batch read reports its progress at most every PROGRESS_INTERVAL seconds. Message of the progress report:
+PROGRESS_INTERVAL = 0.1
+PROGRESS = None
+
+
+# Implementation
+
+class YasdiTimeoutError(TimeoutError):
+
+    """A call into the native library did not return in time. The worker process was recovered."""
+
+
+class YasdiHostError(RuntimeError):
+
+    """The worker process failed (crashed or raised an exception)"""
+
+
+def element(array, position):
+    """ctypes array of the one element at 'position' of 'array' (no copy)"""
+    return (array._type_ * 1).from_buffer(array, position * sizeof(array._type_))
+
+
+def readValues(yasdiMaster, channelHandleBytes, deviceHandleBytes, count, maxValueAge, withDurations,
+               reportProgress=None):
+    """GetChannelValues in the worker process. The arrays are exchanged as raw bytes. The values are read one by
+    one, reportProgress() is called after a read if the last report is older than PROGRESS_INTERVAL.
+    """
+    channelHandles = (c_uint32 * count).from_buffer_copy(channelHandleBytes)
+    deviceHandles = (c_uint32 * count).from_buffer_copy(deviceHandleBytes)
+    values = (c_double * count)()
+    timestamps = (c_uint32 * count)()
+    errorCodes = (c_int * count)()
+    durations = (c_double * count)() if withDurations else None
+    lastReport = time.monotonic()
+    for position in range(count):
+        yasdiMaster.GetChannelValues(element(channelHandles, position), element(deviceHandles, position),
+                                     element(values, position), element(timestamps, position),
+                                     element(errorCodes, position), 1, maxValueAge,
+                                     None if durations is None else element(durations, position))
+        if reportProgress is not None and time.monotonic() - lastReport >= PROGRESS_INTERVAL:
+            reportProgress()
+            lastReport = time.monotonic()
+    return bytes(values), bytes(timestamps), bytes(errorCodes), None if durations is None else bytes(durations)
+
+
+def runHost(connection, iniFile, libraryFactory, threadCount):
+    """Main function of the worker process. Calls run in a thread pool, yasdiReset runs directly in the receiving
+    thread, so it can be called while other calls hang.
+    """
+    # Ignored signals are inherited (e.g. SIGTERM while the parent shuts down): the worker must stay killable
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    library = libraryFactory() if libraryFactory is not None else None
+    yasdiMaster = YasdiMaster(iniFile, library=library)
+    targets = {TARGET_YASDI: Yasdi(library=library), TARGET_MASTER: yasdiMaster, TARGET_LIBRARY: library}
+    sendLock = threading.Lock()
+    connection.send((0, (True, None)))  # ready
+
+    def send(message):
+        with sendLock:
+            connection.send(message)
+
+    def execute(requestId, target, method, args, kwargs):
+        try:
+            if target == TARGET_CONTROL and method == "readValues":
+                result = (True, readValues(yasdiMaster, *args, reportProgress=lambda: send((requestId, PROGRESS))))
+            elif target == TARGET_CONTROL and method == "yasdiReset":
+                yasdiMaster.yasdiReset()
+                result = (True, None)
+            else:
+                result = (True, getattr(targets[target], method)(*args, **kwargs))
+        except Exception as e:
+            result = (False, f"{type(e).__name__}: {e}")
+        send((requestId, result))
+
+    executor = ThreadPoolExecutor(max_workers=threadCount, thread_name_prefix="yasdi-host")
+    while True:
+        try:
+            requestId, target, method, args, kwargs = connection.recv()
+        except (EOFError, OSError):
+            break
+        if target == TARGET_CONTROL and method == "shutdown":
+            yasdiMaster.yasdiMasterShutdown()
+            break
+        if target == TARGET_CONTROL and method == "yasdiReset":
+            execute(requestId, target, method, args, kwargs)
+        else:
+            executor.submit(execute, requestId, target, method, args, kwargs)
+    # Hanging native calls would block a normal exit
+    os._exit(0)
+
+
+class PendingCall:
+
+    __slots__ = ("done", "result", "generation", "submitted", "lastProgress")
+
+    def __init__(self, generation):
+        self.done = threading.Event()
+        self.result = None
+        self.generation = generation
+        self.submitted = time.monotonic()
+        self.lastProgress = self.submitted  # time of the last progress report of a batch read
+
+    def deadline(self, timeout, totalTimeout) -> float:
+        """Time at which the call is considered hanging"""
+        deadline = self.lastProgress + timeout
+        return deadline if totalTimeout is None else min(deadline, self.submitted + totalTimeout)
+
+
+class NativeHost:
+
+    """Supervised worker process which runs the native libraries"""
+
+    def __init__(self, iniFile="." + os.sep + "yasdi.ini", libraryFactory=None, callTimeout=10.0, resetTimeout=5.0,
+                 detectionTimeout=600.0, threadCount=4, onRecovery=None):
+        """
+        - libraryFactory: picklable callable which creates the library in the worker process (e.g. SimulatedYasdi).
+          None loads the native libraries.
+        - callTimeout: default deadline of a call in seconds. A batch read (GetChannelValues) gets the deadline for
+          every single read: it is extended by every progress report, up to 'count' times callTimeout in total.
+        - detectionTimeout: deadline of a device detection (takes minutes on slow buses)
+        - resetTimeout: time a yasdiReset gets to release a hanging call before the worker is restarted
+        - threadCount: count of calls running in parallel in the worker (e.g. one per bus)
+        - onRecovery: called with True after a restart of the worker and with False after a yasdiReset
+        """
+        self.iniFile = iniFile
+        self.libraryFactory = libraryFactory
+        self.callTimeout = callTimeout
+        self.resetTimeout = resetTimeout
+        self.detectionTimeout = detectionTimeout
+        self.threadCount = threadCount
+        self.onRecovery = onRecovery
+        self.context = multiprocessing.get_context("spawn")
+        self.lock = threading.Lock()
+        self.recoveryLock = threading.Lock()
+        self.pendingCalls = {}  # request id -> PendingCall
+        self.requestIds = itertools.count(1)
+        self.generation = 0
+        self.resets = 0
+        self.restarts = 0
+        self.closed = False
+        self.startWorker()
+
+    def startWorker(self):
+        connection, workerConnection = self.context.Pipe()
+        self.process = self.context.Process(target=runHost, name="yasdi-host", daemon=True,
+                                            args=(workerConnection, self.iniFile, self.libraryFactory, self.threadCount))
+        self.process.start()
+        workerConnection.close()
+        try:
+            if not connection.poll(START_TIMEOUT):
+                raise EOFError()
+            connection.recv()
+        except (EOFError, OSError):
+            self.process.kill()
+            connection.close()
+            raise YasdiHostError("The native host process could not be started")
+        self.connection = connection
+        threading.Thread(target=self.receive, args=(connection, self.generation), name="yasdi-host-receiver",
+                         daemon=True).start()
+
+    def receive(self, connection, generation):
+        """Delivers the results of the worker to the waiting callers"""
+        while True:
+            try:
+                requestId, result = connection.recv()
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                if result is PROGRESS:
+                    pendingCall = self.pendingCalls.get(requestId)
+                    if pendingCall is not None:
+                        pendingCall.lastProgress = time.monotonic()
+                    continue
+                pendingCall = self.pendingCalls.pop(requestId, None)
+            if pendingCall is not None:
+                pendingCall.result = result
+                pendingCall.done.set()
+        # The worker is gone: all calls still waiting for it fail
+        with self.lock:
+            lostCalls = [(requestId, pendingCall) for requestId, pendingCall in self.pendingCalls.items()
+                         if pendingCall.generation == generation]
+            for requestId, pendingCall in lostCalls:
+                del self.pendingCalls[requestId]
+        for requestId, pendingCall in lostCalls:
+            pendingCall.result = (False, None)
+            pendingCall.done.set()
+
+    def submit(self, target, method, args=(), kwargs=None) -> PendingCall:
+        with self.lock:
+            if self.closed:
+                raise YasdiHostError("The native host is closed")
+            requestId = next(self.requestIds)
+            pendingCall = self.pendingCalls[requestId] = PendingCall(self.generation)
+            try:
+                self.connection.send((requestId, target, method, args, kwargs or {}))
+            except (OSError, ValueError):
+                del self.pendingCalls[requestId]
+                pendingCall.result = (False, None)
+                pendingCall.done.set()
+        return pendingCall
+
+    def call(self, target, method, args=(), kwargs=None, timeout=None, totalTimeout=None):
+        """Calls a method in the worker process and returns its result. Raises YasdiTimeoutError if the call did
+        not return (or report progress) within 'timeout' seconds (default: callTimeout) or did not return within
+        'totalTimeout' seconds (None = no limit), YasdiHostError if the worker failed.
+        """
+        if timeout is None:
+            timeout = self.callTimeout
+        pendingCall = self.submit(target, method, args, kwargs)
+        while not pendingCall.done.wait(max(0.0, pendingCall.deadline(timeout, totalTimeout) - time.monotonic())):
+            # A progress report during the wait moves the deadline
+            if time.monotonic() >= pendingCall.deadline(timeout, totalTimeout):
+                self.recover(pendingCall)
+                raise YasdiTimeoutError(f"{method} did not return within {timeout} s")
+        success, result = pendingCall.result
+        if success:
+            return result
+        if result is None:
+            # Lost connection: the worker crashed or was killed
+            self.restartWorker(pendingCall.generation)
+            raise YasdiHostError(f"The native host process ended during {method}")
+        raise YasdiHostError(result)
+
+    def recover(self, hangingCall):
+        """Escalating recovery after a call missed its deadline: yasdiReset first, then a restart of the worker"""
+        with self.recoveryLock:
+            if hangingCall.generation != self.generation or hangingCall.done.is_set():
+                return
+            resetCall = self.submit(TARGET_CONTROL, "yasdiReset")
+            released = resetCall.done.wait(self.resetTimeout) and hangingCall.done.wait(self.resetTimeout)
+            if released:
+                self.resets += 1
+        if not released:
+            self.restartWorker(hangingCall.generation)
+        elif self.onRecovery is not None:
+            self.onRecovery(False)
+
+    def restartWorker(self, generation):
+        """Kills the worker of 'generation' and starts a new one (only once if several callers failed)"""
+        with self.recoveryLock:
+            if generation != self.generation or self.closed:
+                return
+            self.process.kill()
+            self.process.join(self.resetTimeout)
+            self.connection.close()
+            with self.lock:
+                self.generation += 1
+            self.startWorker()
+            self.restarts += 1
+        if self.onRecovery is not None:
+            self.onRecovery(True)
+
+    def close(self):
+        """Shuts yasdi down and ends the worker process"""
+        try:
+            self.submit(TARGET_CONTROL, "shutdown")
+        except YasdiHostError:
+            return
+        self.process.join(self.resetTimeout)
+        if self.process.is_alive():
+            self.process.kill()
+        with self.lock:
+            self.closed = True
+        self.connection.close()
+
+
+class HostedYasdi:
+
+    """Yasdi running in a NativeHost. All methods of Yasdi are available."""
+
+    target = TARGET_YASDI
+
+    def __init__(self, nativeHost):
+        self.nativeHost = nativeHost
+
+    def __getattr__(self, name):
+        nativeHost = self.nativeHost
+        target = self.target
+
+        def hostedMethod(*args, **kwargs):
+            return nativeHost.call(target, name, args, kwargs)
+
+        return hostedMethod
+
+
+class HostedYasdiMaster(HostedYasdi):
+
+    """YasdiMaster running in a NativeHost. All methods of YasdiMaster are available."""
+
+    target = TARGET_MASTER
+
+    def DoMasterCmdEx(self, cmd="detection", param1=None, param2=None, timeout=None):
+        """The device detection has its own deadline (default: detectionTimeout of the host)"""
+        return self.nativeHost.call(TARGET_MASTER, "DoMasterCmdEx", (cmd, param1, param2),
+                                    timeout=self.nativeHost.detectionTimeout if timeout is None else timeout)
+
+    def GetChannelValues(self, channelHandles, deviceHandles, values, timestamps, errorCodes, count, max_val_age=1,
+                         durations=None):
+        """See YasdiMaster.GetChannelValues(). The arrays are exchanged as raw bytes."""
+        valueBytes, timestampBytes, errorCodeBytes, durationBytes = self.nativeHost.call(
+            TARGET_CONTROL, "readValues", (bytes(memoryview(channelHandles).cast("B")[:count * sizeof(c_uint32)]),
+                                           bytes(memoryview(deviceHandles).cast("B")[:count * sizeof(c_uint32)]),
+                                           count, max_val_age, durations is not None),
+            totalTimeout=count * self.nativeHost.callTimeout)
+        memmove(addressof(values), valueBytes, len(valueBytes))
+        memmove(addressof(timestamps), timestampBytes, len(timestampBytes))
+        memmove(addressof(errorCodes), errorCodeBytes, len(errorCodeBytes))
+        if durations is not None:
+            memmove(addressof(durations), durationBytes, len(durationBytes))
@@ -0,0 +1,207 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Batch writes of parameter channels, e.g. to roll out a parameter to many devices.
+
+Every change (device handle, channel name, value) is validated against the cached value range of the channel before
+the bus is used. Several changes of the same channel of a device are coalesced (the last one wins) and values which
+are already set on the device are not written again. The writes of each bus run in the worker thread of the bus
+(see BusPoller) with a limited write rate and are retried on timeouts. The result is one WriteResult per change.
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import math
+import time
+from yasdiwrapper.yasdi import *
+from yasdiwrapper.yasdimaster import PARAMCHANNELS
+
+
+# Constants
+
+# Status of a WriteResult
+WRITE_OK = "written"
+WRITE_UNCHANGED = "unchanged"            # the device already had the value, nothing written
+WRITE_SUPERSEDED = "superseded"          # a later change of the same channel in the batch was written instead
+WRITE_UNKNOWN_CHANNEL = "unknown channel"
+WRITE_NOT_PARAMETER = "no parameter"    # not a parameter channel (e.g. a spot value), rejected before the bus was used
+WRITE_OUT_OF_RANGE = "out of range"      # rejected before the bus was used
+WRITE_FAILED = "failed"                  # yasdi error, see WriteResult.errorCode
+
+# Return codes which are worth another try
+RETRY_ERROR_CODES = (YE_TIMEOUT, YE_TOO_MANY_REQUESTS)
+
+
+# Implementation
+
+class WriteResult:
+
+    """Result of one requested change"""
+
+    __slots__ = ("deviceHandle", "channelName", "value", "status", "errorCode", "attempts", "previousValue")
+
+    def __init__(self, deviceHandle, channelName, value):
+        self.deviceHandle = deviceHandle
+        self.channelName = channelName
+        self.value = value
+        self.status = None
+        self.errorCode = YE_OK
+        self.attempts = 0
+        self.previousValue = None
+
+    def __repr__(self):
+        return (f"WriteResult({self.deviceHandle}, {self.channelName!r}, {self.value}, status={self.status!r}, "
+                f"errorCode={self.errorCode}, attempts={self.attempts})")
+
+    @property
+    def ok(self) -> bool:
+        return self.status in (WRITE_OK, WRITE_UNCHANGED, WRITE_SUPERSEDED)
+
+
+class RateLimiter:
+
+    """Allows one action every 1/rate seconds. Used by one thread only."""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 0.0 if not rate else 1.0 / rate
+        self.clock = clock
+        self.sleep = sleep
+        self.nextTime = None
+
+    def wait(self):
+        now = self.clock()
+        if self.nextTime is not None and now < self.nextTime:
+            self.sleep(self.nextTime - now)
+            now = self.nextTime
+        self.nextTime = now + self.interval
+
+
+class ParameterWriter:
+
+    """Writes batches of parameter changes. If a BusPoller is given, the writes of its buses run in parallel in the
+    bus worker threads (and never collide with the polling); otherwise all writes run in the calling thread.
+    """
+
+    def __init__(self, yasdiMaster, channelCatalog, busPoller=None, writesPerSecond=5.0, retries=2, retryDelay=1.0,
+                 clock=time.monotonic, sleep=time.sleep, busAdmissions=None):
+        """'writesPerSecond': maximal write rate per bus (including retries, 0 means no limit).
+        'retries': further attempts after a timeout, each after a doubled 'retryDelay'.
+        'busAdmissions': bus -> BusAdmission. Writes wait for free capacity of the bus (they are never shed).
+        """
+        self.yasdiMaster = yasdiMaster
+        self.channelCatalog = channelCatalog
+        self.busPoller = busPoller
+        self.writesPerSecond = writesPerSecond
+        self.retries = retries
+        self.retryDelay = retryDelay
+        self.clock = clock
+        self.sleep = sleep
+        self.rateLimiters = {}  # bus -> RateLimiter
+        self.busAdmissions = busAdmissions or {}
+        self.parameterHandles = {}  # device type -> set of the parameter channel handles
+
+    def writeChannels(self, changes, skipUnchanged=True) -> [WriteResult]:
+        """Writes the changes, an iterable of (device handle, channel name, value). Returns one WriteResult per change
+        in the same order. With 'skipUnchanged' the current value is read first (max value age 0) and the write is
+        dropped if the value is already set.
+        """
+        results = [WriteResult(deviceHandle, channelName, value) for deviceHandle, channelName, value in changes]
+
+        # Coalesce: only the last change of a channel of a device is written
+        latest = {}
+        for result in results:
+            key = (result.deviceHandle, result.channelName)
+            if key in latest:
+                latest[key].status = WRITE_SUPERSEDED
+            latest[key] = result
+
+        pending = []
+        for result in latest.values():
+            channel = self.channelCatalog.findChannel(result.deviceHandle, result.channelName)
+            if channel is None:
+                result.status = WRITE_UNKNOWN_CHANNEL
+            elif channel.handle not in self.parameterChannels(result.deviceHandle):
+                result.status = WRITE_NOT_PARAMETER
+                result.errorCode = YE_CHAN_TYPE_MISMATCH
+            elif not self.inRange(channel, result.value):
+                result.status = WRITE_OUT_OF_RANGE
+                result.errorCode = YE_VALUE_NOT_VALID
+            else:
+                pending.append((result, channel.handle))
+
+        busOfDevice = {}
+        if self.busPoller is not None:
+            busOfDevice = {deviceHandle: bus for bus, devices in self.busPoller.busDevices.items()
+                           for deviceHandle in devices}
+        writesOfBus = {}
+        for result, channelHandle in pending:
+            writesOfBus.setdefault(busOfDevice.get(result.deviceHandle), []).append((result, channelHandle))
+
+        # Devices unknown to the bus poller are written in the calling thread
+        unassigned = writesOfBus.pop(None, [])
+        if writesOfBus:
+            self.busPoller.runOnBuses(lambda bus, devices: self.writeOnBus(bus, writesOfBus.get(bus, []), skipUnchanged))
+        self.writeOnBus(None, unassigned, skipUnchanged)
+
+        # Superseded changes share the status of the change which was written instead
+        for result in results:
+            if result.status == WRITE_SUPERSEDED:
+                written = latest[(result.deviceHandle, result.channelName)]
+                if not written.ok:
+                    result.status, result.errorCode = written.status, written.errorCode
+        return results
+
+    def parameterChannels(self, deviceHandle) -> set:
+        """Handles of the parameter channels of a device (same for all devices of a type, no bus request)"""
+        deviceType = self.channelCatalog.getDeviceType(deviceHandle)
+        handles = self.parameterHandles.get(deviceType)
+        if handles is None:
+            handles = self.parameterHandles[deviceType] = set(self.yasdiMaster.GetChannelHandlesEx(deviceHandle, PARAMCHANNELS))
+        return handles
+
+    @staticmethod
+    def inRange(channel, value) -> bool:
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return False
+        if channel.rangeMin is not None and value < channel.rangeMin:
+            return False
+        if channel.rangeMax is not None and value > channel.rangeMax:
+            return False
+        return True
+
+    def writeOnBus(self, bus, writes, skipUnchanged):
+        """Writes all changes of one bus. Runs in the worker thread of the bus."""
+        if not writes:
+            return
+        rateLimiter = self.rateLimiters.get(bus)
+        if rateLimiter is None:
+            rateLimiter = self.rateLimiters[bus] = RateLimiter(self.writesPerSecond, self.clock, self.sleep)
+        admission = self.busAdmissions.get(bus)
+        for result, channelHandle in writes:
+            if skipUnchanged:
+                # The read of the current value uses the bus like a write
+                rateLimiter.wait()
+                if admission is not None:
+                    admission.acquire(sleep=self.sleep)
+                result.previousValue = self.yasdiMaster.GetChannelValue(channelHandle, result.deviceHandle, 0)
+                if result.previousValue == result.value:
+                    result.status = WRITE_UNCHANGED
+                    continue
+            delay = self.retryDelay
+            while True:
+                rateLimiter.wait()
+                if admission is not None:
+                    admission.acquire(sleep=self.sleep)
+                result.attempts += 1
+                result.errorCode = self.yasdiMaster.SetChannelValueCode(channelHandle, result.deviceHandle, result.value)
+                if result.errorCode not in RETRY_ERROR_CODES or result.attempts > self.retries:
+                    break
+                self.sleep(delay)
+                delay *= 2
+            result.status = WRITE_OK if YE_OK == result.errorCode else WRITE_FAILED
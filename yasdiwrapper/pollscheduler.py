@@ -0,0 +1,258 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Adaptive poll scheduling. Every channel has its own poll interval and priority.
+
+Fast changing channels (e.g. "Pac") can be polled every few seconds while slow channels (e.g. "E-Total") are polled
+only once a minute. Devices and channels which don't answer (YE_TIMEOUT) are polled less often until they answer
+again. This saves bandwidth on slow (1200 baud) lines.
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import math
+import time
+from ctypes import c_double, c_int, c_uint32
+from yasdiwrapper.yasdi import YE_OK, YE_TIMEOUT
+from yasdiwrapper.busmodel import ADMIT, SHED
+
+
+# Constants
+
+# Largest exponent of the exponential backoff. Larger ones would overflow float intervals (the delay is capped by
+# maxBackoff long before).
+MAX_BACKOFF_EXPONENT = 30
+
+
+# Implementation
+
+class ChannelSchedule:
+
+    """Poll configuration of a channel name.
+    - interval: poll interval in seconds
+    - priority: 0 is the highest priority. If not all due channels can be read in one cycle, channels with higher
+      priority are read first.
+    - onChange: report the value only if it differs from the last reported value (e.g. for "Status")
+    """
+
+    def __init__(self, channelName, interval, priority=0, onChange=False):
+        self.channelName = channelName
+        self.interval = interval
+        self.priority = priority
+        self.onChange = onChange
+
+    def maxValueAge(self) -> int:
+        """Maximal age of a value (seconds) yasdi may deliver from its own cache. Half of the interval, so a cached
+        value is never older than the poll interval.
+        """
+        return max(1, int(self.interval / 2))
+
+
+class PollTask:
+
+    """Poll state of one channel of one device"""
+
+    __slots__ = ("deviceHandle", "channel", "schedule", "nextDue", "failures", "lastValue")
+
+    def __init__(self, deviceHandle, channel, schedule, nextDue):
+        self.deviceHandle = deviceHandle
+        self.channel = channel
+        self.schedule = schedule
+        self.nextDue = nextDue
+        self.failures = 0
+        self.lastValue = None
+
+
+class PollScheduler:
+
+    """Polls the channels of a set of devices according to their ChannelSchedule.
+
+    Call pollDue() in a loop and sleep timeUntilNextDue() seconds between the calls.
+    """
+
+    def __init__(self, yasdiMaster, channelCatalog, schedules, maxReadsPerCycle=None, maxBackoff=300.0,
+                 deviceTimeoutLimit=3, clock=time.monotonic, admission=None):
+        """
+        - schedules: list of ChannelSchedule
+        - maxReadsPerCycle: upper limit of channel reads per pollDue() call (None = no limit)
+        - maxBackoff: maximal delay in seconds of a channel or device which doesn't answer
+        - deviceTimeoutLimit: count of timeouts in a row after which the whole device is backed off
+        - admission: BusAdmission of the bus. Due reads which don't fit on the bus are delayed or skipped by
+          priority. None = all due channels are read.
+        """
+        self.yasdiMaster = yasdiMaster
+        self.channelCatalog = channelCatalog
+        self.schedules = list(schedules)
+        self.maxReadsPerCycle = maxReadsPerCycle
+        self.maxBackoff = maxBackoff
+        self.deviceTimeoutLimit = deviceTimeoutLimit
+        self.clock = clock
+        self.admission = admission
+        self.tasks = []
+        self.deviceTimeouts = {}      # device handle -> count of timeouts in a row
+        self.deviceBackoffUntil = {}  # device handle -> time until the device is skipped
+        self.allocateBuffers(0)
+
+    def allocateBuffers(self, count):
+        """Buffers for the largest possible batch, reused for every read"""
+        self.channelHandles = (c_uint32 * count)()
+        self.deviceHandles = (c_uint32 * count)()
+        self.values = (c_double * count)()
+        self.timestamps = (c_uint32 * count)()
+        self.errorCodes = (c_int * count)()
+        self.durations = (c_double * count)()
+
+    def addDevices(self, deviceHandles) -> list:
+        """Creates poll tasks for all scheduled channels of the devices. Returns the list of (device handle, channel
+        name) which are not available. If resolving a channel fails, no device is added.
+        """
+        now = self.clock()
+        missing = []
+        tasks = []
+        for deviceHandle in deviceHandles:
+            for schedule in self.schedules:
+                channel = self.channelCatalog.findChannel(deviceHandle, schedule.channelName)
+                if channel is None:
+                    missing.append((deviceHandle, schedule.channelName))
+                else:
+                    tasks.append(PollTask(deviceHandle, channel, schedule, now))
+        self.tasks.extend(tasks)
+        self.allocateBuffers(len(self.tasks))
+        return missing
+
+    def remapDevices(self, mapping):
+        """Replaces device handles (e.g. after a new device detection): 'mapping' is a dictionary old handle -> new
+        handle. The poll state of the tasks is kept.
+        """
+        for task in self.tasks:
+            task.deviceHandle = mapping.get(task.deviceHandle, task.deviceHandle)
+        # All handles at once: swapped or chained handles (1 -> 2, 2 -> 1) must not overwrite each other
+        self.deviceTimeouts = {mapping.get(handle, handle): count for handle, count in self.deviceTimeouts.items()}
+        self.deviceBackoffUntil = {mapping.get(handle, handle): until for handle, until in self.deviceBackoffUntil.items()}
+
+    def removeDevices(self, deviceHandles):
+        """Removes the tasks and poll state of devices (e.g. devices which are not available anymore)"""
+        deviceHandles = set(deviceHandles)
+        self.tasks = [task for task in self.tasks if task.deviceHandle not in deviceHandles]
+        for deviceHandle in deviceHandles:
+            self.deviceTimeouts.pop(deviceHandle, None)
+            self.deviceBackoffUntil.pop(deviceHandle, None)
+
+    def dueTasks(self, now) -> list:
+        """All tasks which have to be read now, ordered by priority and due time"""
+        due = [task for task in self.tasks
+               if task.nextDue <= now and self.deviceBackoffUntil.get(task.deviceHandle, 0) <= now]
+        due.sort(key=lambda task: (task.schedule.priority, task.nextDue))
+        if self.maxReadsPerCycle is not None:
+            del due[self.maxReadsPerCycle:]
+        return due
+
+    def timeUntilNextDue(self, now=None) -> float:
+        """Seconds until the next task is due (0 if a task is already due)"""
+        if now is None:
+            now = self.clock()
+        if not self.tasks:
+            return math.inf
+        nextDue = min(max(task.nextDue, self.deviceBackoffUntil.get(task.deviceHandle, 0)) for task in self.tasks)
+        if self.admission is not None and nextDue <= now:
+            # Delayed reads: wait until the bus has capacity again
+            return self.admission.waitTime()
+        return max(0.0, nextDue - now)
+
+    def pollDue(self, now=None) -> list:
+        """Reads all due channels. Returns a list of tuples (device handle, channel info, value, timestamp, error code)
+        of all read channels. Values of 'onChange' channels which did not change are not returned.
+        """
+        if now is None:
+            now = self.clock()
+        due = self.dueTasks(now)
+        if self.admission is not None:
+            due = self.admit(due, now)
+        results = []
+        # A device with several timed out channels counts as one timeout of the cycle
+        timedOutDevices = set()
+        # All channels of a schedule are read with the same maximal value age in one batch
+        for schedule in self.schedules:
+            batch = [task for task in due if task.schedule is schedule]
+            if batch:
+                self.readBatch(batch, schedule.maxValueAge(), now, results, timedOutDevices)
+        return results
+
+    def admit(self, due, now) -> list:
+        """Due tasks admitted by the bus admission. Delayed tasks stay due, shed tasks skip this interval."""
+        admitted = []
+        for task in due:
+            decision = self.admission.request(task.schedule.priority)
+            if decision == ADMIT:
+                admitted.append(task)
+            elif decision == SHED:
+                self.advance(task, now)
+        return admitted
+
+    def readBatch(self, batch, maxValueAge, now, results, timedOutDevices):
+        for position, task in enumerate(batch):
+            self.channelHandles[position] = task.channel.handle
+            self.deviceHandles[position] = task.deviceHandle
+        self.yasdiMaster.GetChannelValues(self.channelHandles, self.deviceHandles, self.values, self.timestamps,
+                                          self.errorCodes, len(batch), maxValueAge, self.durations)
+        if self.admission is not None:
+            # Only successful reads tell the time of a request (a timeout waits for the yasdi timeout instead)
+            self.admission.observeReads([self.durations[position] for position in range(len(batch))
+                                         if YE_OK == self.errorCodes[position]])
+        for position, task in enumerate(batch):
+            errorCode = self.errorCodes[position]
+            self.reschedule(task, errorCode, now, timedOutDevices)
+            if YE_OK == errorCode:
+                value = self.values[position]
+                if task.schedule.onChange and value == task.lastValue:
+                    continue
+                task.lastValue = value
+            results.append((task.deviceHandle, task.channel, self.values[position], self.timestamps[position],
+                            errorCode))
+
+    def reschedule(self, task, errorCode, now, timedOutDevices=None):
+        """Calculates the next due time of a task. The due times stay on the interval grid (no drift). A task which
+        is late skips the missed intervals instead of catching up.
+        'timedOutDevices': devices with a timeout in the current cycle. The timeouts of a device are counted once
+        per cycle.
+        """
+        interval = task.schedule.interval
+        if YE_TIMEOUT == errorCode:
+            task.failures += 1
+            task.nextDue = now + self.backoff(interval, task.failures)
+            if timedOutDevices is not None:
+                if task.deviceHandle in timedOutDevices:
+                    return
+                timedOutDevices.add(task.deviceHandle)
+            deviceTimeouts = self.deviceTimeouts.get(task.deviceHandle, 0) + 1
+            self.deviceTimeouts[task.deviceHandle] = deviceTimeouts
+            if deviceTimeouts >= self.deviceTimeoutLimit:
+                self.deviceBackoffUntil[task.deviceHandle] = now + self.backoff(
+                    interval, deviceTimeouts - self.deviceTimeoutLimit + 1)
+            return
+        if task.failures > 0:
+            # Back again after a backoff: restart the interval grid now
+            task.failures = 0
+            task.nextDue = now
+        self.deviceTimeouts[task.deviceHandle] = 0
+        self.deviceBackoffUntil.pop(task.deviceHandle, None)
+        self.advance(task, now)
+
+    def backoff(self, interval, exponent) -> float:
+        """Delay after 'exponent' failures in a row: interval * 2^exponent, at most maxBackoff"""
+        return min(interval * 2 ** min(exponent, MAX_BACKOFF_EXPONENT), self.maxBackoff)
+
+    def advance(self, task, now):
+        """Next due time of a task on its interval grid after 'now'"""
+        interval = task.schedule.interval
+        task.nextDue += interval
+        if task.nextDue <= now:
+            task.nextDue += math.ceil((now - task.nextDue) / interval) * interval
+            if task.nextDue <= now:
+                task.nextDue += interval
@@ -0,0 +1,462 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Simulated YASDI library for tests and benchmarks without hardware.
+
+SimulatedYasdi offers the same function surface as libyasdi and libyasdimaster (see bindings.py). The functions are
+real ctypes function pointers with the same prototypes, so the wrapper converts its arguments exactly like for the
+native libraries. Pass an instance to Yasdi(library=...) and YasdiMaster(library=...):
+
+    simulator = SimulatedYasdi(driverCount=3, devicesPerDriver=10, baudrate=1200)
+    yasdiMaster = YasdiMaster(library=simulator)
+    yasdi = Yasdi(library=simulator)
+
+The serial bus is modelled by the baud rate: every request blocks the bus for the time its telegrams need.
+Requests on the same bus are serialized, requests on different buses run in parallel. Use timeScale=0 to skip
+all waiting (deterministic, fast tests).
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import math
+import random
+import threading
+import time
+from ctypes import CFUNCTYPE, c_double, memmove
+from yasdiwrapper.yasdi import (YE_OK, YE_UNKNOWN_HANDLE, YE_NOT_ALL_DEVS_FOUND, YE_TIMEOUT, YE_NO_RANGE,
+                                YE_VALUE_NOT_VALID, YE_CHAN_TYPE_MISMATCH, YE_INVAL_ARGUMENT, INVALID_HANDLE)
+from yasdiwrapper.yasdimaster import SPOTCHANNELS, PARAMCHANNELS, TESTCHANNELS, ALLCHANNELS, CMD_DEVICE_DETECTION
+from yasdiwrapper.bindings import YASDI_PROTOTYPES, YASDI_MASTER_PROTOTYPES
+from yasdiwrapper.busmodel import TELEGRAM_BYTES, BITS_PER_BYTE, DEVICE_TURNAROUND
+
+
+# Implementation
+
+class SimulatedChannel:
+
+    """Channel definition of a simulated device type.
+    - group: SPOTCHANNELS, PARAMCHANNELS or TESTCHANNELS
+    - valueFunction: optional function(serialNumber, now) -> float for the current value
+    """
+
+    def __init__(self, name, unit="", group=SPOTCHANNELS, value=0.0, rangeMin=None, rangeMax=None, statTexts=(),
+                 valueFunction=None, channelType=0, channelIndex=0):
+        self.name = name
+        self.unit = unit
+        self.group = group
+        self.value = value
+        self.rangeMin = rangeMin
+        self.rangeMax = rangeMax
+        self.statTexts = tuple(statTexts)
+        self.valueFunction = valueFunction
+        self.channelType = channelType
+        self.channelIndex = channelIndex
+
+
+def pacValue(serialNumber, now):
+    """Simulated AC power (W) of a string inverter: a day curve with a small offset per device"""
+    return round(max(0.0, 2500.0 * math.sin(math.pi * ((now % 86400) / 86400.0))) + serialNumber % 17, 1)
+
+
+def eTotalValue(serialNumber, now):
+    """Simulated total energy (kWh): grows with the time"""
+    return round(10000.0 + (serialNumber % 1000) + now / 3600.0, 3)
+
+
+def defaultChannels(extraChannels=0):
+    """Channel set of the default simulated device type (similar to a SMA string inverter).
+    'extraChannels' adds further spot channels "Chan-<n>" (e.g. for benchmarks with many channels).
+    """
+    channels = [
+        SimulatedChannel("Pac", "W", valueFunction=pacValue, channelType=0x0109, channelIndex=0),
+        SimulatedChannel("E-Total", "kWh", valueFunction=eTotalValue, channelType=0x0209, channelIndex=1),
+        SimulatedChannel("h-Total", "h", value=35000.0, channelType=0x0209, channelIndex=2),
+        SimulatedChannel("Upv-Ist", "V", value=310.0, channelType=0x0109, channelIndex=3),
+        SimulatedChannel("Iac-Ist", "mA", value=9000.0, channelType=0x0109, channelIndex=4),
+        SimulatedChannel("Uac", "V", value=230.0, channelType=0x0109, channelIndex=5),
+        SimulatedChannel("Fac", "Hz", value=50.0, channelType=0x0109, channelIndex=6),
+        SimulatedChannel("Netz-Ein", "", value=1200.0, channelType=0x0209, channelIndex=7),
+        SimulatedChannel("Status", "", value=2.0, statTexts=("Stop", "Warten", "Mpp", "Netzueb.", "Fehler"),
+                         channelType=0x0809, channelIndex=8),
+        SimulatedChannel("Fehler", "", value=0.0, statTexts=("-------", "Uac", "Fac", "Riso", "Offset"),
+                         channelType=0x0809, channelIndex=9),
+        SimulatedChannel("Plimit", "W", group=PARAMCHANNELS, value=2500.0, rangeMin=0.0, rangeMax=3000.0,
+                         channelType=0x0142, channelIndex=20),
+        SimulatedChannel("T-Start", "s", group=PARAMCHANNELS, value=10.0, rangeMin=5.0, rangeMax=300.0,
+                         channelType=0x0142, channelIndex=21),
+        SimulatedChannel("Uac-Min", "V", group=PARAMCHANNELS, value=180.0, rangeMin=160.0, rangeMax=230.0,
+                         channelType=0x0142, channelIndex=22),
+        SimulatedChannel("Uac-Max", "V", group=PARAMCHANNELS, value=260.0, rangeMin=230.0, rangeMax=280.0,
+                         channelType=0x0142, channelIndex=23),
+        SimulatedChannel("Ipv-Start", "mA", group=TESTCHANNELS, value=10.0, channelType=0x0309, channelIndex=30),
+    ]
+    for number in range(extraChannels):
+        channels.append(SimulatedChannel(f"Chan-{number}", "", value=float(number), channelType=0x0109,
+                                         channelIndex=40 + number))
+    return channels
+
+
+class SimulatedDevice:
+
+    """One simulated device (inverter) connected to a driver (bus)"""
+
+    def __init__(self, handle, serialNumber, deviceType, driver):
+        self.handle = handle
+        self.serialNumber = serialNumber
+        self.deviceType = deviceType
+        self.driver = driver
+        self.name = f"{deviceType} {serialNumber}"
+        self.detected = False
+        self.values = {}      # channel handle -> (value, timestamp (wall clock), read time (monotonic))
+        self.parameters = {}  # channel handle -> written parameter value
+
+
+class SimulatedYasdi:
+
+    """In-process replacement for libyasdi and libyasdimaster. See module documentation."""
+
+    def __init__(self, driverCount=1, devicesPerDriver=1, deviceTypes=None, baudrate=19200, timeScale=1.0,
+                 timeoutProbability=0.0, timeoutSeconds=0.5, seed=0, clock=time.time):
+        """
+        - driverCount: count of drivers (serial ports)
+        - devicesPerDriver: count of devices on each driver
+        - deviceTypes: dictionary device type name -> list of SimulatedChannel. The devices cycle through the types.
+          Default is one type "WR21TL06" with defaultChannels().
+        - baudrate: baud rate of all buses or list with the baud rate of each bus
+        - timeScale: factor for all simulated waiting times (0 = no waiting at all)
+        - timeoutProbability: probability of a random YE_TIMEOUT on each value request
+        - timeoutSeconds: time a request needs until it fails with YE_TIMEOUT
+        - seed: seed of the random generator (for reproducible runs)
+        - clock: wall clock used for the value timestamps
+        """
+        if deviceTypes is None:
+            deviceTypes = {"WR21TL06": defaultChannels()}
+        self.timeScale = timeScale
+        self.timeoutProbability = timeoutProbability
+        self.timeoutSeconds = timeoutSeconds
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.baudrates = list(baudrate) if isinstance(baudrate, (list, tuple)) else [baudrate] * driverCount
+        self.driverNames = [f"COM{number + 1}" for number in range(driverCount)]
+        self.driverOnline = [False] * driverCount
+        self.busLocks = [threading.Lock() for _ in range(driverCount)]
+        self.lock = threading.Lock()
+        self.errorInjections = []
+        self.hangs = []
+        self.resetEvent = threading.Event()
+        self.callCount = 0
+
+        # Channels: handles are unique over all device types, all devices of a type share the same channel handles
+        self.channels = {}      # channel handle -> SimulatedChannel
+        self.typeChannels = {}  # device type -> list of channel handles
+        for typeNumber, (typeName, channelList) in enumerate(deviceTypes.items()):
+            handles = []
+            for channelNumber, channel in enumerate(channelList):
+                handle = (typeNumber + 1) * 1000 + channelNumber + 1
+                self.channels[handle] = channel
+                handles.append(handle)
+            self.typeChannels[typeName] = handles
+
+        typeNames = list(deviceTypes)
+        self.devices = {}
+        for driver in range(driverCount):
+            for number in range(devicesPerDriver):
+                handle = len(self.devices) + 1
+                self.devices[handle] = SimulatedDevice(handle, 2000000000 + handle,
+                                                       typeNames[(handle - 1) % len(typeNames)], driver + 1)
+
+        self.functions = []
+        for prototypes in (YASDI_PROTOTYPES, YASDI_MASTER_PROTOTYPES):
+            for name, (restype, argtypes) in prototypes.items():
+                function = CFUNCTYPE(restype, *argtypes)(getattr(self, "sim_" + name))
+                self.functions.append(function)
+                setattr(self, name, function)
+
+    # --------------------------------------------- Simulation control -------------------------------------------
+
+    def injectError(self, errorCode=YE_TIMEOUT, deviceHandle=None, channelName=None, count=None):
+        """Lets value requests fail with 'errorCode'. Restrict it to a device and/or a channel name if given.
+        'count' is the number of failing requests (None = until clearErrors() is called).
+        """
+        with self.lock:
+            self.errorInjections.append([errorCode, deviceHandle, channelName, count])
+
+    def clearErrors(self):
+        with self.lock:
+            self.errorInjections.clear()
+            self.hangs.clear()
+
+    def injectHang(self, seconds, releasedByReset=True, count=1, after=0):
+        """Lets the next 'count' value requests hang for 'seconds' (like a hanging serial read), after 'after'
+        requests were answered. yasdiReset() releases the hanging requests unless 'releasedByReset' is False.
+        """
+        with self.lock:
+            self.hangs.append([seconds, releasedByReset, count, after])
+
+    def hang(self):
+        with self.lock:
+            if not self.hangs:
+                return
+            injection = self.hangs[0]
+            if injection[3] > 0:
+                injection[3] -= 1
+                return
+            injection[2] -= 1
+            if injection[2] <= 0:
+                self.hangs.pop(0)
+            seconds, releasedByReset, _, _ = injection
+            resetEvent = self.resetEvent
+        if releasedByReset:
+            resetEvent.wait(seconds)
+        else:
+            time.sleep(seconds)
+
+    def injectedError(self, deviceHandle, channel):
+        with self.lock:
+            for injection in self.errorInjections:
+                errorCode, injectedDevice, injectedChannel, count = injection
+                if injectedDevice not in (None, deviceHandle) or injectedChannel not in (None, channel.name):
+                    continue
+                if count is not None:
+                    injection[3] = count - 1
+                    if injection[3] <= 0:
+                        self.errorInjections.remove(injection)
+                return errorCode
+        return YE_OK
+
+    def telegramTime(self, driver) -> float:
+        """Time (seconds) the bus of a driver is busy with one request and its answer"""
+        return DEVICE_TURNAROUND + 2 * TELEGRAM_BYTES * BITS_PER_BYTE / self.baudrates[driver - 1]
+
+    def useBus(self, driver, seconds):
+        """Occupies the bus of a driver. Requests on the same bus are serialized."""
+        with self.busLocks[driver - 1]:
+            if self.timeScale > 0:
+                time.sleep(seconds * self.timeScale)
+
+    def visibleDevice(self, deviceHandle) -> SimulatedDevice:
+        device = self.devices.get(deviceHandle)
+        if device is None or not device.detected:
+            return None
+        return device
+
+    def currentValue(self, device, channelHandle, channel) -> float:
+        if channelHandle in device.parameters:
+            return device.parameters[channelHandle]
+        if channel.valueFunction is not None:
+            return channel.valueFunction(device.serialNumber, self.clock())
+        return channel.value
+
+    @staticmethod
+    def writeString(text, buffer, size) -> int:
+        data = text.encode("ascii")[:max(0, size - 1)] + b"\0"
+        memmove(buffer, data, len(data))
+        return YE_OK
+
+    # --------------------------------------------- libyasdi -----------------------------------------------------
+
+    def sim_yasdiInitialize(self, iniFile, driverCount):
+        if driverCount:
+            driverCount[0] = len(self.driverNames)
+        return YE_OK
+
+    def sim_yasdiShutdown(self):
+        pass
+
+    def sim_yasdiGetDriver(self, handles, maxHandles):
+        count = min(maxHandles, len(self.driverNames))
+        for number in range(count):
+            handles[number] = number + 1
+        return count
+
+    def sim_yasdiGetDriverName(self, driver, buffer, size):
+        if not 1 <= driver <= len(self.driverNames):
+            return 0
+        self.writeString(self.driverNames[driver - 1], buffer, size)
+        return 1
+
+    def sim_yasdiSetDriverOnline(self, driver):
+        if not 1 <= driver <= len(self.driverNames):
+            return 0
+        self.driverOnline[driver - 1] = True
+        return 1
+
+    def sim_yasdiSetDriverOffline(self, driver):
+        if 1 <= driver <= len(self.driverNames):
+            self.driverOnline[driver - 1] = False
+
+    # --------------------------------------------- libyasdimaster -----------------------------------------------
+
+    def sim_yasdiMasterInitialize(self, iniFile, driverCount):
+        return self.sim_yasdiInitialize(iniFile, driverCount)
+
+    def sim_yasdiMasterShutdown(self):
+        pass
+
+    def sim_yasdiReset(self):
+        with self.lock:
+            self.resetEvent.set()
+            self.resetEvent = threading.Event()
+        for device in self.devices.values():
+            device.detected = False
+            device.values.clear()
+
+    def sim_yasdiDoMasterCmdEx(self, cmd, param1, param2, param3):
+        if cmd != CMD_DEVICE_DETECTION.encode("ascii"):
+            return YE_INVAL_ARGUMENT
+        # A detection sends a broadcast on every online bus and waits for the answers of all devices
+        for driver, online in enumerate(self.driverOnline, start=1):
+            if online:
+                devices = [device for device in self.devices.values() if device.driver == driver]
+                self.useBus(driver, self.telegramTime(driver) * (1 + len(devices)))
+                for device in devices:
+                    device.detected = True
+        found = sum(1 for device in self.devices.values() if device.detected)
+        return YE_OK if found >= param1 else YE_NOT_ALL_DEVS_FOUND
+
+    def sim_GetDeviceHandles(self, handles, maxCount):
+        visible = [device.handle for device in self.devices.values() if device.detected][:maxCount]
+        for position, handle in enumerate(visible):
+            handles[position] = handle
+        return len(visible)
+
+    def sim_GetDeviceName(self, deviceHandle, buffer, size):
+        device = self.visibleDevice(deviceHandle)
+        if device is None:
+            return YE_UNKNOWN_HANDLE
+        return self.writeString(device.name, buffer, size)
+
+    def sim_GetDeviceSN(self, deviceHandle, serialNumber):
+        device = self.visibleDevice(deviceHandle)
+        if device is None:
+            return YE_UNKNOWN_HANDLE
+        serialNumber[0] = device.serialNumber
+        return YE_OK
+
+    def sim_GetDeviceType(self, deviceHandle, buffer, size):
+        device = self.visibleDevice(deviceHandle)
+        if device is None:
+            return YE_UNKNOWN_HANDLE
+        return self.writeString(device.deviceType, buffer, size)
+
+    def sim_GetChannelHandlesEx(self, deviceHandle, handles, maxCount, channelType):
+        device = self.visibleDevice(deviceHandle)
+        if device is None:
+            return 0
+        matching = [handle for handle in self.typeChannels[device.deviceType]
+                    if channelType == ALLCHANNELS or self.channels[handle].group == channelType][:maxCount]
+        for position, handle in enumerate(matching):
+            handles[position] = handle
+        return len(matching)
+
+    def sim_FindChannelName(self, deviceHandle, channelName):
+        device = self.visibleDevice(deviceHandle)
+        if device is None:
+            return INVALID_HANDLE
+        name = channelName.decode("ascii")
+        for handle in self.typeChannels[device.deviceType]:
+            if self.channels[handle].name == name:
+                return handle
+        return INVALID_HANDLE
+
+    def sim_GetChannelName(self, channelHandle, buffer, size):
+        channel = self.channels.get(channelHandle)
+        if channel is None:
+            return YE_UNKNOWN_HANDLE
+        return self.writeString(channel.name, buffer, size)
+
+    def sim_GetChannelValue(self, channelHandle, deviceHandle, value, valueText, valueTextSize, maxValueAge):
+        self.callCount += 1
+        self.hang()
+        device = self.visibleDevice(deviceHandle)
+        channel = self.channels.get(channelHandle)
+        if device is None or channel is None or channelHandle not in self.typeChannels[device.deviceType]:
+            return YE_UNKNOWN_HANDLE
+        cached = device.values.get(channelHandle)
+        if cached is not None and time.monotonic() - cached[2] <= maxValueAge * self.timeScale:
+            # The value is still young enough: yasdi answers from its own value cache without a bus request
+            channelValue = cached[0]
+        else:
+            errorCode = self.injectedError(deviceHandle, channel)
+            if errorCode == YE_OK and self.timeoutProbability > 0 and self.random.random() < self.timeoutProbability:
+                errorCode = YE_TIMEOUT
+            if errorCode == YE_TIMEOUT:
+                self.useBus(device.driver, self.timeoutSeconds)
+            if errorCode != YE_OK:
+                return errorCode
+            self.useBus(device.driver, self.telegramTime(device.driver))
+            channelValue = self.currentValue(device, channelHandle, channel)
+            device.values[channelHandle] = (channelValue, int(self.clock()), time.monotonic())
+        # The value pointer is declared as void pointer and arrives as plain address
+        c_double.from_address(value).value = channelValue
+        if valueText and valueTextSize > 0:
+            index = int(channelValue)
+            self.writeString(channel.statTexts[index] if 0 <= index < len(channel.statTexts) else "",
+                             valueText, valueTextSize)
+        return YE_OK
+
+    def sim_GetChannelValueTimeStamp(self, channelHandle, deviceHandle):
+        device = self.visibleDevice(deviceHandle)
+        if device is None or channelHandle not in device.values:
+            return 0
+        return device.values[channelHandle][1]
+
+    def sim_GetChannelUnit(self, channelHandle, buffer, size):
+        channel = self.channels.get(channelHandle)
+        if channel is None:
+            return YE_UNKNOWN_HANDLE
+        return self.writeString(channel.unit, buffer, size)
+
+    def sim_SetChannelValue(self, channelHandle, deviceHandle, value):
+        self.callCount += 1
+        device = self.visibleDevice(deviceHandle)
+        channel = self.channels.get(channelHandle)
+        if device is None or channel is None or channelHandle not in self.typeChannels[device.deviceType]:
+            return YE_UNKNOWN_HANDLE
+        if channel.group != PARAMCHANNELS:
+            return YE_CHAN_TYPE_MISMATCH
+        if channel.rangeMin is not None and not channel.rangeMin <= value <= channel.rangeMax:
+            return YE_VALUE_NOT_VALID
+        errorCode = self.injectedError(deviceHandle, channel)
+        if errorCode == YE_TIMEOUT:
+            self.useBus(device.driver, self.timeoutSeconds)
+        if errorCode != YE_OK:
+            return errorCode
+        self.useBus(device.driver, self.telegramTime(device.driver))
+        device.parameters[channelHandle] = value
+        device.values.pop(channelHandle, None)
+        return YE_OK
+
+    def sim_GetChannelStatTextCnt(self, channelHandle):
+        channel = self.channels.get(channelHandle)
+        return 0 if channel is None else len(channel.statTexts)
+
+    def sim_GetChannelStatText(self, channelHandle, textIndex, buffer, size):
+        channel = self.channels.get(channelHandle)
+        if channel is None or not 0 <= textIndex < len(channel.statTexts):
+            return YE_UNKNOWN_HANDLE
+        return self.writeString(channel.statTexts[textIndex], buffer, size)
+
+    def sim_GetChannelMask(self, channelHandle, channelType, channelIndex):
+        channel = self.channels.get(channelHandle)
+        if channel is None:
+            return YE_UNKNOWN_HANDLE
+        channelType[0] = channel.channelType
+        channelIndex[0] = channel.channelIndex
+        return YE_OK
+
+    def sim_GetChannelValRange(self, channelHandle, rangeMin, rangeMax):
+        channel = self.channels.get(channelHandle)
+        if channel is None:
+            return YE_UNKNOWN_HANDLE
+        if channel.rangeMin is None:
+            return YE_NO_RANGE
+        rangeMin[0] = channel.rangeMin
+        rangeMax[0] = channel.rangeMax
+        return YE_OK
@@ -0,0 +1,283 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Output sinks for polled channel values.
+
+All sinks get records (device, channel info, timestamp, value). The device is a label (e.g. the device name).
+- CsvSink: appends records to CSV files
+- BinarySink: appends records as compact fixed-width binary records
+- SnapshotSink: keeps a file with the latest value of every channel, replaced atomically
+History files are written with buffered appends, synced to disk periodically and rotated by size and/or day.
+Nothing is ever rewritten, which keeps the wear of SD-card flash low.
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import json
+import os
+import struct
+import time
+
+
+# Constants
+
+# Binary record: record key (uint16), timestamp (uint32), value (double). 14 bytes per value.
+BINARY_RECORD = struct.Struct("<HId")
+
+CSV_HEADER = "Device;ChannelName;ChannelUnit;ValueTimestamp;ChannelValue\n"
+
+
+# Implementation
+
+class RotatingFile:
+
+    """Append only file which is rotated by size and/or by day. Files are named
+    '<directory>/<prefix>-<YYYYMMDD>-<number><suffix>'.
+    A file continued after a restart may end with a partly written record (e.g. after a power loss): a binary file
+    with fixed 'recordSize' is cut to its last complete record, a text file continues in a new line.
+    """
+
+    def __init__(self, directory, prefix, suffix, maxBytes=None, daily=True, binary=False,
+                 bufferSize=64 * 1024, fsyncInterval=60.0, clock=time.time, recordSize=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.suffix = suffix
+        self.maxBytes = maxBytes
+        self.daily = daily
+        self.binary = binary
+        self.recordSize = recordSize
+        self.bufferSize = bufferSize
+        self.fsyncInterval = fsyncInterval
+        self.clock = clock
+        self.file = None
+        self.path = None
+        self.day = None
+        self.number = 0
+        self.size = 0
+        self.lastSync = 0.0
+
+    def currentDay(self):
+        return time.strftime("%Y%m%d", time.localtime(self.clock())) if self.daily else "0"
+
+    def needsRotation(self) -> bool:
+        if self.file is None:
+            return True
+        if self.daily and self.currentDay() != self.day:
+            return True
+        return self.maxBytes is not None and self.size >= self.maxBytes
+
+    def rotate(self):
+        """Closes the current file and opens the next one"""
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        day = self.currentDay()
+        if day != self.day:
+            self.day = day
+            self.number = 0
+        # Continue an existing file of this day after a restart, if it is not full yet
+        while True:
+            path = os.path.join(self.directory, f"{self.prefix}-{self.day}-{self.number}{self.suffix}")
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if self.maxBytes is None or size < self.maxBytes:
+                break
+            self.number += 1
+        self.path = path
+        if self.binary:
+            self.file = open(path, "ab", buffering=self.bufferSize)
+            if self.recordSize and size % self.recordSize:
+                # Cut off a partly written record, so the following records stay aligned
+                size -= size % self.recordSize
+                self.file.truncate(size)
+        else:
+            lineComplete = size == 0 or lastByte(path) == b"\n"
+            self.file = open(path, "a", encoding="utf-8", buffering=self.bufferSize)
+            if not lineComplete:
+                # The partly written line stays, the next record starts in a new line
+                self.file.write("\n")
+                size += 1
+        self.size = size
+        self.lastSync = self.clock()
+        self.number += 1
+
+    def write(self, data) -> bool:
+        """Appends data. Returns True if data was the first data of a new (empty) file."""
+        newFile = False
+        if self.needsRotation():
+            self.rotate()
+            newFile = self.size == 0
+        self.file.write(data)
+        # 'size' counts bytes: text is written as utf-8
+        self.size += len(data) if self.binary else len(data.encode("utf-8"))
+        return newFile
+
+    def sync(self, force=False):
+        """Flushes the write buffer and syncs the file to disk, if 'fsyncInterval' is over (or forced)"""
+        if self.file is None:
+            return
+        now = self.clock()
+        if force or now - self.lastSync >= self.fsyncInterval:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.lastSync = now
+
+    def close(self):
+        if self.file is not None:
+            self.sync(force=True)
+            self.file.close()
+            self.file = None
+
+
+def lastByte(path) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1)
+
+
+class CsvSink:
+
+    """Appends all records to rotated CSV files"""
+
+    def __init__(self, directory, prefix="data", **rotation):
+        self.rotatingFile = RotatingFile(directory, prefix, ".csv", **rotation)
+
+    def write(self, records):
+        lines = "".join(f"{device};{channel.name};{channel.unit};{timestamp};{value}\n"
+                        for device, channel, timestamp, value in records)
+        if lines:
+            if self.rotatingFile.needsRotation():
+                # Every file gets its own header line
+                self.rotatingFile.rotate()
+                if self.rotatingFile.size == 0:
+                    self.rotatingFile.write(CSV_HEADER)
+            self.rotatingFile.write(lines)
+        self.rotatingFile.sync()
+
+    def close(self):
+        self.rotatingFile.close()
+
+
+class BinarySink:
+
+    """Appends all records as fixed-width binary records (see BINARY_RECORD) to rotated files.
+    Device and channel name are stored once per file in a key table '<file>.keys' (JSON), every record only refers
+    to its key number. A file which is continued after a restart keeps its key table. Use readBinaryRecords() to
+    read a file.
+    """
+
+    def __init__(self, directory, prefix="data", **rotation):
+        self.rotatingFile = RotatingFile(directory, prefix, ".bin", binary=True, recordSize=BINARY_RECORD.size, **rotation)
+        self.keys = {}  # (device, channel name, unit) -> key number of the current file
+        self.keysPath = None  # key table which is up to date
+
+    def keyOf(self, device, channel) -> int:
+        key = (device, channel.name, channel.unit)
+        number = self.keys.get(key)
+        if number is None:
+            number = len(self.keys)
+            self.keys[key] = number
+            self.keysPath = None  # key table has to be written
+        return number
+
+    def readKeys(self):
+        """Starts with the key table of the current file, if the file is continued"""
+        path = self.rotatingFile.path + ".keys"
+        self.keys = {}
+        self.keysPath = None
+        if self.rotatingFile.size > 0 and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.keys = {tuple(key): number for number, key in enumerate(json.load(f))}
+            self.keysPath = path
+
+    def writeKeys(self):
+        """Writes the key table of the current file atomically"""
+        path = self.rotatingFile.path + ".keys"
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump([list(key) for key in sorted(self.keys, key=self.keys.get)], f)
+        os.replace(path + ".tmp", path)
+        self.keysPath = path
+
+    def write(self, records):
+        if records and self.rotatingFile.needsRotation():
+            # The key numbers belong to the file: rotate before the records are packed
+            self.rotatingFile.rotate()
+            self.readKeys()
+        data = b"".join(BINARY_RECORD.pack(self.keyOf(device, channel), timestamp, value)
+                        for device, channel, timestamp, value in records)
+        if data:
+            self.rotatingFile.write(data)
+            if self.keysPath != self.rotatingFile.path + ".keys":
+                self.writeKeys()
+        self.rotatingFile.sync()
+
+    def close(self):
+        self.rotatingFile.close()
+
+
+def readBinaryRecords(path):
+    """Reads a file written by BinarySink. Yields tuples (device, channel name, unit, timestamp, value)."""
+    with open(path + ".keys", "r", encoding="utf-8") as f:
+        keys = [tuple(key) for key in json.load(f)]
+    with open(path, "rb") as f:
+        data = f.read()
+    usableSize = len(data) - len(data) % BINARY_RECORD.size  # ignore a partly written last record (file in use)
+    for number, timestamp, value in BINARY_RECORD.iter_unpack(data[:usableSize]):
+        device, channelName, unit = keys[number]
+        yield (device, channelName, unit, timestamp, value)
+
+
+class SnapshotSink:
+
+    """Keeps a CSV file with the latest value of every (device, channel). The file is written into a temporary
+    file first and then replaced atomically, so readers never see a truncated file.
+    """
+
+    def __init__(self, path, minInterval=0.0, clock=time.time):
+        self.path = path
+        self.minInterval = minInterval
+        self.clock = clock
+        self.latestValues = {}  # (device, channel name) -> (device, channel, timestamp, value)
+        self.lastWrite = None
+        self.dirty = False
+
+    def write(self, records):
+        for record in records:
+            self.latestValues[(record[0], record[1].name)] = record
+            self.dirty = True
+        if self.dirty and (self.lastWrite is None or self.clock() - self.lastWrite >= self.minInterval):
+            self.writeSnapshot()
+
+    def writeSnapshot(self):
+        outputBuffer = CSV_HEADER + "".join(f"{device};{channel.name};{channel.unit};{timestamp};{value}\n"
+                                            for device, channel, timestamp, value in self.latestValues.values())
+        tempFile = self.path + ".tmp"
+        with open(tempFile, "w", encoding="utf-8") as f:
+            f.write(outputBuffer)
+        os.replace(tempFile, self.path)
+        self.lastWrite = self.clock()
+        self.dirty = False
+
+    def close(self):
+        if self.dirty:
+            self.writeSnapshot()
+
+
+class SinkPipeline:
+
+    """Passes all records to a list of sinks"""
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def write(self, records):
+        for sink in self.sinks:
+            sink.write(records)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
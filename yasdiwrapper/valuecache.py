@@ -0,0 +1,189 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Read-through cache of channel values for YasdiMaster.
+
+Several threads (e.g. a dashboard, an alarm checker and a logger) asking for the same channel of the same device
+share the values: a value which is young enough is served from memory, and concurrent requests of a value which has
+to be read are collapsed into one native call whose result is delivered to all waiting threads.
+"""
+
+__author__ = "Heiko Prüssing"
+__license__ = "MIT License"
+__version__ = "0.0.1"
+__maintainer__ = "Heiko Prüssing"
+
+
+# imports
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from yasdiwrapper.yasdi import *
+
+
+# Constants
+
+DEFAULT_MAX_ENTRIES = 4096
+# Entries older than this (seconds) are dropped, they are not useful for any caller anymore
+DEFAULT_MAX_ENTRY_AGE = 300.0
+
+
+# Implementation
+
+class CachedValue:
+
+    """Value of a channel with the time the value was measured (yasdi timestamp, seconds since epoch)"""
+
+    __slots__ = ("value", "timestamp")
+
+    def __init__(self, value, timestamp):
+        self.value = value
+        self.timestamp = timestamp
+
+
+class PendingRead:
+
+    """A native read in progress. Threads requesting the same value with the same or a larger maximal age wait for
+    it instead of reading again.
+    """
+
+    __slots__ = ("maxValueAge", "done", "result")
+
+    def __init__(self, maxValueAge):
+        self.maxValueAge = maxValueAge
+        self.done = threading.Event()
+        self.result = None
+
+
+class CachedYasdiMaster:
+
+    """Proxy of a YasdiMaster (or InstrumentedYasdiMaster) with a read-through cache for GetChannelValue and
+    GetChannelValueTimeStamp. The cache holds at most 'maxEntries' values (least recently used are evicted).
+    Values read by GetChannelValues (e.g. by the poll loop) are put into the cache as well.
+    All other methods are passed through.
+    """
+
+    def __init__(self, yasdiMaster, maxEntries=DEFAULT_MAX_ENTRIES, maxEntryAge=DEFAULT_MAX_ENTRY_AGE, clock=time.time):
+        self.yasdiMaster = yasdiMaster
+        self.maxEntries = maxEntries
+        self.maxEntryAge = maxEntryAge
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.values = OrderedDict()  # (device handle, channel handle) -> CachedValue
+        self.pendingReads = {}       # (device handle, channel handle) -> PendingRead
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self.yasdiMaster, name)
+
+    def entry(self, key, now) -> CachedValue:
+        """Cached value which is not older than 'maxEntryAge' or None. Older values are dropped. Caller must hold the
+        lock.
+        """
+        cached = self.values.get(key)
+        if cached is not None and now - cached.timestamp > self.maxEntryAge:
+            del self.values[key]
+            return None
+        return cached
+
+    def cachedValue(self, key, maxValueAge, now) -> CachedValue:
+        """Cached value which is not older than 'maxValueAge' or None. Caller must hold the lock."""
+        cached = self.entry(key, now)
+        if cached is None or maxValueAge <= 0 or now - cached.timestamp > maxValueAge:
+            return None
+        self.values.move_to_end(key)
+        return cached
+
+    def store(self, key, cached):
+        """Caller must hold the lock"""
+        self.values[key] = cached
+        self.values.move_to_end(key)
+        while len(self.values) > self.maxEntries:
+            self.values.popitem(last=False)
+
+    def read(self, channelHandle, deviceHandle, maxValueAge) -> CachedValue:
+        """Returns the cached value or reads it. A thread waits for the read of another thread instead of reading
+        itself if that read accepts no older value than this one.
+        """
+        key = (deviceHandle, channelHandle)
+        with self.lock:
+            cached = self.cachedValue(key, maxValueAge, self.clock())
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+            pendingRead = self.pendingReads.get(key)
+            reading = pendingRead is None or pendingRead.maxValueAge > maxValueAge
+            if reading:
+                # A younger value is requested than the pending read delivers: read again. Later requests wait for
+                # this stricter read.
+                pendingRead = self.pendingReads[key] = PendingRead(maxValueAge)
+        if not reading:
+            pendingRead.done.wait()
+            return pendingRead.result
+
+        try:
+            value = self.yasdiMaster.GetChannelValue(channelHandle, deviceHandle, maxValueAge)
+            if value == value:  # nan: the read failed, nothing to cache
+                timestamp = self.yasdiMaster.GetChannelValueTimeStamp(channelHandle, deviceHandle) or int(self.clock())
+                pendingRead.result = CachedValue(value, timestamp)
+            else:
+                pendingRead.result = CachedValue(value, 0)
+        finally:
+            with self.lock:
+                if self.pendingReads.get(key) is pendingRead:
+                    del self.pendingReads[key]
+                if pendingRead.result is not None and pendingRead.result.timestamp:
+                    self.store(key, pendingRead.result)
+            pendingRead.done.set()
+        return pendingRead.result
+
+    def GetChannelValue(self, channel_handle, device_handle, max_val_age=1) -> float:
+        """Value of a channel which is not older than 'max_val_age' seconds. nan if the read failed."""
+        result = self.read(channel_handle, device_handle, max_val_age)
+        return result.value if result is not None else math.nan
+
+    def GetChannelValueTimeStamp(self, channelHandle, deviceHandle) -> int:
+        """Timestamp of the cached value if the value is cached (and not older than 'maxEntryAge')"""
+        with self.lock:
+            cached = self.entry((deviceHandle, channelHandle), self.clock())
+        if cached is not None:
+            return cached.timestamp
+        return self.yasdiMaster.GetChannelValueTimeStamp(channelHandle, deviceHandle)
+
+    def GetChannelValues(self, channelHandles, deviceHandles, values, timestamps, errorCodes, count, max_val_age=1,
+                         durations=None):
+        """Batch read (always passed through), the valid values are put into the cache"""
+        self.yasdiMaster.GetChannelValues(channelHandles, deviceHandles, values, timestamps, errorCodes, count,
+                                          max_val_age, durations)
+        with self.lock:
+            for position in range(count):
+                if YE_OK == errorCodes[position] and timestamps[position]:
+                    self.store((deviceHandles[position], channelHandles[position]),
+                               CachedValue(values[position], timestamps[position]))
+
+    def invalidate(self, deviceHandle=None):
+        """Drops the cached values (of one device)"""
+        with self.lock:
+            if deviceHandle is None:
+                self.values.clear()
+            else:
+                for key in [key for key in self.values if key[0] == deviceHandle]:
+                    del self.values[key]
+
+    def SetChannelValue(self, channel_handle, device_handle, value: float) -> bool:
+        return YE_OK == self.SetChannelValueCode(channel_handle, device_handle, value)
+
+    def SetChannelValueCode(self, channel_handle, device_handle, value: float) -> int:
+        """Writes a value. The cached value of the channel is dropped."""
+        try:
+            return self.yasdiMaster.SetChannelValueCode(channel_handle, device_handle, value)
+        finally:
+            self.invalidateChannel(device_handle, channel_handle)
+
+    def invalidateChannel(self, deviceHandle, channelHandle):
+        with self.lock:
+            self.values.pop((deviceHandle, channelHandle), None)
@@ -13,11 +13,11 @@ __maintainer__ = "Heiko Prüssing"
 # imports
 
 from ctypes import *
-from ctypes.util import find_library
 import os
 import time
 import ctypes
 import math
+from yasdiwrapper.bindings import LibraryFunctions, nativeFunctions, YASDI_PROTOTYPES
 
 
 # Constants
@@ -48,17 +48,22 @@ class Yasdi:
 
     """Wrapper for the lower part of YASDI"""
 
-    def __init__(self):
-        self.yasdi = cdll.LoadLibrary(find_library("yasdi"))
+    def __init__(self, library=None):
+        """'library' replaces the native library libyasdi, e.g. by a SimulatedYasdi"""
+        if library is None:
+            # Loaded on the first call, shared by all Yasdi objects
+            self.yasdi = nativeFunctions("yasdi", YASDI_PROTOTYPES)
+        else:
+            self.yasdi = LibraryFunctions(library, YASDI_PROTOTYPES)
         #self.yasdiInitialize()
     
-    def yasdiInitialize(self, initfile="." + os.pathsep + "yasdi.ini"):
-        driverCount = c_int(0)
-        self.yasdi.yasdiInitialize(initfile, byref(driverCount))
+    def yasdiInitialize(self, initfile="." + os.sep + "yasdi.ini"):
+        driverCount = c_uint32(0)
+        self.yasdi.yasdiInitialize(initfile.encode("ascii"), byref(driverCount))
 
     def yasdiGetDrivers(self):
         """Returns list of driver handles of yasdi interfaces (configured serial ports)"""
-        driverHandleArray = (ctypes.c_uint * 32)()
+        driverHandleArray = (ctypes.c_uint32 * 32)()
         usedHandlesInArray = self.yasdi.yasdiGetDriver(driverHandleArray, len(driverHandleArray))
         return driverHandleArray[0:usedHandlesInArray]
 
@@ -66,7 +71,7 @@ class Yasdi:
         """Returns the name of the driver name"""
         driverNameBufferString = (c_char * 32)()
         if self.yasdi.yasdiGetDriverName(driverID, driverNameBufferString, len(driverNameBufferString)) > 0:
-            return string_at(driverNameBufferString).decode("ascii")
+            return driverNameBufferString.value.decode("ascii")
         else:
             return ""
 
@@ -78,8 +83,6 @@ class Yasdi:
             return False
 
     def yasdiSetDriverOffline(self, driverHandle):
-        """Deactivates a driver. Set it offline"""
-        if YE_OK == self.yasdi.yasdiSetDriverOffline(driverHandle):
-            return True
-        else:
-            return False
\ No newline at end of file
+        """Deactivates a driver. Set it offline. The native function has no result."""
+        self.yasdi.yasdiSetDriverOffline(driverHandle)
+        return True
\ No newline at end of file
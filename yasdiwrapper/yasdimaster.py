@@ -13,11 +13,13 @@ __maintainer__ = "Heiko Prüssing"
 # imports
 
 from ctypes import *
-from ctypes.util import find_library
 import os
 import ctypes
 import math
+import threading
+import time
 from yasdiwrapper.yasdi import *
+from yasdiwrapper.bindings import LibraryFunctions, nativeFunctions, YASDI_MASTER_PROTOTYPES
 
 
 # Constants
@@ -29,19 +31,42 @@ ALLCHANNELS = 3
 
 CMD_DEVICE_DETECTION = "detection"
 
+# Initial sizes of the handle list buffers. The buffers are enlarged if they are filled completely.
+DEVICE_HANDLES_BUFFER_SIZE = 50
+CHANNEL_HANDLES_BUFFER_SIZE = 255
+
 # implementation
 
+class OutBuffers(threading.local):
+
+    """Out parameter buffers of the native calls. Reused for every call, one set per thread."""
+
+    def __init__(self):
+        self.doubleValue = c_double()
+        self.rangeMin = c_double()
+        self.rangeMax = c_double()
+        self.serialNumber = c_uint32()
+        self.channelType = c_uint16()
+        self.channelIndex = c_int()
+        self.stringBuffer = (c_char * 32)()
+
+
 class YasdiMaster:
 
-    def __init__(self, ini_file="." + os.sep + "yasdi.ini"):    
-        """Constructor. Overwrite path to configuration ini file if needed
+    def __init__(self, ini_file="." + os.sep + "yasdi.ini", library=None):    
+        """Constructor. Overwrite path to configuration ini file if needed.
+        'library' replaces the native library libyasdimaster, e.g. by a SimulatedYasdi.
         """
-        self.yasdiMaster = ctypes.cdll.LoadLibrary(find_library("yasdimaster"))
+        if library is None:
+            self.yasdiMaster = nativeFunctions("yasdimaster", YASDI_MASTER_PROTOTYPES)
+        else:
+            self.yasdiMaster = LibraryFunctions(library, YASDI_MASTER_PROTOTYPES)
+        self.outBuffers = OutBuffers()
         self.yasdiMasterInitialize(ini_file)
 
     def yasdiMasterInitialize(self, iniFile):
         """This method must be called first. Initialize yasdi master."""
-        availableDriverCount = c_uint()
+        availableDriverCount = c_uint32()
         if YE_OK == self.yasdiMaster.yasdiMasterInitialize(iniFile.encode("ascii"), byref(availableDriverCount)):
             return availableDriverCount.value
         else:
@@ -57,21 +82,32 @@ class YasdiMaster:
 
     def GetDeviceHandles(self) -> [c_int]:
         """Get list of all available (found) SMA devices. Device detection has to be done befor."""
-        deviceHandleList = (c_uint * 50)() # 50 inverter device should be enough for now. 
-        devCount = self.yasdiMaster.GetDeviceHandles(byref(deviceHandleList), len(deviceHandleList))
-        return deviceHandleList[0:devCount]
+        return self.readHandleList(DEVICE_HANDLES_BUFFER_SIZE, self.yasdiMaster.GetDeviceHandles)
+
+    @staticmethod
+    def readHandleList(bufferSize, function) -> [int]:
+        """Calls function(buffer, bufferSize) which fills a handle list buffer and returns the count of handles.
+        yasdi returns the count of copied handles only, so a completely filled buffer may have been truncated.
+        In this case the call is repeated with a buffer of double size.
+        """
+        while True:
+            handleList = (c_uint32 * bufferSize)()
+            count = function(handleList, bufferSize)
+            if count < bufferSize:
+                return handleList[0:count]
+            bufferSize *= 2
 
     def GetDeviceName(self, deviceHandle) -> str:
         """Delivers the device name of a SMA device"""
-        deviceNameBuffer = (c_char * 32)()
-        if YE_OK == self.yasdiMaster.GetDeviceName(deviceHandle, byref(deviceNameBuffer), len(deviceNameBuffer)):
-            return string_at(deviceNameBuffer).decode("ascii")
+        deviceNameBuffer = self.outBuffers.stringBuffer
+        if YE_OK == self.yasdiMaster.GetDeviceName(deviceHandle, deviceNameBuffer, len(deviceNameBuffer)):
+            return deviceNameBuffer.value.decode("ascii")
         else:
             return "???"
 
     def GetDeviceSN(self, deviceHandle) -> c_uint32:
         """Delivers the serial number (SN) of a device. It's 32 bit value"""
-        serialNumber = c_uint32()
+        serialNumber = self.outBuffers.serialNumber
         if YE_OK == self.yasdiMaster.GetDeviceSN(deviceHandle, byref(serialNumber)):
             return serialNumber.value
         else:
@@ -80,9 +116,9 @@ class YasdiMaster:
     def GetDeviceType(self, deviceHandle) -> str:
         """Returns the device type e.g. 'SunBC-38'. Every type identifies the same group of channels the device supports.
         """
-        stringBuffer = (c_char * 16)()
-        if YE_OK == self.yasdiMaster.GetDeviceType(deviceHandle,byref(stringBuffer),len(stringBuffer)):
-            return string_at(stringBuffer).decode("ascii")
+        stringBuffer = self.outBuffers.stringBuffer
+        if YE_OK == self.yasdiMaster.GetDeviceType(deviceHandle,stringBuffer,len(stringBuffer)):
+            return stringBuffer.value.decode("ascii")
         else:
             return "???"
     
@@ -93,12 +129,11 @@ class YasdiMaster:
         - TESTCHANNELS internal readonly data channels 
         - ALLCHANNELS all channels
         """
-        channelHandleListBuffer = (c_uint * 255)() # return the first 255 channels
-        count = self.yasdiMaster.GetChannelHandlesEx(deviceHandle,
-                                                    byref(channelHandleListBuffer),
-                                                    len(channelHandleListBuffer),
-                                                    channelType)
-        return channelHandleListBuffer[0:count]
+        return self.readHandleList(CHANNEL_HANDLES_BUFFER_SIZE,
+                                   lambda handleList, bufferSize: self.yasdiMaster.GetChannelHandlesEx(deviceHandle,
+                                                                                                      handleList,
+                                                                                                      bufferSize,
+                                                                                                      channelType))
 
     def FindChannelName(self, deviceHandle, channelName) -> c_int:
         """Lookup for a channel name. Returns the handle of the channel if available"""
@@ -106,47 +141,90 @@ class YasdiMaster:
 
     def GetChannelName(self, deviceHandle) -> str:
         """Returns the channel name of an channel handle"""
-        stringBuffer = (c_char * 16)()
-        if YE_OK == self.yasdiMaster.GetChannelName(deviceHandle, byref(stringBuffer), len(stringBuffer)):
-            return string_at(stringBuffer).decode("ascii")
+        stringBuffer = self.outBuffers.stringBuffer
+        if YE_OK == self.yasdiMaster.GetChannelName(deviceHandle, stringBuffer, len(stringBuffer)):
+            return stringBuffer.value.decode("ascii")
         else:
             return "???"
 
     def GetChannelValue(self, channel_handle, device_handle, max_val_age=1) -> float:
         """Returns a channel values as a tuple of timestamp and a (double) channel value"""
-        doubleValue = c_double()
-        if YE_OK == self.yasdiMaster.GetChannelValue(channel_handle,
+        return self.GetChannelValueCode(channel_handle, device_handle, max_val_age)[1]
+
+    def GetChannelValueCode(self, channel_handle, device_handle, max_val_age=1) -> (int, float):
+        """Like GetChannelValue, but returns the yasdi return code (e.g. YE_TIMEOUT) and the value (nan if the read
+        failed)
+        """
+        doubleValue = self.outBuffers.doubleValue
+        result = self.yasdiMaster.GetChannelValue(channel_handle,
                                                   device_handle,
                                                   byref(doubleValue),
-                                                  None, 
+                                                  None,
                                                   0,
-                                                  max_val_age):
-            return float(doubleValue.value)
+                                                  max_val_age)
+        if YE_OK == result:
+            return result, float(doubleValue.value)
         else:
-            return math.nan
+            return result, math.nan
+
+    def GetChannelValues(self, channelHandles, deviceHandles, values, timestamps, errorCodes, count, max_val_age=1,
+                         durations=None):
+        """Reads many channel values at once into preallocated ctypes arrays. Every position of the arrays
+        describes one (channel, device) pair. The value, the timestamp and the yasdi return code of each pair is
+        written into the arrays 'values' (c_double), 'timestamps' (c_uint32) and 'errorCodes' (c_int).
+        Positions with an invalid channel handle are skipped and marked with YE_UNKNOWN_HANDLE.
+        If 'durations' (c_double array) is given, the duration (seconds) of each native call is stored into it.
+        """
+        getChannelValue = self.yasdiMaster.GetChannelValue
+        getChannelValueTimeStamp = self.yasdiMaster.GetChannelValueTimeStamp
+        # The values are written directly into the array: the value pointer is the address of the array element
+        valueAddress = addressof(values)
+        valueSize = sizeof(c_double)
+        clock = time.perf_counter
+        for position in range(count):
+            channelHandle = channelHandles[position]
+            deviceHandle = deviceHandles[position]
+            if channelHandle == INVALID_HANDLE:
+                result = YE_UNKNOWN_HANDLE
+            elif durations is None:
+                result = getChannelValue(channelHandle, deviceHandle, valueAddress + position * valueSize, None, 0, max_val_age)
+            else:
+                start = clock()
+                result = getChannelValue(channelHandle, deviceHandle, valueAddress + position * valueSize, None, 0, max_val_age)
+                durations[position] = clock() - start
+            errorCodes[position] = result
+            if YE_OK == result:
+                timestamps[position] = getChannelValueTimeStamp(channelHandle, deviceHandle)
+            else:
+                values[position] = math.nan
+                timestamps[position] = 0
 
     def GetChannelValueTimeStamp(self,channelHandle, deviceHandle) -> int:
         """Current Timestamp of the channel value"""
         timestamp = self.yasdiMaster.GetChannelValueTimeStamp(channelHandle, deviceHandle)
         if timestamp != 0:
-            return int(timestamp)
+            return timestamp
         else:
             return None
 
     def GetChannelUnit(self, channelHandle) -> str:
         """Delivers the unit of the data channel"""
-        bufferString = (c_char * 16)()
-        if YE_OK == self.yasdiMaster.GetChannelUnit(channelHandle, byref(bufferString), len(bufferString)):
-            return string_at(bufferString).decode("ascii")
+        bufferString = self.outBuffers.stringBuffer
+        if YE_OK == self.yasdiMaster.GetChannelUnit(channelHandle, bufferString, len(bufferString)):
+            return bufferString.value.decode("ascii")
         else:
             return "???"
 
     def SetChannelValue(self, channel_handle, device_handle, value: float) -> bool:
-        if YE_OK == self.yasdiMaster.SetChannelValue(channel_handle, device_handle, value):
+        if YE_OK == self.SetChannelValueCode(channel_handle, device_handle, value):
             return True
         else:
             return False
 
+    def SetChannelValueCode(self, channel_handle, device_handle, value: float) -> int:
+        """Like SetChannelValue, but returns the yasdi return code (e.g. YE_TIMEOUT or YE_VALUE_NOT_VALID)"""
+        return self.yasdiMaster.SetChannelValue(channel_handle, device_handle, value)
+
     def GetChannelStatTextCnt(self, channelHandle) -> int:
         """Delivers number of status texts for this channel (if this is a status text)"""
         return self.yasdiMaster.GetChannelStatTextCnt(channelHandle)
@@ -154,19 +232,19 @@ class YasdiMaster:
     def GetChannelStatText(self, channelHandle, textIndex: int):
         """Delivers the status text of an data channel. First index starts at "0". Call GetChannelStatTextCnt for maximal count.
         """
-        stringBuffer = (c_char * 16)()
-        result = self.yasdiMaster.GetChannelStatText(channelHandle, textIndex, byref(stringBuffer), len(stringBuffer))
+        stringBuffer = self.outBuffers.stringBuffer
+        result = self.yasdiMaster.GetChannelStatText(channelHandle, textIndex, stringBuffer, len(stringBuffer))
         if YE_OK == result:
-            return string_at(stringBuffer).decode("ascii")
+            return stringBuffer.value.decode("ascii")
         else:
             return "???"
 
     def GetChannelMask(self, channelHandle) -> (int,int):
         """Delivers the mask of an channel: Type + Index as tuple"""
-        channelType = c_uint8()
-        channelIndex = c_uint16()
+        channelType = self.outBuffers.channelType
+        channelIndex = self.outBuffers.channelIndex
         result = self.yasdiMaster.GetChannelMask(channelHandle, byref(channelType), byref(channelIndex))
-        return (channelType,channelIndex)
+        return (channelType.value,channelIndex.value)
 
     def DoMasterCmdEx(self,cmd="detection",param1=None,param2=None) -> bool:
         """Sends a master command to yasdi. Supported is only "detection" by now.
@@ -174,7 +252,7 @@ class YasdiMaster:
                 cmd = "detection" , das einzige Cmd ist voreingestellt und sucht nach Geraeten
                 param1 = if device detection count of device to be searched
         """
-        if YE_OK == self.yasdiMaster.yasdiDoMasterCmdEx(cmd.encode('ascii'),param1,param2):
+        if YE_OK == self.yasdiMaster.yasdiDoMasterCmdEx(cmd.encode('ascii'),param1 or 0,param2 or 0,0):
             return True
         else:
             return False
@@ -182,8 +260,8 @@ class YasdiMaster:
     def GetChannelValRange(self,channelHandle) -> (float, float):
         """Delivers the value range of a parameter channel (e.g. 0 - 240 for channel 'DA_Messintervall')
         """
-        range_min = c_double()
-        range_max = c_double()
+        range_min = self.outBuffers.rangeMin
+        range_max = self.outBuffers.rangeMax
         if YE_OK == self.yasdiMaster.GetChannelValRange(channelHandle, byref(range_min), byref(range_max)):
             return (range_min.value, range_max.value)
         else: